@@ -0,0 +1,522 @@
+"""
+Alarm Engine
+Evaluates ingested reading batches against alarm rules and raises and
+auto-clears rows in `alarms`.
+
+Rules come from two places:
+
+    sensors.min_threshold / max_threshold   an implicit threshold rule per
+                                            sensor (key "s<sensor id>")
+    alarm_rules                             configured rules (key "r<rule id>");
+                                            a threshold rule replaces the
+                                            sensor's implicit one
+
+A threshold rule is violated by readings outside [low, high]; a rate rule
+by readings that changed faster than `high` units per minute since the
+sensor's previous reading. A rule raises once `trip_count` of its last
+`trip_window` readings violated it, and clears once `trip_count`
+consecutive readings are back inside the limits narrowed by `hysteresis`.
+
+Each company's rules are compiled into NumPy arrays together with their
+evaluation state (recent violations as a bitmask, current run of normal
+readings, last value and time, active alarm id), so a batch is evaluated
+with array operations in O(batch) whatever the history. State lives in the
+process; active alarms are reloaded from the database whenever the rules
+change, and raising checks for an active alarm of the same rule, so several
+processes never raise the same alarm twice.
+
+Every alarm, from rules or POSTed, goes through record_alarm(): a repeat of
+an unacknowledged alarm (same machine, message and severity) seen within
+ALARM_COALESCE_SECONDS only bumps its occurrence count and last-seen time,
+and each machine may create at most ALARM_RATE_PER_MINUTE new alarms
+(bursts of ALARM_RATE_BURST); past that, alarms are counted on a single
+"rate limit reached" alarm of the machine instead of adding rows.
+"""
+import os
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+import cache
+
+TRIP_COUNT = int(os.environ.get("ALARM_TRIP_COUNT", 3))
+TRIP_WINDOW = int(os.environ.get("ALARM_TRIP_WINDOW", 5))
+# Default hysteresis of sensor threshold rules, as a fraction of max - min
+HYSTERESIS = float(os.environ.get("ALARM_HYSTERESIS", 0.02))
+MAX_WINDOW = 32
+COALESCE_SECONDS = int(os.environ.get("ALARM_COALESCE_SECONDS", 600))
+RATE_PER_MINUTE = float(os.environ.get("ALARM_RATE_PER_MINUTE", 6))
+RATE_BURST = int(os.environ.get("ALARM_RATE_BURST", 20))
+SUPPRESSED_MESSAGE = "Alarm rate limit reached; further alarms of this machine are counted here"
+KINDS = ("threshold", "rate")
+SEVERITIES = ("info", "warning", "critical")
+RULE_TAGS = ("machines", "alarm_rules")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS alarm_rules (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    company_id INTEGER NOT NULL,
+    sensor_id INTEGER NOT NULL,
+    kind TEXT CHECK(kind IN ('threshold','rate')) NOT NULL,
+    low REAL,
+    high REAL,
+    hysteresis REAL NOT NULL DEFAULT 0,
+    trip_count INTEGER NOT NULL DEFAULT 1,
+    trip_window INTEGER NOT NULL DEFAULT 1,
+    severity TEXT CHECK(severity IN ('info','warning','critical')) NOT NULL DEFAULT 'warning',
+    enabled INTEGER NOT NULL DEFAULT 1,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY(company_id) REFERENCES companies(id),
+    FOREIGN KEY(sensor_id) REFERENCES sensors(id)
+);
+CREATE INDEX IF NOT EXISTS idx_alarm_rules_company ON alarm_rules(company_id);
+"""
+
+# Columns the engine adds to alarms on older databases
+ALARM_COLUMNS = {
+    "sensor_id": "INTEGER",
+    "rule_key": "TEXT",
+    "value": "REAL",
+    "cleared_at": "TEXT",
+    "occurrences": "INTEGER NOT NULL DEFAULT 1",
+    "last_seen_at": "TEXT",
+}
+ALARM_INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_alarms_rule_active ON alarms(company_id, rule_key) WHERE cleared_at IS NULL;
+CREATE INDEX IF NOT EXISTS idx_alarms_coalesce ON alarms(company_id, machine_id, message) WHERE acknowledged = 0;
+"""
+
+RULE_COLUMNS = "id, sensor_id, kind, low, high, hysteresis, trip_count, trip_window, severity, enabled, created_at"
+_MASK = np.uint64((1 << MAX_WINDOW) - 1)
+
+
+def ensure_schema(conn):
+    conn.executescript(SCHEMA)
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='alarms'").fetchone():
+        return
+    existing = {r[1] for r in conn.execute("PRAGMA table_info(alarms)")}
+    for name, kind in ALARM_COLUMNS.items():
+        if name not in existing:
+            conn.execute(f"ALTER TABLE alarms ADD COLUMN {name} {kind}")
+    conn.executescript(ALARM_INDEXES)
+
+
+def parse_rule(body):
+    """Validated alarm_rules fields from a JSON body; raises ValueError on bad input."""
+    if not isinstance(body, dict):
+        raise ValueError("rule must be a JSON object")
+    kind = body.get("kind", "threshold")
+    if kind not in KINDS:
+        raise ValueError(f"kind must be one of {', '.join(KINDS)}")
+    try:
+        sensor_id = int(body.get("sensor_id"))
+    except (TypeError, ValueError):
+        raise ValueError("sensor_id must be an integer") from None
+    try:
+        low, high = [None if body.get(k) is None else float(body[k]) for k in ("low", "high")]
+        hysteresis = float(body.get("hysteresis") or 0)
+        trip_count = int(body.get("trip_count", 1))
+        trip_window = int(body.get("trip_window", trip_count))
+    except (TypeError, ValueError):
+        raise ValueError("low, high and hysteresis must be numbers, trip_count and trip_window integers") from None
+    if kind == "threshold" and low is None and high is None:
+        raise ValueError("a threshold rule needs low and/or high")
+    if kind == "threshold" and low is not None and high is not None and low >= high:
+        raise ValueError("low must be below high")
+    if kind == "rate" and (high is None or high <= 0):
+        raise ValueError("a rate rule needs high, the largest allowed change per minute")
+    if hysteresis < 0:
+        raise ValueError("hysteresis must not be negative")
+    if not 1 <= trip_count <= trip_window <= MAX_WINDOW:
+        raise ValueError(f"need 1 <= trip_count <= trip_window <= {MAX_WINDOW}")
+    severity = body.get("severity", "warning")
+    if severity not in SEVERITIES:
+        raise ValueError(f"severity must be one of {', '.join(SEVERITIES)}")
+    return {
+        "sensor_id": sensor_id,
+        "kind": kind,
+        "low": None if kind == "rate" else low,
+        "high": high,
+        "hysteresis": hysteresis,
+        "trip_count": trip_count,
+        "trip_window": trip_window,
+        "severity": severity,
+        "enabled": 1 if body.get("enabled", True) else 0,
+    }
+
+
+def rules(conn, company_id):
+    """A company's configured rules."""
+    rows = conn.execute(
+        f"SELECT {RULE_COLUMNS} FROM alarm_rules WHERE company_id = ? ORDER BY id", (company_id,)
+    ).fetchall()
+    return [dict(r) for r in rows]
+
+
+class RateLimiter:
+    """Token bucket of new alarms per (company, machine)."""
+
+    def __init__(self, per_minute=RATE_PER_MINUTE, burst=RATE_BURST):
+        self.rate = per_minute / 60.0
+        self.burst = max(burst, 1)
+        self._buckets = {}  # (company_id, machine_id) -> (tokens, updated)
+        self._lock = threading.Lock()
+        self.suppressed = 0
+
+    def allow(self, company_id, machine_id):
+        key = (company_id, machine_id)
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            allowed = tokens >= 1
+            self._buckets[key] = (tokens - 1 if allowed else tokens, now)
+            if not allowed:
+                self.suppressed += 1
+            return allowed
+
+
+def _now():
+    return datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _coalesce_target(conn, company_id, machine_id, severity, message, at, window):
+    return conn.execute(
+        """SELECT id, occurrences FROM alarms
+           WHERE company_id = ? AND machine_id = ? AND message = ? AND severity = ? AND acknowledged = 0
+             AND COALESCE(last_seen_at, raised_at) >= datetime(?, ?)
+           ORDER BY id DESC LIMIT 1""",
+        (company_id, machine_id, message, severity, at, f"-{int(window)} seconds")
+    ).fetchone()
+
+
+def record_alarm(conn, company_id, machine_id, severity, message, at=None, sensor_id=None,
+                 rule_key=None, value=None, limiter=None, window=COALESCE_SECONDS):
+    """Raise an alarm, coalescing repeats and applying the machine's rate limit.
+
+    Returns (alarm dict, created): created is False when the alarm was
+    folded into an existing one. alarm["suppressed"] is True when the rate
+    limit redirected it to the machine's "rate limit reached" alarm.
+    """
+    at = at or _now()
+    suppressed = False
+    row = _coalesce_target(conn, company_id, machine_id, severity, message, at, window)
+    if row is None and limiter is not None and not limiter.allow(company_id, machine_id):
+        suppressed = True
+        severity, message, sensor_id, rule_key, value = "warning", SUPPRESSED_MESSAGE, None, None, None
+        row = _coalesce_target(conn, company_id, machine_id, severity, message, at, window)
+
+    alarm = {"machine_id": machine_id, "sensor_id": sensor_id, "severity": severity, "message": message,
+             "value": value, "last_seen_at": at, "suppressed": suppressed}
+    if row is not None:
+        conn.execute(
+            """UPDATE alarms SET occurrences = occurrences + 1,
+                   last_seen_at = MAX(COALESCE(last_seen_at, raised_at), ?),
+                   value = COALESCE(?, value), rule_key = COALESCE(?, rule_key), cleared_at = NULL
+               WHERE id = ?""",
+            (at, value, rule_key, row[0])
+        )
+        return dict(alarm, id=row[0], occurrences=row[1] + 1), False
+    cur = conn.execute(
+        """INSERT INTO alarms (machine_id, severity, message, raised_at, acknowledged, company_id,
+                               sensor_id, rule_key, value, occurrences, last_seen_at)
+           VALUES (?, ?, ?, ?, 0, ?, ?, ?, ?, 1, ?)""",
+        (machine_id, severity, message, at, company_id, sensor_id, rule_key, value, at)
+    )
+    return dict(alarm, id=cur.lastrowid, raised_at=at, occurrences=1), True
+
+
+def _popcount(x):
+    """Set bits of each uint64."""
+    x = x - ((x >> np.uint64(1)) & np.uint64(0x5555555555555555))
+    x = (x & np.uint64(0x3333333333333333)) + ((x >> np.uint64(2)) & np.uint64(0x3333333333333333))
+    x = (x + (x >> np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+    return ((x * np.uint64(0x0101010101010101)) >> np.uint64(56)).astype(np.int64)
+
+
+def _seconds(timestamps):
+    return np.array(timestamps, dtype="datetime64[s]").astype(np.int64)
+
+
+class RuleSet:
+    """One company's compiled rules and their evaluation state."""
+
+    def __init__(self, specs, version):
+        self.version = version
+        self.keys = [s["key"] for s in specs]
+        self.specs = specs
+        n = len(specs)
+        self.sensor = np.array([s["sensor_id"] for s in specs], dtype=np.int64)
+        self.rate = np.array([s["kind"] == "rate" for s in specs], dtype=bool)
+        self.low = np.array([-np.inf if s["low"] is None else s["low"] for s in specs], dtype=float)
+        self.high = np.array([np.inf if s["high"] is None else s["high"] for s in specs], dtype=float)
+        self.hysteresis = np.array([s["hysteresis"] for s in specs], dtype=float)
+        self.trip_count = np.array([s["trip_count"] for s in specs], dtype=np.int64)
+        self.trip_window = np.array([s["trip_window"] for s in specs], dtype=np.int64)
+        # Rules ordered by sensor, for expanding readings into (reading, rule) pairs
+        self.by_sensor = np.argsort(self.sensor, kind="stable")
+        self.sorted_sensor = self.sensor[self.by_sensor]
+        # Evaluation state
+        self.history = np.zeros(n, dtype=np.uint64)    # bit k: violation k+1 readings ago
+        self.normal_run = np.zeros(n, dtype=np.int64)  # consecutive readings inside the clear band
+        self.last_value = np.full(n, np.nan)
+        self.last_time = np.zeros(n, dtype=np.int64)
+        self.active = np.zeros(n, dtype=np.int64)       # id of the rule's active alarm, 0 if none
+
+    def adopt(self, previous, active):
+        """Carry over state of rules that still exist; `active` maps rule keys to alarm ids."""
+        if previous is not None:
+            old = {key: i for i, key in enumerate(previous.keys)}
+            for i, key in enumerate(self.keys):
+                j = old.get(key)
+                if j is not None:
+                    self.history[i] = previous.history[j]
+                    self.normal_run[i] = previous.normal_run[j]
+                    self.last_value[i] = previous.last_value[j]
+                    self.last_time[i] = previous.last_time[j]
+        for i, key in enumerate(self.keys):
+            self.active[i] = active.get(key, 0)
+
+
+class AlarmEngine:
+    """Per-company rule sets, shared by every ingest in the process."""
+
+    def __init__(self, limiter=None):
+        self.limiter = limiter or RateLimiter()
+        self._rulesets = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+        self._stats = {"evaluated": 0, "raised": 0, "cleared": 0, "reloads": 0}
+
+    def _company_lock(self, company_id):
+        with self._lock:
+            return self._locks.setdefault(company_id, threading.Lock())
+
+    def invalidate(self, company_id):
+        """Forget a company's compiled rules (state of unchanged rules is kept on reload).
+
+        Also call it when a transaction that evaluated a batch does not
+        commit: the reload re-reads active alarms from the database.
+        """
+        ruleset = self._rulesets.get(company_id)
+        if ruleset is not None:
+            ruleset.version = None
+
+    def _load(self, conn, company_id):
+        version = cache.versions(conn, company_id, RULE_TAGS)
+        previous = self._rulesets.get(company_id)
+        if previous is not None and previous.version == version:
+            return previous
+
+        sensors = conn.execute("""
+            SELECT s.id, s.machine_id, s.name, s.unit, s.min_threshold, s.max_threshold
+            FROM sensors s JOIN machines m ON s.machine_id = m.id
+            WHERE m.company_id = ?
+        """, (company_id,)).fetchall()
+        meta = {s["id"]: s for s in sensors}
+        configured = [r for r in rules(conn, company_id) if r["enabled"] and r["sensor_id"] in meta]
+        overridden = {r["sensor_id"] for r in configured if r["kind"] == "threshold"}
+
+        specs = []
+        for s in sensors:
+            if s["id"] in overridden or (s["min_threshold"] is None and s["max_threshold"] is None):
+                continue
+            span = (s["max_threshold"] - s["min_threshold"]) if None not in (s["min_threshold"], s["max_threshold"]) else 0
+            specs.append({
+                "key": f"s{s['id']}", "sensor_id": s["id"], "kind": "threshold",
+                "low": s["min_threshold"], "high": s["max_threshold"], "hysteresis": abs(span) * HYSTERESIS,
+                "trip_count": min(TRIP_COUNT, TRIP_WINDOW), "trip_window": TRIP_WINDOW, "severity": "warning",
+            })
+        for r in configured:
+            specs.append(dict(r, key=f"r{r['id']}"))
+        for spec in specs:
+            sensor = meta[spec["sensor_id"]]
+            spec.update(machine_id=sensor["machine_id"], sensor_name=sensor["name"], unit=sensor["unit"] or "")
+
+        active = dict(conn.execute(
+            "SELECT rule_key, id FROM alarms WHERE company_id = ? AND rule_key IS NOT NULL AND cleared_at IS NULL",
+            (company_id,)
+        ).fetchall())
+        ruleset = RuleSet(specs, version)
+        ruleset.adopt(previous, active)
+        self._rulesets[company_id] = ruleset
+        self._stats["reloads"] += 1
+        return ruleset
+
+    def evaluate(self, conn, company_id, rows):
+        """Evaluate one inserted batch inside its transaction (the caller commits).
+
+        Rule state is updated in memory at once; if the transaction is rolled
+        back, the caller must invalidate(company_id).
+
+        Args:
+            conn: Writer connection holding the batch's transaction
+            company_id: Tenant of every reading in the batch
+            rows: Sequence of (sensor_id, value, 'YYYY-MM-DD HH:MM:SS') in arrival order
+
+        Returns {"raised": [alarm dicts], "cleared": [alarm dicts]}.
+        """
+        changes = {"raised": [], "cleared": []}
+        if not rows:
+            return changes
+        with self._company_lock(company_id):
+            ruleset = self._load(conn, company_id)
+            if not ruleset.keys:
+                return changes
+            transitions = self._evaluate(ruleset, rows)
+            for kind, r, value, rate, timestamp in transitions:
+                if kind == "raise":
+                    alarm = self._raise(conn, company_id, ruleset, r, value, rate, timestamp)
+                    if alarm:
+                        changes["raised"].append(alarm)
+                else:
+                    alarm = self._clear(conn, company_id, ruleset, r, timestamp)
+                    if alarm:
+                        changes["cleared"].append(alarm)
+            self._stats["evaluated"] += len(rows)
+            self._stats["raised"] += len(changes["raised"])
+            self._stats["cleared"] += len(changes["cleared"])
+        return changes
+
+    def _evaluate(self, rs, rows):
+        """Update rule state from a batch; returns transitions as (kind, rule, value, rate, timestamp)."""
+        sensor_ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+        values = np.fromiter((r[1] for r in rows), dtype=float, count=len(rows))
+
+        # One evaluation per (reading, rule of its sensor), grouped by rule in arrival order
+        lo = np.searchsorted(rs.sorted_sensor, sensor_ids, side="left")
+        counts = np.searchsorted(rs.sorted_sensor, sensor_ids, side="right") - lo
+        total = int(counts.sum())
+        if not total:
+            return []
+        reading = np.repeat(np.arange(len(rows)), counts)
+        offset = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        rule = rs.by_sensor[np.repeat(lo, counts) + offset]
+        order = np.argsort(rule, kind="stable")
+        reading, rule = reading[order], rule[order]
+        v = values[reading]
+
+        idx = np.arange(total)
+        first = np.r_[True, rule[1:] != rule[:-1]]
+        starts = np.flatnonzero(first)
+        ends = np.r_[starts[1:], total] - 1
+        group = np.cumsum(first) - 1
+        start = starts[group]
+        position = idx - start
+        g_rule = rule[starts]
+
+        low, high, hyst = rs.low[rule], rs.high[rule], rs.hysteresis[rule]
+        violation = (v < low) | (v > high)
+        normal = (v >= low + hyst) & (v <= high - hyst)
+
+        rate = np.full(total, np.nan)
+        is_rate = rs.rate[rule]
+        if is_rate.any():
+            t = _seconds([rows[i][2] for i in reading.tolist()])
+            prev_v = np.r_[np.nan, v[:-1]]
+            prev_t = np.r_[0, t[:-1]]
+            prev_v[starts] = rs.last_value[g_rule]
+            prev_t[starts] = rs.last_time[g_rule]
+            dt = t - prev_t
+            usable = is_rate & (dt > 0) & ~np.isnan(prev_v)
+            rate[usable] = (v[usable] - prev_v[usable]) / dt[usable] * 60.0
+            change = np.abs(rate)
+            violation = np.where(is_rate, usable & (change > high), violation)
+            normal = np.where(is_rate, usable & (change <= high - hyst), normal)
+            last_time = t[ends]
+        else:
+            last_time = None
+
+        # Violations among the last trip_window readings, history included
+        window = rs.trip_window[rule]
+        running = np.cumsum(violation)
+        before_group = (running - violation)[start]
+        in_batch = running - np.where(position >= window, running[np.maximum(idx - window, 0)], before_group)
+        from_history = np.maximum(window - 1 - position, 0).astype(np.uint64)
+        history_mask = (np.uint64(1) << from_history) - np.uint64(1)
+        tripped = in_batch + _popcount(rs.history[rule] & history_mask)
+
+        # Consecutive normal readings up to each one, continuing the run from earlier batches
+        last_break = np.maximum.accumulate(np.where(normal, -1, idx))
+        run = np.where(last_break >= start, idx - last_break, position + 1 + rs.normal_run[rule])
+
+        trip_count = rs.trip_count[rule]
+        event = np.where(violation & (tripped >= trip_count), 1, np.where(normal & (run >= trip_count), -1, 0))
+        last_event = np.maximum.accumulate(np.where(event != 0, idx, -1))
+        initial = rs.active[rule] != 0
+        state = np.where(last_event >= start, event[np.maximum(last_event, 0)] > 0, initial)
+        previous = np.r_[False, state[:-1]]
+        previous[starts] = initial[starts]
+        changed = np.flatnonzero(state != previous)
+
+        # Fold the batch into the state of each rule it touched
+        length = (ends - starts + 1).astype(np.uint64)
+        age = (ends[group] - idx).astype(np.uint64)
+        recent = np.where(age < MAX_WINDOW, violation.astype(np.uint64) << np.minimum(age, MAX_WINDOW - 1), 0)
+        bits = np.add.reduceat(recent.astype(np.uint64), starts)
+        shifted = np.where(length < MAX_WINDOW, rs.history[g_rule] << np.minimum(length, MAX_WINDOW - 1), 0)
+        rs.history[g_rule] = (shifted.astype(np.uint64) | bits) & _MASK
+        rs.normal_run[g_rule] = np.minimum(run[ends], 1 << 30)
+        rs.last_value[g_rule] = v[ends]
+        if last_time is not None:
+            rs.last_time[g_rule] = last_time
+
+        return [
+            ("raise" if state[i] else "clear", int(rule[i]), float(v[i]),
+             None if np.isnan(rate[i]) else float(rate[i]), rows[reading[i]][2])
+            for i in changed.tolist()
+        ]
+
+    def _raise(self, conn, company_id, rs, r, value, rate, timestamp):
+        spec = rs.specs[r]
+        # Messages leave out the value, so repeats of one condition coalesce
+        unit = f" {spec['unit']}" if spec["unit"] else ""
+        if spec["kind"] == "rate":
+            message = f"{spec['sensor_name']} changing faster than {spec['high']:g}{unit}/min"
+        else:
+            above = spec["high"] is not None and value > spec["high"]
+            limit = spec["high"] if above else spec["low"]
+            message = f"{spec['sensor_name']} {'above' if above else 'below'} limit ({limit:g}{unit})"
+        key = rs.keys[r]
+        active = conn.execute(
+            "SELECT id FROM alarms WHERE company_id = ? AND rule_key = ? AND cleared_at IS NULL",
+            (company_id, key)
+        ).fetchone()
+        if active:
+            # Already raised by another process
+            rs.active[r] = active[0]
+            return None
+        alarm, _ = record_alarm(
+            conn, company_id, spec["machine_id"], spec["severity"], message, timestamp,
+            sensor_id=spec["sensor_id"], rule_key=key, value=rate if spec["kind"] == "rate" else value,
+            limiter=self.limiter
+        )
+        # A suppressed raise has no alarm of its own to clear later
+        rs.active[r] = -1 if alarm["suppressed"] else alarm["id"]
+        return alarm
+
+    def _clear(self, conn, company_id, rs, r, timestamp):
+        key = rs.keys[r]
+        rs.active[r] = 0
+        rows = conn.execute(
+            "SELECT id, machine_id FROM alarms WHERE company_id = ? AND rule_key = ? AND cleared_at IS NULL",
+            (company_id, key)
+        ).fetchall()
+        if not rows:
+            return None
+        conn.execute(
+            "UPDATE alarms SET cleared_at = ? WHERE company_id = ? AND rule_key = ? AND cleared_at IS NULL",
+            (timestamp, company_id, key)
+        )
+        return {"id": rows[0][0], "machine_id": rows[0][1], "sensor_id": rs.specs[r]["sensor_id"],
+                "cleared_at": timestamp}
+
+    def stats(self):
+        return {
+            **self._stats,
+            "suppressed": self.limiter.suppressed,
+            "companies": len(self._rulesets),
+            "rules": sum(len(rs.keys) for rs in self._rulesets.values()),
+        }
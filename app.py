@@ -1,19 +1,37 @@
-from flask import Flask, request, jsonify, render_template, send_file, session, redirect, url_for
-import sqlite3
+from flask import Flask, Response, request, jsonify, render_template, send_file, session, redirect, url_for, stream_with_context, has_request_context
 from datetime import datetime, timedelta
 import io
 import os
 import csv
+import shutil
 import json
 import pandas as pd
 from werkzeug.utils import secure_filename
 from werkzeug.security import generate_password_hash, check_password_hash
 from functools import wraps
+from uuid import uuid4
 
-import matplotlib
-matplotlib.use("Agg")
-import matplotlib.pyplot as plt
 import visualization as viz
+from dbpool import ConnectionPool
+import rollups
+import ingest
+import fleet
+import cache
+import render_pool
+import events
+import readings
+import downsample
+import timeseries
+import datasets
+import columnar
+import dataset_catalog
+import dataset_query
+import dataset_import
+import jobs
+import alarm_engine
+import bulk
+import audit
+import writer
 
 DB = "imcs.db"
 UPLOAD_FOLDER = 'data/uploads'
@@ -25,24 +43,64 @@ app = Flask(
     static_folder="static"
 )
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max
+# Uploads are streamed to disk and profiled in chunks (datasets.py), so the cap is only a safety limit
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MAX_UPLOAD_MB', 4096)) * 1024 * 1024
+# Uploads at least this large are converted by a background job (smaller ones too with ?async=1)
+ASYNC_UPLOAD_BYTES = int(os.environ.get('ASYNC_UPLOAD_MB', 32)) * 1024 * 1024
+EXPORT_FOLDER = 'data/exports'
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
 
-# Ensure upload directory exists
+# Ensure upload and export directories exist
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+os.makedirs(EXPORT_FOLDER, exist_ok=True)
 
 # ===================== DB =====================
-def db():
-    conn = sqlite3.connect(DB)
-    conn.row_factory = sqlite3.Row
-    return conn
+pool = ConnectionPool(DB)
 
-def log(user, action, entity, entity_id=None):
+def db(readonly=False):
+    """Return this thread's pooled connection (reader or writer).
+
+    Connections are reused across requests; ``with db() as c`` still
+    commits or rolls back the transaction but does not close the connection.
+    """
+    return pool.get(readonly=readonly)
+
+@app.teardown_request
+def release_db(exc=None):
+    pool.release()
+
+# Request-path writes go through one writer thread per process as group-committed
+# intents (see writer.py), so handlers wait on a future instead of the write lock
+db_writer = writer.Writer(DB)
+
+@app.errorhandler(writer.WriterBusy)
+def writer_busy(e):
+    response = jsonify({"error": str(e)})
+    response.status_code = 503
+    response.headers["Retry-After"] = "1"
+    return response
+
+def init_db():
+    """Create derived tables and indexes that older databases are missing."""
     with db() as c:
-        c.execute(
-            "INSERT INTO audit_log(user,action,entity,entity_id) VALUES (?,?,?,?)",
-            (user, action, entity, entity_id)
-        )
+        rollups.ensure_schema(c)
+        fleet.ensure_schema(c)
+        cache.ensure_schema(c)
+        dataset_catalog.ensure_schema(c)
+        jobs.ensure_schema(c)
+        alarm_engine.ensure_schema(c)
+        audit.ensure_schema(c)
+
+init_db()
+
+# Write-behind: entries are queued and written in batches by a background thread
+audit_log = audit.AuditLog(audit.PATH or DB)
+
+def log(user, action, entity, entity_id=None, company_id=None):
+    """Queue an audit entry for the current company (or `company_id`); never blocks on the database."""
+    if company_id is None and has_request_context():
+        company_id = session.get('company_id')
+    audit_log.record(user, action, entity, entity_id, company_id)
 
 # ===================== AUTHENTICATION =====================
 def login_required(f):
@@ -60,6 +118,24 @@ def get_current_company_id():
     """Get current user's company ID from session"""
     return session.get('company_id')
 
+def fleet_args():
+    """Fleet listing filters, sorting and paging from the query string.
+
+    ?status=running,idle&type=Press&location=Line A&sort=efficiency&order=desc&limit=50&offset=100
+    """
+    filters = {
+        key: request.args.get(key).split(",")
+        for key in fleet.FILTER_COLUMNS if request.args.get(key)
+    }
+    limit = request.args.get("limit", type=int)
+    return {
+        "filters": filters,
+        "sort": request.args.get("sort", "id"),
+        "order": request.args.get("order", "asc"),
+        "limit": max(1, min(limit, 1000)) if limit else None,
+        "offset": max(0, request.args.get("offset", 0, type=int))
+    }
+
 @app.route("/login")
 def login():
     """Login page"""
@@ -94,7 +170,7 @@ def api_login():
     if not company_name or not login_id or not password:
         return jsonify({"error": "Company name, login ID, and password are required"}), 400
     
-    with db() as c:
+    with db(readonly=True) as c:
         # Find company
         company = c.execute(
             "SELECT id, name FROM companies WHERE LOWER(name) = LOWER(?)",
@@ -191,7 +267,7 @@ def api_register():
         user_id = cursor.lastrowid
         conn.commit()
         
-        log(username, "register", "user", user_id)
+        log(username, "register", "user", user_id, company_id)
         
         return jsonify({
             "success": True,
@@ -216,7 +292,7 @@ def machinery():
 def machine_page(mid):
     # Verify machine belongs to user's company
     company_id = get_current_company_id()
-    with db() as c:
+    with db(readonly=True) as c:
         machine = c.execute(
             "SELECT id FROM machines WHERE id = ? AND company_id = ?",
             (mid, company_id)
@@ -240,14 +316,291 @@ def maintenance_page():
 def reports_page():
     return render_template("reports.html")
 
+# ===================== RESPONSE CACHE =====================
+response_cache = cache.ResponseCache(
+    max_entries=int(os.environ.get("RESPONSE_CACHE_MAX_ENTRIES", 1000)),
+    ttl=int(os.environ.get("RESPONSE_CACHE_TTL", 300))
+)
+
+def cached(*tags, ttl=None):
+    """Cache a read API per (company, endpoint, args) until a write touches `tags`.
+
+    Must sit below @login_required. Only 200 responses without
+    Cache-Control: no-store are stored.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            company_id = get_current_company_id()
+            with db(readonly=True) as c:
+                data_versions = cache.versions(c, company_id, tags)
+            key = (
+                company_id,
+                request.endpoint,
+                tuple(sorted(request.args.items(multi=True))),
+                tuple(sorted(kwargs.items())),
+                data_versions
+            )
+            hit = response_cache.get(key)
+            if hit is not None:
+                body, mimetype = hit
+                response = app.response_class(body, mimetype=mimetype)
+                response.headers["X-Cache"] = "HIT"
+                return response
+
+            response = app.make_response(f(*args, **kwargs))
+            if response.status_code == 200 and not response.cache_control.no_store:
+                response_cache.set(key, (response.get_data(), response.mimetype), tags=tags, ttl=ttl)
+            response.headers["X-Cache"] = "MISS"
+            return response
+        return decorated_function
+    return decorator
+
+chart_cache = cache.ChartCache(
+    max_bytes=int(os.environ.get("CHART_CACHE_MAX_MB", 64)) * 1024 * 1024,
+    ttl=int(os.environ.get("CHART_CACHE_TTL", 300)),
+    directory=os.environ.get("CHART_CACHE_DIR") or None
+)
+
+def cached_chart(*tags):
+    """Serve a PNG chart from chart_cache, rendering only on a miss.
+
+    The fingerprint covers chart type, company, URL parameters, quality
+    mode, theme and the data versions of `tags`. Responses carry an ETag so
+    browsers revalidate with If-None-Match and get a 304.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            company_id = get_current_company_id()
+            with db(readonly=True) as c:
+                data_versions = cache.versions(c, company_id, tags)
+            key = chart_cache.fingerprint(
+                request.endpoint,
+                company_id,
+                sorted(request.args.items(multi=True)),
+                sorted(kwargs.items()),
+                request.args.get("quality", "normal"),
+                request.args.get("theme", "signature"),
+                data_versions
+            )
+            hit = chart_cache.get(key)
+            if hit is not None:
+                png, etag = hit
+                response = app.response_class(png, mimetype="image/png")
+                response.headers["X-Cache"] = "HIT"
+            else:
+                response = app.make_response(f(*args, **kwargs))
+                response.direct_passthrough = False
+                png = response.get_data()
+                if response.status_code != 200 or not png or response.cache_control.no_store:
+                    return response
+                etag = chart_cache.set(key, png)
+                response.headers["X-Cache"] = "MISS"
+
+            response.set_etag(etag)
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+            return response.make_conditional(request)
+        return decorated_function
+    return decorator
+
+def invalidate(c, company_id, *tags):
+    """Mark a company's cached reads of `tags` stale; call before c.commit()."""
+    cache.bump(c, company_id, *tags)
+    response_cache.invalidate(company_id, tags)
+
+# ===================== LIVE EVENTS =====================
+bus = events.EventBus()
+
+def kpi_snapshot(c, company_id):
+    """Headline KPIs pushed to live dashboards (same fields as /api/summary)."""
+    row = c.execute("""
+        SELECT
+            (SELECT COUNT(*) FROM machines WHERE company_id = ?) AS total_machines,
+            (SELECT COUNT(*) FROM machines WHERE company_id = ? AND status = 'running') AS running_machines,
+            (SELECT COUNT(*) FROM alarms WHERE company_id = ? AND acknowledged = 0) AS active_alerts,
+            (SELECT COUNT(*) FROM maintenance_tasks WHERE company_id = ? AND status = 'open') AS pending_maintenance,
+            (SELECT SUM(st.value_sum) / SUM(st.reading_count) FROM sensor_stats st
+             JOIN sensors s ON st.sensor_id = s.id
+             JOIN machines m ON s.machine_id = m.id
+             WHERE m.company_id = ?) AS avg_efficiency
+    """, (company_id,) * 5).fetchone()
+    snapshot = dict(row)
+    snapshot["avg_efficiency"] = round(snapshot["avg_efficiency"] or 0, 1)
+    return snapshot
+
+def notify(company_id, event_type=None, data=None):
+    """Publish a live event and any KPI changes; call after c.commit()."""
+    if event_type:
+        bus.publish(company_id, event_type, data or {})
+    if bus.connections:
+        with db(readonly=True) as c:
+            bus.publish_kpis(company_id, kpi_snapshot(c, company_id))
+
+@app.route("/api/stream")
+@login_required
+def stream():
+    """Server-Sent Events feed of KPI deltas, alarms, machine and maintenance changes."""
+    company_id = get_current_company_id()
+    try:
+        bus.acquire()
+    except events.StreamLimitReached:
+        response = jsonify({"error": "Too many live connections, falling back to polling"})
+        response.status_code = 503
+        response.headers["Retry-After"] = "30"
+        return response
+
+    try:
+        with db(readonly=True) as c:
+            snapshot = kpi_snapshot(c, company_id)
+            seen = cache.versions(c, company_id, cache.TAGS)
+    except Exception:
+        bus.release()
+        raise
+    bus.seed_kpis(company_id, snapshot)
+
+    def on_heartbeat():
+        # Picks up writes handled by other workers, which never reach this bus
+        nonlocal snapshot, seen
+        with db(readonly=True) as c:
+            current = cache.versions(c, company_id, cache.TAGS)
+            if current == seen:
+                return []
+            seen, previous, snapshot = current, snapshot, kpi_snapshot(c, company_id)
+        delta = {k: v for k, v in snapshot.items() if previous.get(k) != v}
+        return [("kpis", delta)] if delta else []
+
+    response = Response(
+        stream_with_context(bus.stream(
+            company_id,
+            last_event_id=request.headers.get("Last-Event-ID") or request.args.get("last_event_id"),
+            initial=[("kpis", snapshot)],
+            on_heartbeat=on_heartbeat
+        )),
+        mimetype="text/event-stream"
+    )
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"  # stop nginx from buffering the stream
+    response.call_on_close(bus.release)
+    return response
+
+# ===================== BACKGROUND JOBS =====================
+def publish_job(job):
+    """Push job state and progress to the owning company's live dashboards."""
+    bus.publish(job["company_id"], "job", {
+        k: job[k] for k in ("id", "kind", "state", "progress", "message", "error")
+    })
+
+# Handlers are registered next to the features they run (job_queue.register)
+# Submitting, cancelling and retrying go through the single writer like other request writes
+job_queue = jobs.JobQueue(DB, on_change=publish_job, teardown=pool.release, writer=db_writer)
+
+@app.before_request
+def start_job_workers():
+    # Per process, so each forked gunicorn worker runs its own job threads
+    job_queue.start()
+
+def submit_job(kind, params=None):
+    """Queue a job for the current company and return the 202 response pointing at it."""
+    with db(readonly=True) as c:
+        job_id = job_queue.submit(c, get_current_company_id(), kind, params, session.get('username', 'system'))
+    return job_accepted(job_id)
+
+def job_accepted(job_id):
+    return jsonify({
+        "success": True,
+        "job_id": job_id,
+        "status_url": f"/api/jobs/{job_id}",
+        "result_url": f"/api/jobs/{job_id}/result"
+    }), 202
+
+def job_json(job):
+    job = {k: v for k, v in job.items() if k != "company_id"}
+    job["status_url"] = f"/api/jobs/{job['id']}"
+    job["result_url"] = f"/api/jobs/{job['id']}/result"
+    return job
+
+@app.route("/api/jobs")
+@login_required
+def list_jobs():
+    """The company's recent jobs (?state=running, ?limit=50)."""
+    state = request.args.get("state")
+    if state and state not in jobs.STATES:
+        return jsonify({"error": f"state must be one of {', '.join(jobs.STATES)}"}), 400
+    limit = max(1, min(request.args.get("limit", 50, type=int), 500))
+    with db(readonly=True) as c:
+        entries = jobs.entries(c, get_current_company_id(), state, limit)
+    return jsonify({"jobs": [job_json(j) for j in entries]})
+
+@app.route("/api/jobs/<int:job_id>")
+@login_required
+def get_job(job_id):
+    """State, progress, result (when done) or error of one job."""
+    with db(readonly=True) as c:
+        job = jobs.get(c, get_current_company_id(), job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job_json(job))
+
+@app.route("/api/jobs/<int:job_id>/cancel", methods=["POST"])
+@login_required
+def cancel_job(job_id):
+    """Cancel a queued job, or ask a running one to stop at its next progress report."""
+    company_id = get_current_company_id()
+    with db(readonly=True) as c:
+        job = jobs.get(c, company_id, job_id)
+        if job is None:
+            return jsonify({"error": "Job not found"}), 404
+        if job["state"] in jobs.FINAL_STATES:
+            return jsonify({"error": f"Job already {job['state']}"}), 409
+        if job["state"] == "running" and not job_queue.cancellable(job["kind"]):
+            return jsonify({"error": f"{job['kind']} jobs cannot be cancelled once running"}), 409
+        job = job_queue.cancel(c, company_id, job_id)
+    log(session.get('username', 'system'), "cancel", "job", job_id)
+    return jsonify(job_json(job))
+
+@app.route("/api/jobs/<int:job_id>/retry", methods=["POST"])
+@login_required
+def retry_job(job_id):
+    """Queue a failed or cancelled job again."""
+    company_id = get_current_company_id()
+    with db(readonly=True) as c:
+        job = jobs.get(c, company_id, job_id)
+        if job is None:
+            return jsonify({"error": "Job not found"}), 404
+        if job["state"] not in ("failed", "cancelled"):
+            return jsonify({"error": f"Only failed or cancelled jobs can be retried (job is {job['state']})"}), 409
+        job = job_queue.retry(c, company_id, job_id)
+    log(session.get('username', 'system'), "retry", "job", job_id)
+    return jsonify(job_json(job)), 202
+
+# Kinds whose result is more than the stored JSON: kind -> fn(job) -> response
+job_results = {}
+
+@app.route("/api/jobs/<int:job_id>/result")
+@login_required
+def get_job_result(job_id):
+    """Result of a finished job (a file download for exports)."""
+    with db(readonly=True) as c:
+        job = jobs.get(c, get_current_company_id(), job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    if job["state"] != "done":
+        return jsonify({"error": f"Job is {job['state']}", "job": job_json(job)}), 409
+    if job["kind"] in job_results:
+        return job_results[job["kind"]](job)
+    return jsonify(job["result"])
+
 # ===================== APIs =====================
 
 @app.route("/api/summary")
 @login_required
+@cached("machines", "readings", "alarms")
 def summary():
     try:
         company_id = get_current_company_id()
-        with db() as c:
+        with db(readonly=True) as c:
             total = c.execute(
                 "SELECT COUNT(*) FROM machines WHERE company_id = ?",
                 (company_id,)
@@ -255,8 +608,8 @@ def summary():
             
             # Handle empty sensor_readings table - filter by company via machines
             avg_eff_result = c.execute("""
-                SELECT AVG(sr.value) FROM sensor_readings sr
-                JOIN sensors s ON sr.sensor_id = s.id
+                SELECT SUM(st.value_sum) / SUM(st.reading_count) FROM sensor_stats st
+                JOIN sensors s ON st.sensor_id = s.id
                 JOIN machines m ON s.machine_id = m.id
                 WHERE m.company_id = ?
             """, (company_id,)).fetchone()
@@ -296,47 +649,39 @@ def machines():
         if not all(k in data for k in required):
             return jsonify({"error": "Missing required fields"}), 400
         
-        with db() as c:
+        def create(c):
             cursor = c.execute(
                 """INSERT INTO machines (name, type, location, rated_capacity, status, company_id)
                    VALUES (?, ?, ?, ?, ?, ?)""",
                 (data["name"], data["type"], data["location"], 
                  data.get("rated_capacity"), data.get("status", "idle"), company_id)
             )
-            c.commit()
-            machine_id = cursor.lastrowid
-            
-            log(session.get('username', 'system'), "create", "machine", machine_id)
-            
-            return jsonify({"success": True, "id": machine_id, "message": "Machine created"}), 201
-    
-    # GET - List all machines for this company with efficiency
-    with db() as c:
-        rows = c.execute(
-            "SELECT * FROM machines WHERE company_id = ?",
-            (company_id,)
-        ).fetchall()
-
-        result = []
-        for m in rows:
-            machine_dict = dict(m)
-            # Get efficiency from average sensor readings
-            efficiency = c.execute("""
-                SELECT AVG(value) FROM sensor_readings sr
-                JOIN sensors s ON sr.sensor_id = s.id
-                WHERE s.machine_id = ?
-            """, (m['id'],)).fetchone()
+            invalidate(c, company_id, "machines")
+            return cursor.lastrowid
 
-            machine_dict['efficiency'] = round(float(efficiency[0]), 2) if efficiency and efficiency[0] is not None else 0
-            result.append(machine_dict)
+        machine_id = db_writer.run(create)
+        notify(company_id, "machine.created", {
+            "id": machine_id, "name": data["name"], "type": data["type"],
+            "location": data["location"], "status": data.get("status", "idle")
+        })
+        
+        log(session.get('username', 'system'), "create", "machine", machine_id)
+        
+        return jsonify({"success": True, "id": machine_id, "message": "Machine created"}), 201
+    
+    # GET - List machines for this company with efficiency (single query)
+    with db(readonly=True) as c:
+        result, total = fleet.fleet_query(c, company_id, **fleet_args())
 
-    return jsonify(result)
+    response = jsonify(result)
+    response.headers["X-Total-Count"] = str(total)
+    return response
 
 @app.route("/api/machines/<int:mid>")
 @login_required
 def machine_details(mid):
     company_id = get_current_company_id()
-    with db() as c:
+    with db(readonly=True) as c:
         m = c.execute(
             "SELECT * FROM machines WHERE id=? AND company_id=?",
             (mid, company_id)
@@ -355,18 +700,17 @@ def machine_details(mid):
             (mid,)
         ).fetchall()
 
-        # Performance history (30 days)
+        # Performance history (30 days) from daily rollups
         perf = c.execute(
-            """SELECT DATE(timestamp) AS metric_date,
-                      AVG(value) AS efficiency,
-                      MIN(value) AS min_eff,
-                      MAX(value) AS max_eff,
-                      COUNT(*) AS reading_count
-               FROM sensor_readings
-               WHERE sensor_id IN (
-                 SELECT id FROM sensors WHERE machine_id=?
-               )
-               GROUP BY DATE(timestamp)
+            """SELECT d.bucket AS metric_date,
+                      SUM(d.value_sum) / SUM(d.reading_count) AS efficiency,
+                      MIN(d.value_min) AS min_eff,
+                      MAX(d.value_max) AS max_eff,
+                      SUM(d.reading_count) AS reading_count
+               FROM sensor_rollup_daily d
+               JOIN sensors s ON d.sensor_id = s.id
+               WHERE s.machine_id=?
+               GROUP BY d.bucket
                ORDER BY metric_date DESC LIMIT 30""",
             (mid,)
         ).fetchall()
@@ -395,17 +739,17 @@ def machine_details(mid):
             (mid,)
         ).fetchall()
 
-        # Sensor statistics
+        # Sensor statistics from per-sensor running statistics
         sensor_stats = c.execute("""
             SELECT s.name, s.unit,
-                   AVG(r.value) as avg_value,
-                   MIN(r.value) as min_value,
-                   MAX(r.value) as max_value,
-                   COUNT(r.id) as reading_count
+                   st.value_sum / st.reading_count as avg_value,
+                   st.value_min as min_value,
+                   st.value_max as max_value,
+                   COALESCE(st.reading_count, 0) as reading_count
             FROM sensors s
-            LEFT JOIN sensor_readings r ON s.id = r.sensor_id
+            LEFT JOIN sensor_stats st ON s.id = st.sensor_id
             WHERE s.machine_id = ?
-            GROUP BY s.id, s.name, s.unit
+            ORDER BY s.id
         """, (mid,)).fetchall()
 
         # Get OEE data
@@ -454,7 +798,7 @@ def machine_details(mid):
 @login_required
 def oee(mid):
     company_id = get_current_company_id()
-    with db() as c:
+    with db(readonly=True) as c:
         # Verify machine belongs to company
         machine = c.execute(
             "SELECT id FROM machines WHERE id=? AND company_id=?",
@@ -464,7 +808,7 @@ def oee(mid):
             return jsonify({"error": "Machine not found"}), 404
         
         eff = c.execute(
-            """SELECT AVG(value) FROM sensor_readings
+            """SELECT SUM(value_sum) / SUM(reading_count) FROM sensor_stats
                WHERE sensor_id IN (
                  SELECT id FROM sensors WHERE machine_id=?
                )""",
@@ -485,7 +829,7 @@ def oee(mid):
 @login_required
 def reliability(mid):
     company_id = get_current_company_id()
-    with db() as c:
+    with db(readonly=True) as c:
         # Verify machine belongs to company
         machine = c.execute(
             "SELECT id FROM machines WHERE id=? AND company_id=?",
@@ -511,12 +855,32 @@ def reliability(mid):
     })
 
 # ===================== CHARTS =====================
+renderer = render_pool.RenderPool()
+
+def chart_response(name, **data):
+    """Render chart `name` from pre-queried data in the render pool."""
+    requested = request.args.get("quality", "normal", type=str)
+    try:
+        png, quality = renderer.render(name, requested, **data)
+    except (render_pool.RenderPoolBusy, render_pool.RenderTimeout) as e:
+        response = jsonify({"error": f"Chart renderer unavailable: {e}"})
+        response.status_code = 503
+        response.headers["Retry-After"] = "2"
+        return response
+
+    response = app.response_class(png, mimetype="image/png")
+    if quality != requested:
+        # Degraded under load: tell the client and keep it out of the chart cache
+        response.headers["X-Render-Quality"] = quality
+        response.cache_control.no_store = True
+    return response
 
 @app.route("/chart/summary.png")
 @login_required
+@cached_chart("machines", "readings", "alarms")
 def chart_summary():
     company_id = get_current_company_id()
-    with db() as c:
+    with db(readonly=True) as c:
         machines = c.execute(
             "SELECT COUNT(*) FROM machines WHERE company_id = ?",
             (company_id,)
@@ -526,63 +890,21 @@ def chart_summary():
             (company_id,)
         ).fetchone()[0]
         avg_value_result = c.execute("""
-            SELECT AVG(sr.value) FROM sensor_readings sr
-            JOIN sensors s ON sr.sensor_id = s.id
+            SELECT SUM(st.value_sum) / SUM(st.reading_count) FROM sensor_stats st
+            JOIN sensors s ON st.sensor_id = s.id
             JOIN machines m ON s.machine_id = m.id
             WHERE m.company_id = ?
         """, (company_id,)).fetchone()
         avg_value = avg_value_result[0] if avg_value_result and avg_value_result[0] else 0
 
-    fig, ax = plt.subplots(figsize=(8, 4), facecolor='white')
-
-    if machines == 0:
-        ax.text(
-            0.5, 0.5,
-            "No operational data yet",
-            ha="center", va="center",
-            fontsize=14, alpha=0.6,
-            transform=ax.transAxes,
-            color='#666'
-        )
-        ax.set_title("Plant Summary", fontsize=14, fontweight='bold', pad=15)
-        ax.axis("off")
-    else:
-        colors = ['#0a6ed1', '#e9730c', '#107e3e']
-        bars = ax.bar(
-            ["Machines", "Active Alerts", "Avg Sensor"],
-            [machines, alerts, round(avg_value, 1)],
-            color=colors,
-            edgecolor='#003366',
-            linewidth=1.5,
-            alpha=0.9
-        )
-        
-        # Add value labels on bars
-        for bar in bars:
-            height = bar.get_height()
-            ax.text(bar.get_x() + bar.get_width()/2., height,
-                   f'{int(height) if height == int(height) else round(height, 1)}',
-                   ha='center', va='bottom', fontsize=11, fontweight='bold')
-        
-        ax.set_title("Plant Summary", fontsize=14, fontweight='bold', pad=15, color='#003366')
-        ax.grid(axis="y", alpha=0.3, linestyle='--', linewidth=1)
-        ax.set_ylabel("Count", fontsize=11, fontweight='bold')
-        ax.spines['top'].set_visible(False)
-        ax.spines['right'].set_visible(False)
-        ax.tick_params(axis='both', labelsize=10)
-
-    buf = io.BytesIO()
-    plt.tight_layout()
-    plt.savefig(buf, format="png", dpi=120, bbox_inches="tight")
-    plt.close(fig)
-    buf.seek(0)
-    return send_file(buf, mimetype="image/png")
+    return chart_response("summary", machines=machines, alerts=alerts, avg_value=avg_value)
 
 @app.route("/chart/machine/<int:mid>.png")
 @login_required
+@cached_chart("machines", "readings")
 def chart_machine(mid):
     company_id = get_current_company_id()
-    with db() as c:
+    with db(readonly=True) as c:
         # Verify machine belongs to company
         machine = c.execute(
             "SELECT id FROM machines WHERE id=? AND company_id=?",
@@ -600,50 +922,15 @@ def chart_machine(mid):
             (mid,)
         ).fetchall()
 
-    fig, ax = plt.subplots(figsize=(10, 4), facecolor='white')
-
-    if not rows:
-        ax.text(
-            0.5, 0.5,
-            "No Sensor Data",
-            ha="center", va="center",
-            fontsize=14, alpha=0.6,
-            transform=ax.transAxes,
-            color='#666'
-        )
-        ax.axis("off")
-    else:
-        times = [r["timestamp"][-8:] if len(r["timestamp"]) > 8 else r["timestamp"] for r in rows][::-1]
-        values = [float(r["value"]) if r["value"] else 0 for r in rows][::-1]
-        
-        ax.plot(times, values, marker="o", linewidth=3, markersize=6,
-               color='#0a6ed1', markerfacecolor='white', markeredgewidth=2,
-               markeredgecolor='#0a6ed1', alpha=0.9)
-        ax.fill_between(range(len(values)), values, alpha=0.2, color='#0a6ed1')
-        
-        ax.set_title(f"Machine {mid} Sensor Trend", fontsize=14, fontweight='bold', 
-                    pad=15, color='#003366')
-        ax.set_xlabel("Time", fontsize=11, fontweight='bold')
-        ax.set_ylabel("Value", fontsize=11, fontweight='bold')
-        ax.grid(alpha=0.3, linestyle='--', linewidth=1)
-        ax.spines['top'].set_visible(False)
-        ax.spines['right'].set_visible(False)
-        plt.xticks(rotation=45, fontsize=9)
-        plt.yticks(fontsize=9)
-
-    buf = io.BytesIO()
-    plt.tight_layout()
-    plt.savefig(buf, format="png", dpi=120, bbox_inches="tight")
-    plt.close(fig)
-    buf.seek(0)
-    return send_file(buf, mimetype="image/png")
+    return chart_response("machine", machine_id=mid, rows=[tuple(r) for r in rows])
 
 @app.route("/chart/oee/<int:mid>.png")
 @login_required
+@cached_chart("machines", "readings")
 def chart_oee(mid):
     """OEE gauge chart for a machine."""
     company_id = get_current_company_id()
-    with db() as c:
+    with db(readonly=True) as c:
         machine = c.execute(
             "SELECT id FROM machines WHERE id=? AND company_id=?",
             (mid, company_id)
@@ -651,9 +938,9 @@ def chart_oee(mid):
         if not machine:
             return send_file(io.BytesIO(), mimetype="image/png")
 
-        # Calculate OEE directly
+        # Calculate OEE directly from per-sensor running statistics
         result = c.execute(
-            """SELECT AVG(value) FROM sensor_readings
+            """SELECT SUM(value_sum) / SUM(reading_count) FROM sensor_stats
                WHERE sensor_id IN (
                  SELECT id FROM sensors WHERE machine_id=?
                )""",
@@ -664,26 +951,25 @@ def chart_oee(mid):
     availability = 100 if eff > 0 else 0
     oee_val = round((availability/100) * (eff/100) * 100, 1)
 
-    quality = request.args.get("quality", "normal", type=str)
-    buf = viz.oee_gauge_chart(oee_val, quality_mode=quality)
-    return send_file(buf, mimetype="image/png")
+    return chart_response("oee", oee_value=oee_val)
 
 @app.route("/chart/status.png")
 @login_required
+@cached_chart("machines")
 def chart_status():
     """Machine status distribution pie chart."""
     company_id = get_current_company_id()
-    quality = request.args.get("quality", "normal", type=str)
-    with db() as conn:
-        buf = viz.status_pie_chart_from_conn(conn, company_id, quality_mode=quality)
-    return send_file(buf, mimetype="image/png")
+    with db(readonly=True) as conn:
+        rows = viz.status_pie_data(conn, company_id)
+    return chart_response("status", rows=rows)
 
 @app.route("/chart/multi-sensor/<int:mid>.png")
 @login_required
+@cached_chart("machines", "readings")
 def chart_multi_sensor(mid):
     """Multi-sensor trend chart."""
     company_id = get_current_company_id()
-    with db() as c:
+    with db(readonly=True) as c:
         # Verify machine belongs to company
         machine = c.execute(
             "SELECT id FROM machines WHERE id=? AND company_id=?",
@@ -693,52 +979,53 @@ def chart_multi_sensor(mid):
             return send_file(io.BytesIO(), mimetype="image/png")
 
     days = request.args.get("days", 7, type=int)
-    quality = request.args.get("quality", "normal", type=str)
-    with db() as conn:
-        buf = viz.multi_sensor_trend_chart(conn, mid, days, quality_mode=quality)
-    return send_file(buf, mimetype="image/png")
+    max_points, method = downsample.parse_args(request.args)
+    with db(readonly=True) as conn:
+        series = viz.multi_sensor_trend_data(conn, mid, days, max_points, method)
+    return chart_response("multi-sensor", series=series, days=days)
 
 @app.route("/chart/heatmap.png")
 @login_required
+@cached_chart("machines", "readings", "alarms", "maintenance")
 def chart_heatmap():
     """Status heatmap by location."""
     company_id = get_current_company_id()
-    quality = request.args.get("quality", "normal", type=str)
-    with db() as conn:
-        buf = viz.status_heatmap_chart(conn, company_id, quality_mode=quality)
-    return send_file(buf, mimetype="image/png")
+    with db(readonly=True) as conn:
+        rows = viz.status_heatmap_data(conn, company_id)
+    return chart_response("heatmap", rows=rows)
 
 @app.route("/chart/performance.png")
 @login_required
+@cached_chart("machines", "readings")
 def chart_performance():
     """Performance comparison chart."""
     company_id = get_current_company_id()
     days = request.args.get("days", 30, type=int)
-    quality = request.args.get("quality", "normal", type=str)
-    with db() as conn:
-        buf = viz.performance_comparison_chart(conn, days, company_id, quality_mode=quality)
-    return send_file(buf, mimetype="image/png")
+    with db(readonly=True) as conn:
+        rows = viz.performance_comparison_data(conn, days, company_id)
+    return chart_response("performance", rows=rows, days=days)
 
 @app.route("/chart/alerts-trend.png")
 @login_required
+@cached_chart("alarms")
 def chart_alerts_trend():
     """Alert frequency trend chart."""
     company_id = get_current_company_id()
     days = request.args.get("days", 14, type=int)
-    quality = request.args.get("quality", "normal", type=str)
-    with db() as conn:
-        buf = viz.alert_frequency_chart_from_conn(conn, days, company_id, quality_mode=quality)
-    return send_file(buf, mimetype="image/png")
+    with db(readonly=True) as conn:
+        rows = viz.alert_frequency_data(conn, days, company_id)
+    return chart_response("alerts-trend", rows=rows, days=days)
 
 # ===================== DATA APIs FOR CLIENT-SIDE CHARTS =====================
 
 @app.route("/api/chart-data/summary")
 @login_required
+@cached("machines", "readings", "alarms")
 def chart_data_summary():
     """JSON data for client-side chart rendering."""
     company_id = get_current_company_id()
     try:
-        with db() as c:
+        with db(readonly=True) as c:
             machines = c.execute(
                 "SELECT COUNT(*) FROM machines WHERE company_id = ?",
                 (company_id,)
@@ -750,8 +1037,8 @@ def chart_data_summary():
             
             # Handle case where sensor_readings table might be empty
             avg_eff_result = c.execute("""
-                SELECT AVG(sr.value) FROM sensor_readings sr
-                JOIN sensors s ON sr.sensor_id = s.id
+                SELECT SUM(st.value_sum) / SUM(st.reading_count) FROM sensor_stats st
+                JOIN sensors s ON st.sensor_id = s.id
                 JOIN machines m ON s.machine_id = m.id
                 WHERE m.company_id = ?
             """, (company_id,)).fetchone()
@@ -763,14 +1050,14 @@ def chart_data_summary():
                 (company_id,)
             ).fetchall()
             
-            # Recent performance (last 7 days) - handle empty case
+            # Recent performance (last 7 days) from daily rollups - handle empty case
             perf_data = c.execute("""
-                SELECT DATE(sr.timestamp) as d, AVG(sr.value) as eff
-                FROM sensor_readings sr
-                JOIN sensors s ON sr.sensor_id = s.id
+                SELECT r.bucket as d, SUM(r.value_sum) / SUM(r.reading_count) as eff
+                FROM sensor_rollup_daily r
+                JOIN sensors s ON r.sensor_id = s.id
                 JOIN machines m ON s.machine_id = m.id
-                WHERE m.company_id = ? AND sr.timestamp >= date('now', '-7 days')
-                GROUP BY DATE(sr.timestamp)
+                WHERE m.company_id = ? AND r.bucket >= date('now', '-7 days')
+                GROUP BY r.bucket
                 ORDER BY d ASC
             """, (company_id,)).fetchall()
         
@@ -791,12 +1078,14 @@ def chart_data_summary():
             ]
         })
     except Exception as e:
-        # Return empty data structure on error
-        return jsonify({
+        # Return empty data structure on error (never cached)
+        response = jsonify({
             "kpis": {"machines": 0, "alerts": 0, "avg_efficiency": 0},
             "status_distribution": {},
             "performance_trend": []
         })
+        response.cache_control.no_store = True
+        return response
 
 @app.route("/api/chart-data/machine/<int:mid>")
 @login_required
@@ -804,7 +1093,7 @@ def chart_data_machine(mid):
     """JSON data for machine-specific charts."""
     company_id = get_current_company_id()
     try:
-        with db() as c:
+        with db(readonly=True) as c:
             # Verify machine belongs to company
             machine = c.execute(
                 "SELECT id FROM machines WHERE id=? AND company_id=?",
@@ -813,42 +1102,55 @@ def chart_data_machine(mid):
             if not machine:
                 return jsonify({"error": "Machine not found"}), 404
             
-            # Sensor readings (last 100 for better visualization)
-            readings = c.execute("""
-                SELECT timestamp, value, s.name as sensor_name, s.unit
+            # Per-sensor readings over the window, downsampled to max_points each
+            days = request.args.get("days", 7, type=int)
+            max_points, method = downsample.parse_args(request.args, default=200)
+            rows = c.execute("""
+                SELECT s.id, s.name, s.unit, r.timestamp, r.value
                 FROM sensor_readings r
                 JOIN sensors s ON r.sensor_id = s.id
-                WHERE s.machine_id = ?
-                ORDER BY r.timestamp DESC LIMIT 100
-            """, (mid,)).fetchall()
+                WHERE s.machine_id = ? AND r.timestamp >= datetime('now', ?)
+                ORDER BY s.id, r.timestamp
+            """, (mid, f"-{days} days")).fetchall()
+            series = {}
+            for sensor_id, name, unit, timestamp, value in rows:
+                series.setdefault(sensor_id, (name, unit, [], []))
+                series[sensor_id][2].append(timestamp)
+                series[sensor_id][3].append(value)
+            sensor_readings = [
+                (timestamp, value, name, unit)
+                for name, unit, times, values in series.values()
+                for timestamp, value in zip(*downsample.downsample(times, values, max_points, method))
+            ]
             
             # OEE data
             oee_data = oee(mid).get_json()
             
-            # Performance history (30 days)
+            # Performance history (30 days) from daily rollups
             perf = c.execute("""
-                SELECT DATE(timestamp) as d, 
-                       AVG(value) as eff,
-                       MIN(value) as min_eff,
-                       MAX(value) as max_eff,
-                       COUNT(*) as reading_count
-                FROM sensor_readings
-                WHERE sensor_id IN (SELECT id FROM sensors WHERE machine_id=?)
-                GROUP BY DATE(timestamp)
+                SELECT r.bucket as d,
+                       SUM(r.value_sum) / SUM(r.reading_count) as eff,
+                       MIN(r.value_min) as min_eff,
+                       MAX(r.value_max) as max_eff,
+                       SUM(r.reading_count) as reading_count
+                FROM sensor_rollup_daily r
+                JOIN sensors s ON r.sensor_id = s.id
+                WHERE s.machine_id = ?
+                GROUP BY r.bucket
                 ORDER BY d DESC LIMIT 30
             """, (mid,)).fetchall()
             
-            # Sensor statistics
+            # Sensor statistics from per-sensor running statistics
             sensor_stats = c.execute("""
                 SELECT s.name, s.unit,
-                       AVG(r.value) as avg_value,
-                       MIN(r.value) as min_value,
-                       MAX(r.value) as max_value,
-                       COUNT(r.id) as reading_count
+                       st.value_sum / st.reading_count as avg_value,
+                       st.value_min as min_value,
+                       st.value_max as max_value,
+                       COALESCE(st.reading_count, 0) as reading_count
                 FROM sensors s
-                LEFT JOIN sensor_readings r ON s.id = r.sensor_id
+                LEFT JOIN sensor_stats st ON s.id = st.sensor_id
                 WHERE s.machine_id = ?
-                GROUP BY s.id, s.name, s.unit
+                ORDER BY s.id
             """, (mid,)).fetchall()
         
         return jsonify({
@@ -859,8 +1161,14 @@ def chart_data_machine(mid):
                     "sensor": r[2] or "",
                     "unit": r[3] or ""
                 } 
-                for r in readings
+                for r in sensor_readings
             ],
+            "downsampling": {
+                "method": method,
+                "max_points": max_points,
+                "raw_points": len(rows),
+                "points": len(sensor_readings)
+            },
             "oee": oee_data,
             "performance": [
                 {
@@ -899,7 +1207,7 @@ def machine_analytics(mid):
     """Advanced analytics for a machine."""
     company_id = get_current_company_id()
     try:
-        with db() as c:
+        with db(readonly=True) as c:
             # Verify machine belongs to company
             machine = c.execute(
                 "SELECT id FROM machines WHERE id=? AND company_id=?",
@@ -909,7 +1217,7 @@ def machine_analytics(mid):
                 return jsonify({"error": "Machine not found"}), 404
             # Uptime calculation
             total_readings = c.execute("""
-                SELECT COUNT(*) FROM sensor_readings
+                SELECT COALESCE(SUM(reading_count), 0) FROM sensor_stats
                 WHERE sensor_id IN (SELECT id FROM sensors WHERE machine_id=?)
             """, (mid,)).fetchone()[0]
             
@@ -925,22 +1233,22 @@ def machine_analytics(mid):
                 WHERE machine_id=? AND status='completed'
             """, (mid,)).fetchone()[0]
             
-            # Efficiency trend (last 7 days)
+            # Efficiency trend (last 7 days) from daily rollups
             efficiency_trend = c.execute("""
-                SELECT DATE(timestamp) as d, AVG(value) as eff
-                FROM sensor_readings
+                SELECT bucket as d, SUM(value_sum) / SUM(reading_count) as eff
+                FROM sensor_rollup_daily
                 WHERE sensor_id IN (SELECT id FROM sensors WHERE machine_id=?)
-                  AND timestamp >= date('now', '-7 days')
-                GROUP BY DATE(timestamp)
+                  AND bucket >= date('now', '-7 days')
+                GROUP BY bucket
                 ORDER BY d ASC
             """, (mid,)).fetchall()
             
-            # Peak performance time
+            # Peak performance time from the hour-of-day profile
             hourly_perf = c.execute("""
-                SELECT strftime('%H', timestamp) as hour, AVG(value) as avg_eff
-                FROM sensor_readings
+                SELECT hour, SUM(value_sum) / SUM(reading_count) as avg_eff
+                FROM sensor_rollup_hour_of_day
                 WHERE sensor_id IN (SELECT id FROM sensors WHERE machine_id=?)
-                GROUP BY strftime('%H', timestamp)
+                GROUP BY hour
                 ORDER BY avg_eff DESC
                 LIMIT 1
             """, (mid,)).fetchone()
@@ -961,11 +1269,12 @@ def machine_analytics(mid):
 
 @app.route("/api/dashboard/widgets")
 @login_required
+@cached("machines", "readings", "alarms", "maintenance")
 def dashboard_widgets():
     """Enhanced dashboard widget data."""
     company_id = get_current_company_id()
     try:
-        with db() as c:
+        with db(readonly=True) as c:
             # Overall statistics
             total_machines = c.execute("SELECT COUNT(*) FROM machines WHERE company_id = ?", (company_id,)).fetchone()[0]
             running_machines = c.execute("SELECT COUNT(*) FROM machines WHERE status='running' AND company_id = ?", (company_id,)).fetchone()[0]
@@ -973,46 +1282,15 @@ def dashboard_widgets():
             
             # Efficiency metrics
             avg_eff_result = c.execute("""
-                SELECT AVG(sr.value) FROM sensor_readings sr
-                JOIN sensors s ON sr.sensor_id = s.id
+                SELECT SUM(st.value_sum) / SUM(st.reading_count) FROM sensor_stats st
+                JOIN sensors s ON st.sensor_id = s.id
                 JOIN machines m ON s.machine_id = m.id
                 WHERE m.company_id = ?
             """, (company_id,)).fetchone()
             avg_eff = avg_eff_result[0] if avg_eff_result and avg_eff_result[0] else 0
             
-            # Location breakdown
-            location_stats = c.execute("""
-                SELECT m.location, COUNT(*) as count
-                FROM machines m
-                WHERE m.company_id = ?
-                GROUP BY m.location
-            """, (company_id,)).fetchall()
-            
-            # Calculate efficiency per location
-            location_eff = {}
-            for loc in location_stats:
-                loc_name = loc[0]
-                machine_ids = c.execute(
-                    "SELECT id FROM machines WHERE location=? AND company_id=?",
-                    (loc_name, company_id)
-                ).fetchall()
-                if machine_ids:
-                    eff_values = []
-                    for mid in machine_ids:
-                        eff = c.execute("""
-                            SELECT AVG(value) FROM sensor_readings
-                            WHERE sensor_id IN (SELECT id FROM sensors WHERE machine_id=?)
-                        """, (mid[0],)).fetchone()
-                        if eff and eff[0]:
-                            eff_values.append(eff[0])
-                    location_eff[loc_name] = sum(eff_values) / len(eff_values) if eff_values else 0
-                else:
-                    location_eff[loc_name] = 0
-            
-            location_stats = [
-                (loc[0], loc[1], location_eff.get(loc[0], 0))
-                for loc in location_stats
-            ]
+            # Location breakdown (single grouped query)
+            location_stats = fleet.location_breakdown(c, company_id)
             
             # Recent activity
             recent_alerts = c.execute("""
@@ -1040,9 +1318,14 @@ def dashboard_widgets():
             },
             "location_breakdown": [
                 {
-                    "location": l[0],
-                    "machine_count": l[1],
-                    "avg_efficiency": round(l[2] or 0, 1) if l[2] else 0
+                    "location": l["location"],
+                    "machine_count": l["machine_count"],
+                    "running_count": l["running_count"],
+                    "avg_efficiency": round(l["efficiency_machine_weighted"] or 0, 1),
+                    "reading_weighted_efficiency": round(l["efficiency_reading_weighted"] or 0, 1),
+                    "open_alerts": l["open_alerts"],
+                    "pending_maintenance": l["pending_maintenance"],
+                    "status_counts": l["status_counts"]
                 }
                 for l in location_stats
             ],
@@ -1051,14 +1334,31 @@ def dashboard_widgets():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route("/api/timeseries")
+@login_required
+@cached("machines", "readings")
+def timeseries_query():
+    """Bucketed sensor aggregates over any time range (see timeseries.parse_query).
+
+    /api/timeseries?machine_id=3&from=2025-01-01&to=2025-02-01&bucket=6h&agg=avg,max,p95
+    """
+    company_id = get_current_company_id()
+    try:
+        query = timeseries.parse_query(request.args)
+        with db(readonly=True) as c:
+            return jsonify(timeseries.run(c, company_id, query))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
 @app.route("/api/chart-data/alerts")
 @login_required
+@cached("alarms")
 def chart_data_alerts():
     """JSON data for alerts trend chart."""
     company_id = get_current_company_id()
     try:
         days = request.args.get("days", 14, type=int)
-        with db() as c:
+        with db(readonly=True) as c:
             data = c.execute("""
                 SELECT date(raised_at) as d, COUNT(*) as cnt, severity
                 FROM alarms
@@ -1083,8 +1383,10 @@ def chart_data_alerts():
             ]
         })
     except Exception as e:
-        # Return empty trend on error
-        return jsonify({"trend": []})
+        # Return empty trend on error (never cached)
+        response = jsonify({"trend": []})
+        response.cache_control.no_store = True
+        return response
 
 # ===================== ALERTS API =====================
 
@@ -1104,28 +1406,39 @@ def alerts():
         if not all(k in data for k in required):
             return jsonify({"error": "Missing required fields"}), 400
         
-        with db() as c:
+        def create(c):
             # Verify machine belongs to company
             machine = c.execute(
                 "SELECT id FROM machines WHERE id=? AND company_id=?",
                 (data["machine_id"], company_id)
             ).fetchone()
             if not machine:
-                return jsonify({"error": "Machine not found"}), 404
+                return None, False
             
-            cursor = c.execute(
-                """INSERT INTO alarms (machine_id, severity, message, raised_at, acknowledged, company_id)
-                   VALUES (?, ?, ?, datetime('now'), 0, ?)""",
-                (data["machine_id"], data["severity"], data["message"], company_id)
+            # Repeats fold into the open alarm and each machine's new alarms are rate limited
+            alarm, created = alarm_engine.record_alarm(
+                c, company_id, machine["id"], data["severity"], data["message"], limiter=alarms.limiter
             )
-            c.commit()
-            alert_id = cursor.lastrowid
-            log(session.get('username', 'system'), "create", "alarm", alert_id)
-            return jsonify({"success": True, "id": alert_id}), 201
+            invalidate(c, company_id, "alarms")
+            return alarm, created
+
+        alarm, created = db_writer.run(create)
+        if alarm is None:
+            return jsonify({"error": "Machine not found"}), 404
+        notify(company_id, "alarm.raised", alarm)
+        if created:
+            log(session.get('username', 'system'), "create", "alarm", alarm["id"])
+        return jsonify({
+            "success": True,
+            "id": alarm["id"],
+            "occurrences": alarm["occurrences"],
+            "coalesced": not created,
+            "suppressed": alarm["suppressed"]
+        }), 201 if created else 200
     
     # GET - List alerts for this company
     ack_filter = request.args.get("ack")
-    with db() as c:
+    with db(readonly=True) as c:
         query = """SELECT a.*, m.name as machine 
                    FROM alarms a 
                    LEFT JOIN machines m ON a.machine_id = m.id
@@ -1137,7 +1450,8 @@ def alerts():
             query += " AND a.acknowledged = ?"
             params.append(ack_val)
         
-        query += " ORDER BY a.raised_at DESC LIMIT 100"
+        # Recurring alarms stay near the top while they keep occurring
+        query += " ORDER BY COALESCE(a.last_seen_at, a.raised_at) DESC LIMIT 100"
         rows = c.execute(query, params).fetchall()
     
     return jsonify([dict(r) for r in rows])
@@ -1151,16 +1465,8 @@ def acknowledge_alert(alert_id):
     user = session.get('username', 'system')
     comment = data.get("comment")
     
-    with db() as c:
-        # Verify alert belongs to company
-        alert = c.execute(
-            "SELECT id FROM alarms WHERE id=? AND company_id=?",
-            (alert_id, company_id)
-        ).fetchone()
-        if not alert:
-            return jsonify({"error": "Alert not found"}), 404
-        
-        c.execute(
+    def acknowledge(c):
+        cursor = c.execute(
             """UPDATE alarms 
                SET acknowledged = 1, 
                    acknowledged_by = ?,
@@ -1169,11 +1475,127 @@ def acknowledge_alert(alert_id):
                WHERE id = ? AND company_id = ?""",
             (user, comment, alert_id, company_id)
         )
-        c.commit()
-        log(user, "acknowledge", "alarm", alert_id)
+        # No row means the alert does not exist or belongs to another company
+        if cursor.rowcount:
+            invalidate(c, company_id, "alarms")
+        return cursor.rowcount
+
+    if not db_writer.run(acknowledge):
+        return jsonify({"error": "Alert not found"}), 404
+    log(user, "acknowledge", "alarm", alert_id)
+    notify(company_id, "alarm.acknowledged", {"id": alert_id, "acknowledged_by": user, "comment": comment})
     
     return jsonify({"success": True, "message": "Alert acknowledged"})
 
+@app.route("/api/alerts/ack", methods=["POST"])
+@login_required
+def acknowledge_alerts():
+    """Acknowledge many alerts in one transaction.
+
+    {"ids": [1, 2, 3], "comment": "..."} or
+    {"filter": {"machine_id": 3, "severity": ["warning", "critical"],
+                "since": "2025-01-01", "until": "2025-01-02"}, "comment": "..."}
+    Returns a per-id status; a filter handles up to bulk.MAX_ITEMS unacknowledged
+    alerts per call and sets "more" and "next_after_id" when there are more
+    (repeat with filter.after_id set to it).
+    """
+    company_id = get_current_company_id()
+    data = request.get_json(silent=True) or {}
+    user = session.get('username', 'system')
+    comment = data.get("comment")
+    try:
+        selection = bulk.parse_selection(data, bulk.ALARMS)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    def acknowledge(c):
+        outcome = bulk.acknowledge_alarms(c, company_id, selection, user, comment)
+        if outcome[1]:
+            invalidate(c, company_id, "alarms")
+        return outcome
+
+    results, ids, next_after_id = db_writer.run(acknowledge)
+    if ids:
+        audit_log.record_many(user, "acknowledge", "alarm", ids, company_id)
+        notify(company_id, "alarm.acknowledged", {"ids": ids, "acknowledged_by": user, "comment": comment})
+    return jsonify({"success": True, "acknowledged": len(ids), "more": next_after_id is not None,
+                    "next_after_id": next_after_id, "results": results})
+
+# ===================== ALARM RULES API =====================
+
+@app.route("/api/alarm-rules", methods=["GET", "POST"])
+@login_required
+def alarm_rules():
+    """List or create alarm rules evaluated at ingest (see alarm_engine)."""
+    company_id = get_current_company_id()
+    if request.method == "GET":
+        with db(readonly=True) as c:
+            return jsonify(alarm_engine.rules(c, company_id))
+
+    try:
+        rule = alarm_engine.parse_rule(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    def create(c):
+        if not company_sensor(c, company_id, rule["sensor_id"]):
+            return None
+        cursor = c.execute(
+            f"""INSERT INTO alarm_rules (company_id, {', '.join(rule)})
+                VALUES (?, {', '.join('?' * len(rule))})""",
+            (company_id, *rule.values())
+        )
+        invalidate(c, company_id, "alarm_rules")
+        return cursor.lastrowid
+
+    rule_id = db_writer.run(create)
+    if rule_id is None:
+        return jsonify({"error": "Sensor not found"}), 404
+    log(session.get('username', 'system'), "create", "alarm_rule", rule_id)
+    return jsonify({"success": True, "id": rule_id}), 201
+
+def company_sensor(c, company_id, sensor_id):
+    return c.execute(
+        "SELECT s.id FROM sensors s JOIN machines m ON s.machine_id = m.id WHERE s.id = ? AND m.company_id = ?",
+        (sensor_id, company_id)
+    ).fetchone()
+
+@app.route("/api/alarm-rules/<int:rule_id>", methods=["PUT", "DELETE"])
+@login_required
+def alarm_rule(rule_id):
+    """Replace or delete an alarm rule; its active alarm is cleared either way."""
+    company_id = get_current_company_id()
+    rule = None
+    if request.method == "PUT":
+        try:
+            rule = alarm_engine.parse_rule(request.get_json(silent=True))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+    def apply(c):
+        """Returns the error message, or None once applied."""
+        if not c.execute("SELECT id FROM alarm_rules WHERE id = ? AND company_id = ?", (rule_id, company_id)).fetchone():
+            return "Rule not found"
+        if rule is not None:
+            if not company_sensor(c, company_id, rule["sensor_id"]):
+                return "Sensor not found"
+            c.execute(
+                f"UPDATE alarm_rules SET {', '.join(f'{k} = ?' for k in rule)} WHERE id = ?",
+                (*rule.values(), rule_id)
+            )
+        else:
+            c.execute("DELETE FROM alarm_rules WHERE id = ?", (rule_id,))
+        c.execute(
+            "UPDATE alarms SET cleared_at = datetime('now') WHERE company_id = ? AND rule_key = ? AND cleared_at IS NULL",
+            (company_id, f"r{rule_id}")
+        )
+        invalidate(c, company_id, "alarm_rules", "alarms")
+
+    error = db_writer.run(apply)
+    if error:
+        return jsonify({"error": error}), 404
+    log(session.get('username', 'system'), "update" if rule else "delete", "alarm_rule", rule_id)
+    notify(company_id)
+    return jsonify({"success": True})
+
 # ===================== MAINTENANCE API =====================
 
 @app.route("/api/maintenance", methods=["GET", "POST"])
@@ -1192,14 +1614,14 @@ def maintenance():
         if not all(k in data for k in required):
             return jsonify({"error": "Missing required fields"}), 400
         
-        with db() as c:
+        def create(c):
             # Verify machine belongs to company
             machine = c.execute(
                 "SELECT id FROM machines WHERE id=? AND company_id=?",
                 (data["machine_id"], company_id)
             ).fetchone()
             if not machine:
-                return jsonify({"error": "Machine not found"}), 404
+                return None
             
             cursor = c.execute(
                 """INSERT INTO maintenance_tasks 
@@ -1213,14 +1635,22 @@ def maintenance():
                  data.get("status", "open"),
                  company_id)
             )
-            c.commit()
-            task_id = cursor.lastrowid
-            log(session.get('username', 'system'), "create", "maintenance", task_id)
-            return jsonify({"success": True, "id": task_id, "ok": True}), 201
+            invalidate(c, company_id, "maintenance")
+            return cursor.lastrowid
+
+        task_id = db_writer.run(create)
+        if task_id is None:
+            return jsonify({"error": "Machine not found"}), 404
+        notify(company_id, "maintenance.created", {
+            "id": task_id, "machine_id": data["machine_id"],
+            "priority": data.get("priority", "medium"), "status": data.get("status", "open")
+        })
+        log(session.get('username', 'system'), "create", "maintenance", task_id)
+        return jsonify({"success": True, "id": task_id, "ok": True}), 201
     
     # GET - List maintenance tasks for this company
     status_filter = request.args.get("status")
-    with db() as c:
+    with db(readonly=True) as c:
         query = """SELECT t.*, m.name as machine 
                    FROM maintenance_tasks t 
                    LEFT JOIN machines m ON t.machine_id = m.id
@@ -1245,60 +1675,219 @@ def update_maintenance(task_id):
     if not data:
         return jsonify({"error": "No data provided"}), 400
     
-    updates = []
-    params = []
-    
-    if "status" in data:
-        updates.append("status = ?")
-        params.append(data["status"])
-    
-    if "technician" in data:
-        updates.append("technician = ?")
-        params.append(data["technician"])
-    
-    if "scheduled_date" in data:
-        updates.append("scheduled_date = ?")
-        params.append(data["scheduled_date"])
-    
-    if "priority" in data:
-        updates.append("priority = ?")
-        params.append(data["priority"])
-    
-    if data.get("status") == "completed":
-        updates.append("completed_at = datetime('now')")
-    
-    if not updates:
-        return jsonify({"error": "No fields to update"}), 400
-    
+    try:
+        updates, params, changes = bulk.parse_task_changes(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     params.extend([task_id, company_id])
     
-    with db() as c:
-        # Verify task belongs to company
-        task = c.execute(
-            "SELECT id FROM maintenance_tasks WHERE id=? AND company_id=?",
-            (task_id, company_id)
-        ).fetchone()
-        if not task:
-            return jsonify({"error": "Task not found"}), 404
-        
-        c.execute(
-            f"UPDATE maintenance_tasks SET {', '.join(updates)} WHERE id = ? AND company_id = ?",
+    def update(c):
+        # Scoped to the company: no row means the task is not found
+        cursor = c.execute(
+            f"UPDATE maintenance_tasks SET {updates} WHERE id = ? AND company_id = ?",
             params
         )
-        c.commit()
-        log(session.get('username', 'system'), "update", "maintenance", task_id)
+        if cursor.rowcount:
+            invalidate(c, company_id, "maintenance")
+        return cursor.rowcount
+
+    if not db_writer.run(update):
+        return jsonify({"error": "Task not found"}), 404
+    log(session.get('username', 'system'), "update", "maintenance", task_id)
+    notify(company_id, "maintenance.updated", {"id": task_id, **changes})
     
     return jsonify({"success": True, "message": "Task updated"})
 
+@app.route("/api/maintenance/bulk", methods=["PUT"])
+@login_required
+def update_maintenance_bulk():
+    """Apply the same changes to many maintenance tasks in one transaction.
+
+    {"ids": [4, 5], "status": "completed"} or
+    {"filter": {"machine_id": [1, 2], "status": "open", "since": "2025-03-01"},
+     "technician": "J. Doe", "scheduled_date": "2025-03-10"}
+    `since` / `until` match scheduled_date. Returns a per-id status; a filter
+    handles up to bulk.MAX_ITEMS tasks per call in id order and sets "more" and
+    "next_after_id" when there are more (repeat with filter.after_id set to it).
+    """
+    company_id = get_current_company_id()
+    data = request.get_json(silent=True) or {}
+    user = session.get('username', 'system')
+    try:
+        selection = bulk.parse_selection(data, bulk.TASKS)
+        updates, params, changes = bulk.parse_task_changes(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    def update(c):
+        outcome = bulk.update_tasks(c, company_id, selection, updates, params)
+        if outcome[1]:
+            invalidate(c, company_id, "maintenance")
+        return outcome
+
+    results, ids, next_after_id = db_writer.run(update)
+    if ids:
+        audit_log.record_many(user, "update", "maintenance", ids, company_id)
+        notify(company_id, "maintenance.updated", {"ids": ids, **changes})
+    return jsonify({"success": True, "updated": len(ids), "more": next_after_id is not None,
+                    "next_after_id": next_after_id, "results": results})
+
 # ===================== CSV UPLOAD & VISUALIZATION =====================
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def save_upload(file):
+    """Write an upload under a temporary name in UPLOAD_FOLDER; returns (path, content_hash, size)."""
+    upload_path = os.path.join(UPLOAD_FOLDER, f".upload-{uuid4().hex}.csv")
+    try:
+        content_hash, size = dataset_catalog.save_upload(file.stream, upload_path)
+    except Exception:
+        if os.path.exists(upload_path):
+            os.remove(upload_path)
+        raise
+    return upload_path, content_hash, size
+
+def reuse_upload(company_id, content_hash):
+    """The company's converted dataset with this content (marked used), or None."""
+    def find(c):
+        entry = dataset_catalog.find(c, company_id, content_hash)
+        if entry:
+            dataset_catalog.touch(c, entry["id"], force=True)
+        return entry
+
+    entry = db_writer.run(find)
+    if entry and columnar.ColumnarDataset.exists(os.path.join(UPLOAD_FOLDER, entry["storage"])):
+        return entry
+    return None
+
+def convert_upload(company_id, filename, upload_path, content_hash, progress=None):
+    """Convert a saved upload into a columnar store and catalogue it; returns the entry.
+
+    Raises ValueError if the file is not valid CSV.
+    """
+    # Converted next to its final directory and renamed into place once complete
+    storage = dataset_catalog.storage_name(company_id, content_hash)
+    target = os.path.join(UPLOAD_FOLDER, storage)
+    store = columnar.ColumnarWriter(f"{target}.tmp-{uuid4().hex}")
+    try:
+        profile = datasets.profile_csv(upload_path, store=store, progress=progress)
+        store.close(profile, source=filename)
+        if os.path.isdir(target) and not columnar.ColumnarDataset.exists(target):
+            shutil.rmtree(target, ignore_errors=True)
+        try:
+            os.rename(store.directory, target)
+        except OSError:
+            # The same content was converted concurrently; keep that copy
+            store.abort()
+    except Exception:
+        store.abort()
+        raise
+
+    size_bytes = dataset_catalog.directory_size(target)
+
+    def register(c):
+        entry = dataset_catalog.register(
+            c, company_id, filename.rsplit(".", 1)[0], content_hash, profile, storage, size_bytes
+        )
+        return entry, dataset_catalog.evict(c, company_id, keep=entry["id"])
+
+    entry, evicted = db_writer.run(register)
+    dataset_catalog.discard(UPLOAD_FOLDER, evicted)
+    return entry
+
+def import_upload(file, response):
+    """Add an uploaded CSV to the company's dataset catalogue.
+
+    Returns (entry, reused, job_id). Content the company has uploaded before
+    is not parsed again; its existing columnar store is reused. Files of
+    ASYNC_UPLOAD_BYTES or more (any file with ?async=1) are converted by a
+    "dataset.convert" job instead: entry is None and job_id is set, and
+    `response` ("csv" or "dataset") picks the shape of the job's result.
+    Raises ValueError if the file is not valid CSV.
+    """
+    company_id = get_current_company_id()
+    filename = secure_filename(file.filename)
+    upload_path, content_hash, size = save_upload(file)
+    queued = False
+    try:
+        entry = reuse_upload(company_id, content_hash)
+        if entry:
+            return entry, True, None
+        if size >= ASYNC_UPLOAD_BYTES or request.args.get("async") == "1":
+            with db(readonly=True) as c:
+                job_id = job_queue.submit(c, company_id, "dataset.convert", {
+                    "filename": filename,
+                    "upload": os.path.basename(upload_path),
+                    "content_hash": content_hash,
+                    "size": size,
+                    "response": response
+                }, session.get('username', 'system'))
+            queued = True
+            return None, False, job_id
+        return convert_upload(company_id, filename, upload_path, content_hash), False, None
+    finally:
+        if not queued and os.path.exists(upload_path):
+            os.remove(upload_path)
+
+def run_dataset_convert(job):
+    """Job handler: convert an upload saved by import_upload()."""
+    upload_path = os.path.join(UPLOAD_FOLDER, job.params["upload"])
+    if not os.path.exists(upload_path):
+        raise ValueError("The uploaded file is no longer available; upload it again")
+    job.progress(0, "Converting", force=True)
+    entry = convert_upload(
+        job.company_id, job.params["filename"], upload_path, job.params["content_hash"],
+        progress=lambda rows: job.progress(None, f"{rows} rows converted")
+    )
+    # Kept on failure so that the job can be retried; purge_upload() removes it eventually
+    os.remove(upload_path)
+    return {"dataset_id": entry["id"], "cache_key": entry["cache_key"], "row_count": entry["row_count"]}
+
+def purge_upload(job):
+    upload_path = os.path.join(UPLOAD_FOLDER, job["params"]["upload"])
+    if os.path.exists(upload_path):
+        os.remove(upload_path)
+
+def upload_job_result(job):
+    """Result of a finished "dataset.convert" job, shaped like the route that queued it."""
+    with db(readonly=True) as c:
+        entry = dataset_catalog.get(c, get_current_company_id(), job["result"]["dataset_id"])
+    if entry is None or not columnar.ColumnarDataset.exists(os.path.join(UPLOAD_FOLDER, entry["storage"])):
+        return jsonify({"error": "Dataset not found"}), 404
+    if job["params"]["response"] == "dataset":
+        return jsonify(dataset_upload_response(entry, False))
+    return jsonify(csv_upload_response(entry, False))
+
+job_queue.register("dataset.convert", run_dataset_convert, cleanup=purge_upload)
+job_results["dataset.convert"] = upload_job_result
+
+def csv_upload_response(entry, reused):
+    dataset = columnar.ColumnarDataset(os.path.join(UPLOAD_FOLDER, entry["storage"]))
+    data = {
+        "columns": dataset.columns,
+        "rows": dataset.rows(0, datasets.PREVIEW_ROWS),
+        "row_count": dataset.row_count,
+        "filename": dataset.meta["source"],
+        "profile": entry["columns"]
+    }
+    return {
+        "success": True,
+        "cache_key": entry["cache_key"],
+        "dataset_id": entry["id"],
+        "reused": reused,
+        "data": data,
+        "message": f"CSV {'already uploaded' if reused else 'uploaded successfully'}. {data['row_count']} rows, {len(data['columns'])} columns"
+    }
+
 @app.route("/api/upload-csv", methods=["POST"])
 @login_required
 def upload_csv():
-    """Upload and parse CSV file for visualization."""
+    """Upload and parse CSV file for visualization.
+
+    Large files (or ?async=1) return 202 with a job id; the job's result is
+    this route's usual response.
+    """
     if 'file' not in request.files:
         return jsonify({"error": "No file provided"}), 400
     
@@ -1307,55 +1896,109 @@ def upload_csv():
         return jsonify({"error": "No file selected"}), 400
     
     if file and allowed_file(file.filename):
-        filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
-        
         try:
-            # Parse CSV
-            df = pd.read_csv(filepath)
-            
-            # Convert to JSON-serializable format
-            data = {
-                "columns": df.columns.tolist(),
-                "rows": df.head(1000).to_dict('records'),  # Limit to 1000 rows
-                "row_count": len(df),
-                "filename": filename
-            }
-            
-            # Store in session/cache for visualization
-            cache_key = f"csv_{filename}_{datetime.now().timestamp()}"
-            cache_file = os.path.join(UPLOAD_FOLDER, f"{cache_key}.json")
-            with open(cache_file, 'w') as f:
-                json.dump(data, f)
-            
-            return jsonify({
-                "success": True,
-                "cache_key": cache_key,
-                "data": data,
-                "message": f"CSV uploaded successfully. {len(df)} rows, {len(df.columns)} columns"
-            })
-        except Exception as e:
+            entry, reused, job_id = import_upload(file, "csv")
+        except ValueError as e:
             return jsonify({"error": f"Error parsing CSV: {str(e)}"}), 400
+        if job_id:
+            return job_accepted(job_id)
+        
+        return jsonify(csv_upload_response(entry, reused))
     
     return jsonify({"error": "Invalid file type"}), 400
 
+def open_csv_dataset(cache_key):
+    """Columnar store of one of the company's catalogued datasets, or None."""
+    with db(readonly=True) as c:
+        entry = dataset_catalog.by_storage(c, get_current_company_id(), cache_key)
+    return open_catalog_dataset(entry)
+
+def open_catalog_dataset(entry):
+    if entry is None:
+        return None
+    directory = os.path.join(UPLOAD_FOLDER, entry["storage"])
+    if not columnar.ColumnarDataset.exists(directory):
+        return None
+    # Last-used bookkeeping only: no need to wait for the commit, and not
+    # worth failing a read over when the write queue is full
+    try:
+        db_writer.submit(dataset_catalog.touch, entry["id"])
+    except writer.WriterBusy:
+        pass
+    return columnar.ColumnarDataset(directory)
+
+def dataset_page(dataset):
+    """Rows of a columnar dataset selected by ?offset=0&limit=1000&columns=a,b."""
+    offset = max(0, request.args.get("offset", 0, type=int))
+    limit = max(1, min(request.args.get("limit", 1000, type=int), 10000))
+    columns = request.args.get("columns")
+    columns = [c for c in columns.split(",") if c in dataset.columns] if columns else dataset.columns
+    return {
+        "columns": columns,
+        "rows": dataset.rows(offset, offset + limit, columns),
+        "row_count": dataset.row_count,
+        "offset": offset,
+        "filename": dataset.meta["source"],
+        "profile": [c for c in dataset.meta["columns"] if c["name"] in columns]
+    }
+
 @app.route("/api/csv-data/<cache_key>")
 @login_required
 def get_csv_data(cache_key):
-    """Retrieve cached CSV data."""
-    cache_file = os.path.join(UPLOAD_FOLDER, f"{cache_key}.json")
-    try:
-        with open(cache_file, 'r') as f:
-            return jsonify(json.load(f))
-    except:
+    """Retrieve uploaded CSV data.
+
+    ?offset=0&limit=1000&columns=a,b reads only that row range and those
+    columns from the columnar store.
+    """
+    dataset = open_csv_dataset(cache_key)
+    if dataset is None:
+        # Uploads from before the dataset catalogue were cached as JSON
+        cache_file = os.path.join(UPLOAD_FOLDER, f"{secure_filename(cache_key)}.json")
+        try:
+            with open(cache_file, 'r') as f:
+                return jsonify(json.load(f))
+        except:
+            return jsonify({"error": "Data not found"}), 404
+    return jsonify(dataset_page(dataset))
+
+@app.route("/api/csv-data/<cache_key>/stats")
+@login_required
+def get_csv_stats(cache_key):
+    """Aggregates over whole columns (?columns=a,b, default all) of an uploaded CSV."""
+    dataset = open_csv_dataset(cache_key)
+    if dataset is None:
         return jsonify({"error": "Data not found"}), 404
+    columns = request.args.get("columns")
+    columns = columns.split(",") if columns else dataset.columns
+    unknown = [c for c in columns if c not in dataset.columns]
+    if unknown:
+        return jsonify({"error": f"Unknown column(s): {', '.join(unknown)}"}), 400
+    return jsonify({
+        "row_count": dataset.row_count,
+        "columns": [dataset.stats(c) for c in columns]
+    })
 
 @app.route("/api/csv-visualize", methods=["POST"])
 @login_required
 def visualize_csv():
-    """Generate visualization data from CSV."""
+    """Generate visualization data from CSV.
+
+    With {"dataset_id": ...} the stored dataset is summarised server-side
+    over all of its rows; otherwise the posted columns/rows are used.
+    """
     data = request.json
+    if data and 'dataset_id' in data:
+        with db(readonly=True) as c:
+            entry = dataset_catalog.get(c, get_current_company_id(), data['dataset_id'])
+        dataset = open_catalog_dataset(entry)
+        if dataset is None:
+            return jsonify({"error": "Dataset not found"}), 404
+        key = (get_current_company_id(), "dataset_overview", entry["storage"])
+        result = response_cache.get(key)
+        if result is None:
+            result = dataset_query.overview(dataset)
+            response_cache.set(key, result, tags=("datasets",), ttl=dataset_query.RESULT_TTL)
+        return jsonify({"success": True, **result})
     if not data or 'columns' not in data or 'rows' not in data:
         return jsonify({"error": "Invalid data"}), 400
     
@@ -1410,53 +2053,119 @@ def get_all_machines_data():
     """Get all machines with performance data for reports."""
     company_id = get_current_company_id()
     try:
-        with db() as c:
-            machines = c.execute(
-                "SELECT * FROM machines WHERE company_id = ? ORDER BY id",
-                (company_id,)
-            ).fetchall()
-            
-            result = []
-            for m in machines:
-                machine_dict = dict(m)
-                # Get latest efficiency
-                efficiency = c.execute("""
-                    SELECT AVG(value) FROM sensor_readings sr
-                    JOIN sensors s ON sr.sensor_id = s.id
-                    WHERE s.machine_id = ?
-                    ORDER BY sr.timestamp DESC LIMIT 10
-                """, (m['id'],)).fetchone()
-                
-                machine_dict['efficiency'] = round(efficiency[0] or 0, 2) if efficiency and efficiency[0] else 0
-                machine_dict['last_updated'] = machine_dict.get('last_seen', 'N/A')
-                result.append(machine_dict)
-            
-            return jsonify(result)
+        with db(readonly=True) as c:
+            result, total = fleet.fleet_query(c, company_id, **fleet_args())
+        
+        for machine_dict in result:
+            machine_dict['last_updated'] = machine_dict.get('last_seen', 'N/A')
+        
+        response = jsonify(result)
+        response.headers["X-Total-Count"] = str(total)
+        return response
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @app.route("/api/data/sensors/all")
 @login_required
 def get_all_sensors_data():
-    """Get all sensor readings for reports."""
+    """Sensor readings for reports, newest first, one keyset page at a time.
+
+    ?limit=500&cursor=<X-Next-Cursor>&machine_id=&sensor_id=&sensor=&since=&until=
+    """
     company_id = get_current_company_id()
     try:
-        with db() as c:
-            readings = c.execute("""
-                SELECT sr.id, sr.value, sr.timestamp,
-                       s.name as sensor_name, s.unit,
-                       m.id as machine_id, m.name as machine_name
-                FROM sensor_readings sr
-                JOIN sensors s ON sr.sensor_id = s.id
-                JOIN machines m ON s.machine_id = m.id
-                WHERE m.company_id = ?
-                ORDER BY sr.timestamp DESC LIMIT 500
-            """, (company_id,)).fetchall()
-            
-            return jsonify([dict(r) for r in readings])
+        filters = readings.parse_filters(request.args)
+        with db(readonly=True) as c:
+            rows, next_cursor = readings.page(
+                c, company_id, filters,
+                cursor=request.args.get("cursor"),
+                limit=request.args.get("limit", readings.DEFAULT_LIMIT, type=int)
+            )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+    response = jsonify(rows)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+        response.headers["Link"] = f'<{url_for(request.endpoint, **{**request.args.to_dict(), "cursor": next_cursor})}>; rel="next"'
+    return response
+
+EXPORT_FORMATS = {"csv": (readings.export_csv, "text/csv"), "ndjson": (readings.export_ndjson, "application/x-ndjson")}
+
+@app.route("/api/data/sensors/export")
+@login_required
+def export_sensors_data():
+    """Stream every matching reading (oldest first) as CSV or NDJSON.
+
+    ?format=csv|ndjson plus the same filters as /api/data/sensors/all.
+    With ?async=1 the file is written by a background job instead and
+    downloaded from /api/jobs/<id>/result.
+    """
+    company_id = get_current_company_id()
+    fmt = request.args.get("format", "csv")
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"error": "format must be csv or ndjson"}), 400
+    try:
+        filters = readings.parse_filters(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    filename = f"sensor_readings_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{fmt}"
+    if request.args.get("async") == "1":
+        return submit_job("export", {"format": fmt, "filters": filters, "filename": filename})
+
+    encode, mimetype = EXPORT_FORMATS[fmt]
+    body = encode(readings.iter_rows(db(readonly=True), company_id, filters))
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
+
+def export_path(job):
+    return os.path.join(EXPORT_FOLDER, f"job_{job['id']}.{job['params']['format']}")
+
+def run_export(job):
+    """Job handler: write a readings export to EXPORT_FOLDER."""
+    path = export_path({"id": job.id, "params": job.params})
+    rows = 0
+
+    def counted(batches):
+        nonlocal rows
+        for batch in batches:
+            rows += len(batch)
+            job.progress(None, f"{rows} rows exported")
+            yield batch
+
+    encode, _ = EXPORT_FORMATS[job.params["format"]]
+    tmp = f"{path}.tmp"
+    try:
+        with open(tmp, "w", newline="") as f:
+            for chunk in encode(counted(readings.iter_rows(db(readonly=True), job.company_id, job.params["filters"]))):
+                f.write(chunk)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return {"filename": job.params["filename"], "rows": rows, "bytes": os.path.getsize(path)}
+
+def purge_export(job):
+    if os.path.exists(export_path(job)):
+        os.remove(export_path(job))
+
+def export_job_result(job):
+    path = export_path(job)
+    if not os.path.exists(path):
+        return jsonify({"error": "Export file no longer available"}), 404
+    return send_file(
+        os.path.abspath(path), mimetype=EXPORT_FORMATS[job["params"]["format"]][1],
+        as_attachment=True, download_name=job["result"]["filename"]
+    )
+
+job_queue.register("export", run_export, cleanup=purge_export)
+job_results["export"] = export_job_result
+
 @app.route("/api/data/machines/<int:mid>", methods=["PUT"])
 @login_required
 def update_machine_data(mid):
@@ -1466,51 +2175,53 @@ def update_machine_data(mid):
     if not data:
         return jsonify({"error": "No data provided"}), 400
     
-    # Verify machine belongs to company
-    with db() as c:
-        machine = c.execute(
-            "SELECT id FROM machines WHERE id=? AND company_id=?",
-            (mid, company_id)
-        ).fetchone()
-        if not machine:
-            return jsonify({"error": "Machine not found"}), 404
-        
-        updates = []
-        params = []
-        
-        if "name" in data:
-            updates.append("name = ?")
-            params.append(data["name"])
-        
-        if "type" in data:
-            updates.append("type = ?")
-            params.append(data["type"])
-        
-        if "location" in data:
-            updates.append("location = ?")
-            params.append(data["location"])
-        
-        if "status" in data:
-            updates.append("status = ?")
-            params.append(data["status"])
-        
-        if "rated_capacity" in data:
-            updates.append("rated_capacity = ?")
-            params.append(data["rated_capacity"])
-        
-        if not updates:
-            return jsonify({"error": "No fields to update"}), 400
-        
-        params.extend([mid, company_id])
-        
-        c.execute(
+    updates = []
+    params = []
+    
+    if "name" in data:
+        updates.append("name = ?")
+        params.append(data["name"])
+    
+    if "type" in data:
+        updates.append("type = ?")
+        params.append(data["type"])
+    
+    if "location" in data:
+        updates.append("location = ?")
+        params.append(data["location"])
+    
+    if "status" in data:
+        updates.append("status = ?")
+        params.append(data["status"])
+    
+    if "rated_capacity" in data:
+        updates.append("rated_capacity = ?")
+        params.append(data["rated_capacity"])
+    
+    if not updates:
+        return jsonify({"error": "No fields to update"}), 400
+    
+    params.extend([mid, company_id])
+    
+    def update(c):
+        # Scoped to the company: no row means the machine is not found
+        cursor = c.execute(
             f"UPDATE machines SET {', '.join(updates)} WHERE id = ? AND company_id = ?",
             params
         )
-        c.commit()
-        log(session.get('username', 'system'), "update", "machine", mid)
-        
-        return jsonify({"success": True, "message": "Machine updated"})
+        if cursor.rowcount:
+            invalidate(c, company_id, "machines")
+        return cursor.rowcount
+
+    if not db_writer.run(update):
+        return jsonify({"error": "Machine not found"}), 404
+    log(session.get('username', 'system'), "update", "machine", mid)
+    notify(company_id, "machine.updated", {
+        "id": mid,
+        **{k: data[k] for k in ("name", "type", "location", "status", "rated_capacity") if k in data}
+    })
+    
+    return jsonify({"success": True, "message": "Machine updated"})
 
 @app.route("/api/data/sensors/<int:sid>", methods=["PUT"])
 @login_required
@@ -1521,17 +2232,18 @@ def update_sensor_reading(sid):
     if not data:
         return jsonify({"error": "No data provided"}), 400
     
-    with db() as c:
+    def update(c):
+        """Returns (error, status) or None once the reading is updated."""
         # Verify sensor reading belongs to company
         reading = c.execute("""
-            SELECT sr.id FROM sensor_readings sr
+            SELECT sr.id, sr.sensor_id, sr.value, sr.timestamp FROM sensor_readings sr
             JOIN sensors s ON sr.sensor_id = s.id
             JOIN machines m ON s.machine_id = m.id
             WHERE sr.id = ? AND m.company_id = ?
         """, (sid, company_id)).fetchone()
         
         if not reading:
-            return jsonify({"error": "Sensor reading not found"}), 404
+            return "Sensor reading not found", 404
         
         updates = []
         params = []
@@ -1541,11 +2253,15 @@ def update_sensor_reading(sid):
             params.append(float(data["value"]))
         
         if "timestamp" in data:
+            # Normalise to 'YYYY-MM-DD HH:MM:SS' so rollup buckets stay consistent
+            timestamp = c.execute("SELECT datetime(?)", (data["timestamp"],)).fetchone()[0]
+            if timestamp is None:
+                return "Invalid timestamp", 400
             updates.append("timestamp = ?")
-            params.append(data["timestamp"])
+            params.append(timestamp)
         
         if not updates:
-            return jsonify({"error": "No fields to update"}), 400
+            return "No fields to update", 400
         
         params.append(sid)
         
@@ -1553,10 +2269,23 @@ def update_sensor_reading(sid):
             f"UPDATE sensor_readings SET {', '.join(updates)} WHERE id = ?",
             params
         )
-        c.commit()
-        log(session.get('username', 'system'), "update", "sensor_reading", sid)
-        
-        return jsonify({"success": True, "message": "Sensor reading updated"})
+        updated = c.execute(
+            "SELECT sensor_id, value, timestamp FROM sensor_readings WHERE id = ?", (sid,)
+        ).fetchone()
+        rollups.readings_changed(
+            c,
+            removed=[(reading["sensor_id"], reading["value"], reading["timestamp"])],
+            added=[tuple(updated)]
+        )
+        invalidate(c, company_id, "readings")
+
+    error = db_writer.run(update)
+    if error:
+        return jsonify({"error": error[0]}), error[1]
+    log(session.get('username', 'system'), "update", "sensor_reading", sid)
+    notify(company_id)
+    
+    return jsonify({"success": True, "message": "Sensor reading updated"})
 
 @app.route("/api/data/sensors/<int:sid>", methods=["DELETE"])
 @login_required
@@ -1564,120 +2293,366 @@ def delete_sensor_reading(sid):
     """Delete sensor reading."""
     company_id = get_current_company_id()
     
-    with db() as c:
+    def delete(c):
         # Verify sensor reading belongs to company
         reading = c.execute("""
-            SELECT sr.id FROM sensor_readings sr
+            SELECT sr.id, sr.sensor_id, sr.value, sr.timestamp FROM sensor_readings sr
             JOIN sensors s ON sr.sensor_id = s.id
             JOIN machines m ON s.machine_id = m.id
             WHERE sr.id = ? AND m.company_id = ?
         """, (sid, company_id)).fetchone()
         
         if not reading:
-            return jsonify({"error": "Sensor reading not found"}), 404
+            return False
         
         c.execute("DELETE FROM sensor_readings WHERE id = ?", (sid,))
-        c.commit()
-        log(session.get('username', 'system'), "delete", "sensor_reading", sid)
-        
-        return jsonify({"success": True, "message": "Sensor reading deleted"})
+        rollups.readings_changed(
+            c, removed=[(reading["sensor_id"], reading["value"], reading["timestamp"])]
+        )
+        invalidate(c, company_id, "readings")
+        return True
+
+    if not db_writer.run(delete):
+        return jsonify({"error": "Sensor reading not found"}), 404
+    log(session.get('username', 'system'), "delete", "sensor_reading", sid)
+    notify(company_id)
+    
+    return jsonify({"success": True, "message": "Sensor reading deleted"})
+
+# ===================== INGESTION =====================
+# Threshold / rate-of-change rules evaluated on every ingested batch
+alarms = alarm_engine.AlarmEngine()
+
+@app.route("/api/ingest/readings", methods=["POST"])
+@login_required
+def ingest_readings():
+    """Bulk-ingest sensor readings (NDJSON, CSV or JSON array body)."""
+    company_id = get_current_company_id()
+    batch_size = request.args.get("batch_size", ingest.BATCH_SIZE, type=int)
+    batch_size = max(1, min(batch_size, 50000))
+    
+    failure = None
+    try:
+        records = ingest.iter_records(request.stream, request.content_type)
+        # Batches are written by db_writer while the next one is parsed
+        with db(readonly=True) as c:
+            result = ingest.ingest(c, company_id, records, batch_size=batch_size, alarms=alarms, writer=db_writer)
+    except ingest.PartialIngest as e:
+        # Earlier batches are committed: report them along with the error
+        failure, result = e.error, e.summary
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    changes = result.pop("alarms")
+    if result["accepted"]:
+        # Each batch bumped the data versions when it committed; drop this process's copies
+        tags = ["readings", "machines"] + (["alarms"] if changes["raised"] or changes["cleared"] else [])
+        response_cache.invalidate(company_id, tags)
+    log(session.get('username', 'system'), "ingest", "sensor_reading")
+    for alarm in changes["raised"]:
+        bus.publish(company_id, "alarm.raised", alarm)
+    for alarm in changes["cleared"]:
+        bus.publish(company_id, "alarm.cleared", alarm)
+    result["alarms"] = {"raised": len(changes["raised"]), "cleared": len(changes["cleared"])}
+    if result["accepted"]:
+        notify(company_id, "readings.ingested", {"accepted": result["accepted"]})
+    if failure is not None:
+        result["error"] = str(failure)
+        if isinstance(failure, writer.WriterBusy):
+            return jsonify(result), 503, {"Retry-After": "1"}
+        return jsonify(result), 400 if isinstance(failure, ValueError) else 500
+    status = 200 if result["accepted"] or not result["rejected"] else 422
+    return jsonify(result), status
 
 # ===================== DEMO DATA & DATASET MANAGEMENT =====================
+def run_demo_generate(job):
+    """Job handler: generate demo machines, readings, alarms and tasks."""
+    from demo_data import generate_demo_data
+    job.progress(0, "Generating demo data", force=True)
+    try:
+        # Cancelling stops after the current machine; what was generated stays
+        result = generate_demo_data(
+            job.company_id, job.params["num_machines"], job.params["days"], writer=db_writer,
+            progress=lambda done, total: job.progress(done / total * 0.9, f"Readings for {done} of {total} machines",
+                                                      force=True)
+        )
+    finally:
+        db_writer.run(invalidate, job.company_id, *cache.TAGS)
+        notify(job.company_id, "resync")
+    return {
+        "success": True,
+        "message": "Demo data generated successfully",
+        "data": result
+    }
+
+def run_demo_clear(job):
+    """Job handler: delete all of a company's plant data.
+
+    The delete is one transaction, so the job cannot be cancelled once running.
+    """
+    company_id = job.company_id
+
+    def clear(c):
+        # Delete in order to respect foreign keys
+        rollups.purge_company(c, company_id)
+        c.execute("DELETE FROM sensor_readings WHERE sensor_id IN (SELECT id FROM sensors WHERE machine_id IN (SELECT id FROM machines WHERE company_id = ?))", (company_id,))
+        c.execute("DELETE FROM sensors WHERE machine_id IN (SELECT id FROM machines WHERE company_id = ?)", (company_id,))
+        c.execute("DELETE FROM alarms WHERE company_id = ?", (company_id,))
+        c.execute("DELETE FROM maintenance_tasks WHERE company_id = ?", (company_id,))
+        c.execute("DELETE FROM machines WHERE company_id = ?", (company_id,))
+        invalidate(c, company_id, *cache.TAGS)
+
+    db_writer.run(clear)
+    notify(company_id, "resync")
+    return {"success": True, "message": "Demo data cleared"}
+
+job_queue.register("demo.generate", run_demo_generate)
+job_queue.register("demo.clear", run_demo_clear, cancellable=False)
+
 @app.route("/api/demo/generate", methods=["POST"])
 @login_required
 def generate_demo_data():
-    """Generate demo data for testing"""
-    company_id = get_current_company_id()
+    """Generate demo data for testing (as a background job; returns 202)"""
     data = request.json or {}
-    num_machines = data.get("num_machines", 5)
-    days_of_data = data.get("days", 30)
-    
     try:
-        from demo_data import generate_demo_data
-        result = generate_demo_data(company_id, num_machines, days_of_data)
-        return jsonify({
-            "success": True,
-            "message": "Demo data generated successfully",
-            "data": result
-        })
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        num_machines = int(data.get("num_machines", 5))
+        days_of_data = int(data.get("days", 30))
+    except (TypeError, ValueError):
+        return jsonify({"error": "num_machines and days must be integers"}), 400
+    if num_machines < 1 or days_of_data < 1:
+        return jsonify({"error": "num_machines and days must be positive"}), 400
+    return submit_job("demo.generate", {"num_machines": num_machines, "days": days_of_data})
 
 @app.route("/api/demo/clear", methods=["POST"])
 @login_required
 def clear_demo_data():
-    """Clear demo data for current company"""
-    company_id = get_current_company_id()
-    
-    try:
-        with db() as c:
-            # Delete in order to respect foreign keys
-            c.execute("DELETE FROM sensor_readings WHERE sensor_id IN (SELECT id FROM sensors WHERE machine_id IN (SELECT id FROM machines WHERE company_id = ?))", (company_id,))
-            c.execute("DELETE FROM sensors WHERE machine_id IN (SELECT id FROM machines WHERE company_id = ?)", (company_id,))
-            c.execute("DELETE FROM alarms WHERE company_id = ?", (company_id,))
-            c.execute("DELETE FROM maintenance_tasks WHERE company_id = ?", (company_id,))
-            c.execute("DELETE FROM machines WHERE company_id = ?", (company_id,))
-            c.commit()
-        
-        return jsonify({"success": True, "message": "Demo data cleared"})
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    """Clear demo data for current company (as a background job; returns 202)"""
+    return submit_job("demo.clear")
 
 @app.route("/api/datasets", methods=["GET"])
 @login_required
 def list_datasets():
-    """List available datasets"""
-    # This would typically come from a database or file system
-    # For now, return empty list - client-side will handle IndexedDB
-    return jsonify({"datasets": []})
+    """List the company's catalogued datasets, most recently used first."""
+    with db(readonly=True) as c:
+        entries = dataset_catalog.entries(c, get_current_company_id())
+    return jsonify({
+        "datasets": entries,
+        "total_bytes": sum(e["size_bytes"] for e in entries),
+        "quota_bytes": dataset_catalog.QUOTA
+    })
+
+@app.route("/api/datasets/<int:dataset_id>", methods=["GET"])
+@login_required
+def get_dataset(dataset_id):
+    """Catalogue entry plus a page of rows (?offset, ?limit, ?columns as /api/csv-data)."""
+    with db(readonly=True) as c:
+        entry = dataset_catalog.get(c, get_current_company_id(), dataset_id)
+    dataset = open_catalog_dataset(entry)
+    if dataset is None:
+        return jsonify({"error": "Dataset not found"}), 404
+    return jsonify({**entry, **dataset_page(dataset)})
+
+def query_dataset_cached(entry, dataset, body):
+    """Run a dataset query, cached per (dataset, normalised query)."""
+    query = dataset_query.parse_query(dataset, body)
+    company_id = get_current_company_id()
+    key = (company_id, "dataset_query", entry["storage"], json.dumps(query, sort_keys=True))
+    result = response_cache.get(key)
+    if result is None:
+        result = dataset_query.run(dataset, query)
+        response_cache.set(key, result, tags=("datasets",), ttl=dataset_query.RESULT_TTL)
+        return result, False
+    return result, True
+
+@app.route("/api/datasets/<int:dataset_id>/query", methods=["POST"])
+@login_required
+def query_dataset(dataset_id):
+    """Filter / aggregate / histogram / top-N over a stored dataset (see dataset_query)."""
+    with db(readonly=True) as c:
+        entry = dataset_catalog.get(c, get_current_company_id(), dataset_id)
+    dataset = open_catalog_dataset(entry)
+    if dataset is None:
+        return jsonify({"error": "Dataset not found"}), 404
+    try:
+        result, hit = query_dataset_cached(entry, dataset, request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    response = jsonify(result)
+    response.headers["X-Cache"] = "HIT" if hit else "MISS"
+    return response
+
+def run_dataset_import(job):
+    """Job handler: load a stored dataset with a parsed import plan.
+
+    Cancelling stops after the current batch; batches already committed stay.
+    """
+    company_id = job.company_id
+    with db(readonly=True) as c:
+        entry = dataset_catalog.get(c, company_id, job.params["dataset_id"])
+    if entry is None or not columnar.ColumnarDataset.exists(os.path.join(UPLOAD_FOLDER, entry["storage"])):
+        raise ValueError("Dataset not found")
+    dataset = columnar.ColumnarDataset(os.path.join(UPLOAD_FOLDER, entry["storage"]))
+    imported = 0
+
+    def progress(done, total, readings):
+        nonlocal imported
+        imported = readings
+        job.progress(done / max(total, 1), f"{done} of {total} rows, {readings} readings")
+
+    try:
+        return dataset_import.run(None, company_id, dataset, job.params["plan"], progress=progress,
+                                  writer=db_writer, alarms=alarms)
+    finally:
+        response_cache.invalidate(company_id, ["machines", "readings", "alarms"])
+        if imported:
+            notify(company_id, "resync")
+
+job_queue.register("dataset.import", run_dataset_import)
+
+@app.route("/api/datasets/<int:dataset_id>/import", methods=["POST"])
+@login_required
+def import_dataset(dataset_id):
+    """Load a stored dataset into machines, sensors and readings in the background.
+
+    Body: an import plan (see dataset_import). Returns 202 with the job id;
+    poll /api/jobs/<id> for progress.
+    """
+    company_id = get_current_company_id()
+    with db(readonly=True) as c:
+        entry = dataset_catalog.get(c, company_id, dataset_id)
+    dataset = open_catalog_dataset(entry)
+    if dataset is None:
+        return jsonify({"error": "Dataset not found"}), 404
+    try:
+        plan = dataset_import.parse_plan(dataset, request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    log(session.get('username', 'system'), "import", "dataset", dataset_id)
+    return submit_job("dataset.import", {"dataset_id": dataset_id, "plan": plan})
+
+@app.route("/api/datasets/<int:dataset_id>", methods=["DELETE"])
+@login_required
+def delete_dataset(dataset_id):
+    """Remove a dataset from the catalogue and delete its stored data."""
+    storage = db_writer.run(dataset_catalog.remove, get_current_company_id(), dataset_id)
+    if storage is None:
+        return jsonify({"error": "Dataset not found"}), 404
+    dataset_catalog.discard(UPLOAD_FOLDER, [storage])
+    response_cache.invalidate(get_current_company_id(), ["datasets"])
+    log(session.get('username', 'system'), "delete", "dataset", dataset_id)
+    return jsonify({"success": True, "message": "Dataset deleted"})
+
+def dataset_upload_response(entry, reused):
+    stored = columnar.ColumnarDataset(os.path.join(UPLOAD_FOLDER, entry["storage"]))
+    dataset = {
+        "id": entry["id"],
+        "name": entry["name"],
+        "cache_key": entry["cache_key"],
+        "columns": entry["columns"],
+        "rows": stored.rows(0, datasets.PREVIEW_ROWS),  # First 1000 rows
+        "row_count": entry["row_count"]
+    }
+    return {
+        "success": True,
+        "reused": reused,
+        "dataset": dataset
+    }
 
 @app.route("/api/datasets/upload", methods=["POST"])
 @login_required
 def upload_dataset():
-    """Upload and process dataset file"""
+    """Upload and process dataset file (large files as a job, see /api/upload-csv)"""
     if 'file' not in request.files:
         return jsonify({"error": "No file provided"}), 400
     
     file = request.files['file']
     if file.filename == '':
         return jsonify({"error": "No file selected"}), 400
+    if not file.filename.lower().endswith('.csv'):
+        return jsonify({"error": "Unsupported file type"}), 400
     
     try:
-        # Save file
-        filename = secure_filename(file.filename)
-        filepath = os.path.join(UPLOAD_FOLDER, filename)
-        file.save(filepath)
-        
-        # Process based on file type
-        if filename.endswith('.csv'):
-            import pandas as pd
-            df = pd.read_csv(filepath)
-            dataset = {
-                "name": filename.replace('.csv', ''),
-                "columns": [{"name": col, "type": "numeric" if pd.api.types.is_numeric_dtype(df[col]) else "text"} for col in df.columns],
-                "rows": df.to_dict('records')[:1000],  # Limit to 1000 rows
-                "row_count": len(df)
-            }
-        else:
-            return jsonify({"error": "Unsupported file type"}), 400
-        
-        return jsonify({
-            "success": True,
-            "dataset": dataset
-        })
+        entry, reused, job_id = import_upload(file, "dataset")
+        if job_id:
+            return job_accepted(job_id)
+        return jsonify(dataset_upload_response(entry, reused))
+    except ValueError as e:
+        return jsonify({"error": f"Error parsing CSV: {str(e)}"}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+# ===================== AUDIT LOG =====================
+
+@app.route("/api/audit")
+@login_required
+def audit_entries():
+    """This company's audit trail, newest first.
+
+    ?entity=alarm&entity_id=42&user=&action=&limit=100&before=<id of the last entry seen>
+    """
+    company_id = get_current_company_id()
+    filters = {k: request.args.get(k) for k in audit.FILTERS}
+    if filters["entity_id"] is not None:
+        filters["entity_id"] = request.args.get("entity_id", type=int)
+        if filters["entity_id"] is None:
+            return jsonify({"error": "entity_id must be an integer"}), 400
+    limit = max(1, min(request.args.get("limit", 100, type=int), 1000))
+    return jsonify(audit_log.entries(company_id, filters, request.args.get("before", type=int), limit))
+
 # ===================== HEALTH =====================
 @app.route("/health")
 def health():
     try:
-        with db() as c:
+        with db(readonly=True) as c:
             c.execute("SELECT 1").fetchone()
         return jsonify({"status": "ok"})
     except:
         return jsonify({"status": "error"}), 500
 
+@app.route("/health/db")
+def health_db():
+    """Connection pool statistics for monitoring."""
+    return jsonify(pool.stats())
+
+@app.route("/health/events")
+def health_events():
+    """Live event bus statistics for this worker."""
+    return jsonify(bus.stats())
+
+@app.route("/health/render")
+def health_render():
+    """Chart render pool statistics for this worker."""
+    return jsonify(renderer.stats())
+
+@app.route("/health/jobs")
+def health_jobs():
+    """Background job queue statistics for this worker."""
+    return jsonify(job_queue.stats())
+
+@app.route("/health/writer")
+def health_writer():
+    """Single-writer queue and group commit counters for this worker."""
+    return jsonify(db_writer.stats())
+
+@app.route("/health/audit")
+def health_audit():
+    """Audit writer queue and batch counters for this worker."""
+    return jsonify(audit_log.stats())
+
+@app.route("/health/alarms")
+def health_alarms():
+    """Alarm engine counters for this worker."""
+    return jsonify(alarms.stats())
+
+@app.route("/health/cache")
+def health_cache():
+    """Response and chart cache counters for this worker."""
+    return jsonify({
+        "responses": response_cache.stats(),
+        "charts": chart_cache.stats()
+    })
+
 # ===================== RUN =====================
 if __name__ == "__main__":
     app.run(host="127.0.0.1", port=8000, debug=True)
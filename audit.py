@@ -0,0 +1,227 @@
+"""
+Audit Log
+Write-behind audit trail: record() queues an entry and returns at once, a
+writer thread per process inserts queued entries in batched transactions.
+
+Requests no longer pay for a second transaction (or wait on the database
+lock) to write their audit entry. Entries carry the time they were
+recorded, not the time they were flushed. The buffer is bounded at
+AUDIT_BUFFER entries: when it is full, record() waits up to
+AUDIT_BLOCK_SECONDS for the writer before dropping the entry (counted in
+stats()). close() flushes what is left and runs at interpreter exit.
+
+Set AUDIT_DB to keep the log in its own SQLite file so audit writes and
+their indexes never touch the main database.
+"""
+import atexit
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+import dbpool
+
+PATH = os.environ.get("AUDIT_DB") or None
+BUFFER = int(os.environ.get("AUDIT_BUFFER", 10000))
+BATCH = int(os.environ.get("AUDIT_BATCH", 500))
+FLUSH_SECONDS = float(os.environ.get("AUDIT_FLUSH_SECONDS", 0.5))
+BLOCK_SECONDS = float(os.environ.get("AUDIT_BLOCK_SECONDS", 2))
+RETRY_SECONDS = 1.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS audit_log (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user TEXT NOT NULL,
+    action TEXT NOT NULL,
+    entity TEXT NOT NULL,
+    entity_id INTEGER,
+    timestamp TEXT DEFAULT CURRENT_TIMESTAMP,
+    company_id INTEGER
+);
+"""
+INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_audit_log_timestamp ON audit_log(timestamp);
+CREATE INDEX IF NOT EXISTS idx_audit_log_user ON audit_log(user);
+CREATE INDEX IF NOT EXISTS idx_audit_log_company ON audit_log(company_id, id);
+CREATE INDEX IF NOT EXISTS idx_audit_log_entity ON audit_log(company_id, entity, entity_id);
+"""
+INSERT = "INSERT INTO audit_log(user,action,entity,entity_id,company_id,timestamp) VALUES (?,?,?,?,?,?)"
+FILTERS = ("user", "action", "entity", "entity_id")
+
+
+def ensure_schema(conn):
+    """Create audit_log (or add company_id to an older one) and its indexes."""
+    conn.executescript(SCHEMA)
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(audit_log)")}
+    if "company_id" not in columns:
+        conn.execute("ALTER TABLE audit_log ADD COLUMN company_id INTEGER")
+    conn.executescript(INDEXES)
+
+
+def _now():
+    return datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def entries(conn, company_id, filters=None, before=None, limit=100):
+    """A company's audit entries, newest first; `before` is the last id of the previous page."""
+    where = ["company_id = ?"]
+    params = [company_id]
+    for key in FILTERS:
+        if (filters or {}).get(key) not in (None, ""):
+            where.append(f"{key} = ?")
+            params.append(filters[key])
+    if before:
+        where.append("id < ?")
+        params.append(before)
+    rows = conn.execute(
+        f"""SELECT id, timestamp, user, action, entity, entity_id FROM audit_log
+            WHERE {' AND '.join(where)} ORDER BY id DESC LIMIT ?""",
+        (*params, limit)
+    ).fetchall()
+    return [dict(r) for r in rows]
+
+
+class AuditLog:
+    """Bounded in-process queue of audit entries with a batching writer thread."""
+
+    def __init__(self, path, buffer=BUFFER, batch=BATCH, flush_seconds=FLUSH_SECONDS):
+        self.path = path
+        self.buffer = buffer
+        self.batch = batch
+        self.flush_seconds = flush_seconds
+        self._cond = threading.Condition()
+        self._queue = deque()
+        self._pid = None
+        self._thread = None
+        self._closing = False
+        self._flushing = 0
+        self._queued = 0
+        self._written = 0
+        self._stats = {"written": 0, "batches": 0, "dropped": 0, "errors": 0, "last_error": None}
+        atexit.register(self.close)
+
+    def record(self, user, action, entity, entity_id=None, company_id=None):
+        """Queue one audit entry; returns False if it had to be dropped."""
+        return self.record_many(user, action, entity, [entity_id], company_id) == 1
+
+    def record_many(self, user, action, entity, entity_ids, company_id=None):
+        """Queue one entry per id with a single lock round trip; returns how many were queued."""
+        now = _now()
+        rows = [(user, action, entity, i, company_id, now) for i in entity_ids]
+        with self._cond:
+            self._start()
+            if len(self._queue) + len(rows) > self.buffer:
+                self._cond.notify_all()
+                self._cond.wait_for(lambda: len(self._queue) + len(rows) <= self.buffer, BLOCK_SECONDS)
+            room = max(0, min(len(rows), self.buffer - len(self._queue)))
+            self._stats["dropped"] += len(rows) - room
+            self._queue.extend(rows[:room])
+            self._queued += room
+            self._cond.notify_all()
+        return room
+
+    def _start(self):
+        """Start this process's writer (again after a fork); call with the lock held."""
+        if self._pid == os.getpid():
+            return
+        # Entries copied from the parent are the parent's to write
+        self._pid = os.getpid()
+        self._queue.clear()
+        self._queued = self._written = 0
+        self._closing = False
+        self._thread = threading.Thread(target=self._write, name="audit-writer", daemon=True)
+        self._thread.start()
+
+    def _take(self):
+        """Wait for entries, let a batch fill for up to flush_seconds, then pop it."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._queue or self._closing)
+            deadline = time.monotonic() + self.flush_seconds
+            while (len(self._queue) < self.batch and not self._closing and not self._flushing
+                   and time.monotonic() < deadline):
+                self._cond.wait(deadline - time.monotonic())
+            return [self._queue.popleft() for _ in range(min(self.batch, len(self._queue)))]
+
+    def _write(self):
+        conn = None
+        batch = []
+        failures = 0
+        while True:
+            if not batch:
+                batch = self._take()
+                if not batch:
+                    break
+            try:
+                if conn is None:
+                    conn = dbpool.connect(self.path)
+                    ensure_schema(conn)
+                conn.executemany(INSERT, batch)
+                conn.commit()
+            except sqlite3.Error as e:
+                # Keep the batch and retry; entries are never lost to a busy database
+                if conn is not None:
+                    conn.rollback()
+                failures += 1
+                with self._cond:
+                    self._stats["errors"] += 1
+                    self._stats["last_error"] = str(e)
+                    if self._closing and failures >= 3:
+                        self._stats["dropped"] += len(batch) + len(self._queue)
+                        break
+                time.sleep(RETRY_SECONDS)
+                continue
+            failures = 0
+            with self._cond:
+                self._written += len(batch)
+                self._stats["written"] += len(batch)
+                self._stats["batches"] += 1
+                self._cond.notify_all()
+            batch = []
+        if conn is not None:
+            conn.close()
+
+    def flush(self, timeout=5.0):
+        """Wait until every entry queued so far is written; returns False on timeout."""
+        with self._cond:
+            if self._pid != os.getpid():
+                return True
+            target = self._queued
+            self._flushing += 1
+            self._cond.notify_all()
+            try:
+                return self._cond.wait_for(lambda: self._written >= target, timeout)
+            finally:
+                self._flushing -= 1
+
+    def close(self, timeout=10.0):
+        """Flush remaining entries and stop the writer (registered with atexit)."""
+        with self._cond:
+            if self._pid != os.getpid() or self._closing:
+                return
+            self._closing = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+
+    def entries(self, company_id, filters=None, before=None, limit=100):
+        """Read the log, after flushing so callers see their own writes."""
+        self.flush()
+        conn = dbpool.connect(self.path, readonly=True)
+        try:
+            return entries(conn, company_id, filters, before, limit)
+        except sqlite3.OperationalError:
+            # Nothing written to a separate audit database yet
+            return []
+        finally:
+            conn.close()
+
+    def stats(self):
+        with self._cond:
+            return {
+                **self._stats,
+                "queued": len(self._queue),
+                "buffer": self.buffer,
+                "batch": self.batch,
+                "path": self.path,
+            }
@@ -0,0 +1,661 @@
+"""
+Performance Benchmarks
+Self-contained throughput checks run against a scratch database built from
+schema.sql (the real imcs.db is never touched).
+
+Usage:
+    python benchmarks.py ingest [rows] [batch_size]
+    python benchmarks.py fleet [machines]
+    python benchmarks.py render [renders] [threads]      (exits 2 unless every PNG is byte-identical)
+    python benchmarks.py render-pool [renders] [pool_size]
+    python benchmarks.py export [rows]
+    python benchmarks.py datasets [scale]
+    python benchmarks.py import [scale]
+    python benchmarks.py alarms [rows] [batch_size]
+    python benchmarks.py bulk [alarms]
+    python benchmarks.py audit [entries] [threads]
+    python benchmarks.py writer [writes] [threads]
+"""
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import dbpool
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SAMPLE_CSV = os.path.join(HERE, "data", "uploads", "equipment_anomaly_data.csv")
+
+SCHEMA = os.path.join(HERE, "schema.sql")
+
+
+def scratch_db(num_machines=20, sensors_per_machine=5):
+    """Create a temporary database with one company and a small fleet.
+
+    Returns (path, company_id, sensor_ids).
+    """
+    fd, path = tempfile.mkstemp(suffix=".db", prefix="imcs-bench-")
+    os.close(fd)
+    conn = dbpool.connect(path)
+    with open(SCHEMA) as f:
+        conn.executescript(f.read())
+    company_id = conn.execute("INSERT INTO companies (name) VALUES ('Benchmark Co')").lastrowid
+    sensor_ids = []
+    for i in range(num_machines):
+        machine_id = conn.execute(
+            "INSERT INTO machines (name, type, location, status, company_id) VALUES (?, 'Press', 'Line A', 'running', ?)",
+            (f"Machine {i + 1}", company_id)
+        ).lastrowid
+        for j in range(sensors_per_machine):
+            sensor_ids.append(conn.execute(
+                "INSERT INTO sensors (machine_id, name, unit, min_threshold, max_threshold) VALUES (?, ?, '%', 0, 100)",
+                (machine_id, f"Sensor {j + 1}")
+            ).lastrowid)
+    conn.commit()
+    conn.close()
+    return path, company_id, sensor_ids
+
+
+def synthetic_records(sensor_ids, rows, start=None):
+    """Gateway-style records at 1-second spacing across all sensors."""
+    start = start or datetime(2025, 1, 1)
+    for i in range(rows):
+        yield {
+            "sensor_id": sensor_ids[i % len(sensor_ids)],
+            "value": round(random.uniform(40, 95), 2),
+            "timestamp": (start + timedelta(seconds=i // len(sensor_ids))).isoformat()
+        }
+
+
+def bench_ingest(rows=200000, batch_size=5000):
+    """Sustained rows/second through ingest.ingest()."""
+    import ingest
+
+    path, company_id, sensor_ids = scratch_db()
+    try:
+        records = list(synthetic_records(sensor_ids, rows))
+        conn = dbpool.connect(path)
+        started = time.perf_counter()
+        result = ingest.ingest(conn, company_id, records, batch_size=batch_size)
+        elapsed = time.perf_counter() - started
+        stored = conn.execute("SELECT COUNT(*) FROM sensor_readings").fetchone()[0]
+        conn.close()
+    finally:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+    print(f"Ingested {result['accepted']} rows in {len(result['batches'])} batches "
+          f"of {batch_size} ({result['rejected']} rejected, {stored} stored)")
+    print(f"   - elapsed: {elapsed:.2f}s")
+    print(f"   - throughput: {result['accepted'] / elapsed:,.0f} rows/second")
+    return result
+
+
+def bench_fleet(num_machines=2000, repeats=20):
+    """Latency of the single-query fleet listing for a large tenant."""
+    import fleet
+    import ingest
+
+    path, company_id, sensor_ids = scratch_db(num_machines=num_machines, sensors_per_machine=3)
+    try:
+        conn = dbpool.connect(path)
+        fleet.ensure_schema(conn)
+        ingest.ingest(conn, company_id, synthetic_records(sensor_ids, len(sensor_ids) * 20))
+
+        timings = {}
+        for label, kwargs in (
+            ("full list", {}),
+            ("page of 50 by efficiency", {"sort": "efficiency", "order": "desc", "limit": 50}),
+            ("status filter", {"filters": {"status": ["running"]}, "limit": 50}),
+        ):
+            started = time.perf_counter()
+            for _ in range(repeats):
+                rows, total = fleet.fleet_query(conn, company_id, **kwargs)
+            timings[label] = (time.perf_counter() - started) * 1000 / repeats
+        conn.close()
+    finally:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+    print(f"Fleet listing for {num_machines} machines ({len(sensor_ids)} sensors):")
+    for label, ms in timings.items():
+        print(f"   - {label}: {ms:.1f} ms")
+    return timings
+
+
+def bench_render(renders=400, threads=8):
+    """Render every chart concurrently and check the PNGs are byte-identical
+    to a serial reference render; returns False (and the command exits 2)
+    on any mismatch, including two serial renders that already differ."""
+    import visualization as viz
+
+    path, company_id, sensor_ids = scratch_db(num_machines=6, sensors_per_machine=4)
+    local = threading.local()
+
+    def conn():
+        if not hasattr(local, "conn"):
+            local.conn = dbpool.connect(path, readonly=True)
+        return local.conn
+
+    charts = {
+        "summary": lambda: viz.summary_bar_chart(6, 2, 71.4),
+        "machine": lambda: viz.machine_trend_chart(
+            1, conn().execute("SELECT timestamp, value FROM sensor_readings ORDER BY timestamp DESC LIMIT 50").fetchall()),
+        "oee": lambda: viz.oee_gauge_chart(72.5),
+        "status": lambda: viz.status_pie_chart_from_conn(conn(), company_id),
+        "alerts-trend": lambda: viz.alert_frequency_chart_from_conn(conn(), 14, company_id),
+        "multi-sensor": lambda: viz.multi_sensor_trend_chart_from_conn(conn(), 1, 7),
+        "heatmap": lambda: viz.status_heatmap_chart_from_conn(conn(), company_id),
+        "performance": lambda: viz.performance_comparison_chart_from_conn(conn(), 30, company_id),
+    }
+    try:
+        import ingest
+        writer = dbpool.connect(path)
+        ingest.ingest(writer, company_id, synthetic_records(sensor_ids, len(sensor_ids) * 30,
+                                                            start=datetime.utcnow() - timedelta(hours=1)))
+        writer.close()
+
+        reference = {name: render().getvalue() for name, render in charts.items()}
+        unstable = [name for name, render in charts.items() if render().getvalue() != reference[name]]
+        names = list(charts)
+        jobs = [names[i % len(names)] for i in range(renders)]
+
+        def run(name):
+            return name, charts[name]().getvalue()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            results = list(executor.map(run, jobs))
+        elapsed = time.perf_counter() - started
+    finally:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+    mismatches = [name for name, png in results if png != reference[name]]
+    print(f"Rendered {len(results)} charts on {threads} threads in {elapsed:.2f}s "
+          f"({len(results) / elapsed:.1f} charts/second)")
+    print(f"   - byte-identical to serial render: {len(results) - len(mismatches)}/{len(results)}")
+    if unstable:
+        print(f"FAIL: serial renders differ between runs: {sorted(unstable)}", file=sys.stderr)
+    if mismatches:
+        print(f"FAIL: concurrent renders differ from the serial render: {sorted(set(mismatches))}", file=sys.stderr)
+    return not mismatches and not unstable
+
+
+def bench_render_pool(renders=200, size=None):
+    """Chart throughput with 8 request threads rendering in-process versus
+    dispatching pre-queried data to render_pool."""
+    import render_pool
+    import visualization as viz
+
+    size = size or render_pool.POOL_SIZE
+    path, company_id, _ = scratch_db(num_machines=6, sensors_per_machine=4)
+    try:
+        conn = dbpool.connect(path, readonly=True)
+        jobs = [
+            ("status", {"rows": viz.status_pie_data(conn, company_id)}),
+            ("heatmap", {"rows": viz.status_heatmap_data(conn, company_id)}),
+            ("performance", {"rows": viz.performance_comparison_data(conn, 30, company_id), "days": 30}),
+            ("alerts-trend", {"rows": viz.alert_frequency_data(conn, 14, company_id), "days": 14}),
+        ]
+        conn.close()
+    finally:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+    work = [jobs[i % len(jobs)] for i in range(renders)]
+
+    inline = render_pool.RenderPool(size=0)
+    pool = render_pool.RenderPool(size=size, max_queue=renders)
+    pool.render("oee", oee_value=50)  # wait for the workers to finish warming up
+    timings = {}
+    for label, target in (("in-process", inline), (f"pool of {size}", pool)):
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(lambda job: target.render(job[0], **job[1]), work))
+        timings[label] = time.perf_counter() - started
+    pool.shutdown()
+
+    print(f"Rendered {renders} charts from 8 request threads:")
+    for label, elapsed in timings.items():
+        print(f"   - {label}: {elapsed:.2f}s ({renders / elapsed:.1f} charts/second)")
+    return timings
+
+
+def bench_export(rows=1000000):
+    """Keyset page latency at increasing depth and streamed CSV export memory."""
+    import ingest
+    import readings
+
+    path, company_id, sensor_ids = scratch_db()
+    try:
+        conn = dbpool.connect(path)
+        ingest.ingest(conn, company_id, synthetic_records(sensor_ids, rows))
+
+        page_ms = {}
+        cursor, pages = None, 0
+        started = time.perf_counter()
+        while True:
+            page_started = time.perf_counter()
+            result, cursor = readings.page(conn, company_id, cursor=cursor, limit=readings.MAX_LIMIT)
+            pages += 1
+            if pages in (1, 10, 100) or cursor is None:
+                page_ms[pages] = (time.perf_counter() - page_started) * 1000
+            if cursor is None:
+                break
+        paging = time.perf_counter() - started
+
+        tracemalloc.start()
+        started = time.perf_counter()
+        exported = sum(len(chunk) for chunk in readings.export_csv(readings.iter_rows(conn, company_id)))
+        export = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        conn.close()
+    finally:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+    print(f"Paged through {rows} readings in {pages} pages of {readings.MAX_LIMIT} ({paging:.2f}s):")
+    for number, ms in page_ms.items():
+        print(f"   - page {number}: {ms:.1f} ms")
+    print(f"Exported {exported / 1e6:.1f} MB of CSV in {export:.2f}s "
+          f"({rows / export:,.0f} rows/second, peak Python memory {peak / 1e6:.1f} MB)")
+    return page_ms, peak
+
+
+def bench_datasets(scale=1000):
+    """Columnar store vs. a full JSON cache for the sample CSV repeated `scale` times.
+
+    The JSON side is loaded whole, as get_csv_data had to; at the default
+    scale that needs several GB of RAM.
+    """
+    import json
+    import shutil
+    import columnar
+    import datasets
+    import pandas as pd
+
+    workdir = tempfile.mkdtemp(prefix="imcs-bench-datasets-")
+    try:
+        csv_path = os.path.join(workdir, "scaled.csv")
+        with open(SAMPLE_CSV) as src:
+            header, body = src.readline(), src.read()
+        with open(csv_path, "w") as f:
+            f.write(header)
+            for _ in range(scale):
+                f.write(body)
+
+        started = time.perf_counter()
+        store = columnar.ColumnarWriter(os.path.join(workdir, "store"))
+        profile = datasets.profile_csv(csv_path, store=store)
+        store.close(profile, source="scaled.csv")
+        convert = time.perf_counter() - started
+
+        json_path = os.path.join(workdir, "cache.json")
+        with open(json_path, "w") as f:
+            f.write(f'{{"columns": {json.dumps([c["name"] for c in profile["columns"]])}, "rows": [')
+            first = True
+            for chunk in pd.read_csv(csv_path, chunksize=100000):
+                for record in chunk.to_dict("records"):
+                    f.write(("" if first else ",") + json.dumps(record))
+                    first = False
+            f.write("]}")
+
+        timings = {}
+        started = time.perf_counter()
+        with open(json_path) as f:
+            cached = json.load(f)
+        preview = cached["rows"][:1000]
+        timings["json: load cache (any read)"] = time.perf_counter() - started
+        del cached, preview
+
+        dataset_dir = os.path.join(workdir, "store")
+        middle = profile["row_count"] // 2
+        for label, read in (
+            ("columnar: preview 1000 rows", lambda d: d.rows(0, 1000)),
+            ("columnar: 1000 rows x 2 cols mid-file", lambda d: d.rows(middle, middle + 1000, ["temperature", "equipment"])),
+            ("columnar: sum of one column", lambda d: float(d.array("temperature").sum())),
+            ("columnar: stats of one column", lambda d: d.stats("vibration")),
+        ):
+            started = time.perf_counter()
+            read(columnar.ColumnarDataset(dataset_dir))
+            timings[label] = time.perf_counter() - started
+
+        store_bytes = sum(os.path.getsize(os.path.join(dataset_dir, n)) for n in os.listdir(dataset_dir))
+        sizes = (os.path.getsize(csv_path), os.path.getsize(json_path), store_bytes)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"{profile['row_count']} rows ({scale}x sample); CSV {sizes[0] / 1e6:.0f} MB, "
+          f"JSON cache {sizes[1] / 1e6:.0f} MB, columnar store {sizes[2] / 1e6:.0f} MB")
+    print(f"   - CSV to columnar conversion: {convert:.2f}s")
+    for label, elapsed in timings.items():
+        print(f"   - {label}: {elapsed * 1000:.1f} ms")
+    return timings
+
+
+def bench_import(scale=100):
+    """Dataset rows and readings per second through dataset_import.run()."""
+    import shutil
+    import columnar
+    import dataset_import
+    import datasets
+
+    path, company_id, _ = scratch_db()
+    workdir = tempfile.mkdtemp(prefix="imcs-bench-import-")
+    try:
+        csv_path = os.path.join(workdir, "scaled.csv")
+        with open(SAMPLE_CSV) as src:
+            header, body = src.readline(), src.read()
+        with open(csv_path, "w") as f:
+            f.write(header)
+            for _ in range(scale):
+                f.write(body)
+        store = columnar.ColumnarWriter(os.path.join(workdir, "store"))
+        store.close(datasets.profile_csv(csv_path, store=store))
+        dataset = columnar.ColumnarDataset(store.directory)
+        plan = dataset_import.parse_plan(dataset, {
+            "machine": {"column": "equipment", "location_column": "location"},
+            "sensors": {name: {} for name in ("temperature", "pressure", "vibration", "humidity")},
+            "timestamp": {"policy": "interval", "seconds": 10},
+        })
+
+        conn = dbpool.connect(path)
+        result = dataset_import.run(conn, company_id, dataset, plan)
+        stored = conn.execute("SELECT COUNT(*) FROM sensor_readings").fetchone()[0]
+        conn.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+    print(f"Imported {result['rows']} rows as {result['readings']} readings ({stored} stored) "
+          f"into {result['machines']} machines in {result['batches']} batches")
+    print(f"   - elapsed: {result['elapsed_ms'] / 1000:.2f}s")
+    print(f"   - throughput: {result['rows_per_second']:,} rows/second, "
+          f"{result['readings_per_second']:,} readings/second")
+    return result
+
+
+def bench_alarms(rows=500000, batch_size=5000):
+    """Readings/second through the alarm engine, alone and inside ingest.ingest()."""
+    import alarm_engine
+    import cache
+    import ingest
+
+    path, company_id, sensor_ids = scratch_db(num_machines=100)
+    try:
+        conn = dbpool.connect(path)
+        alarm_engine.ensure_schema(conn)
+        # Every sensor has its implicit 0..100 threshold rule; half also get a rate rule
+        for sensor_id in sensor_ids[::2]:
+            rule = alarm_engine.parse_rule({"sensor_id": sensor_id, "kind": "rate", "high": 30,
+                                            "hysteresis": 5, "trip_count": 2, "trip_window": 3})
+            conn.execute(
+                f"INSERT INTO alarm_rules (company_id, {', '.join(rule)}) VALUES (?, {', '.join('?' * len(rule))})",
+                (company_id, *rule.values())
+            )
+        cache.bump(conn, company_id, "alarm_rules")
+        conn.commit()
+
+        # Random walks that leave the 0..100 band now and then
+        random.seed(7)
+        level = {s: 50.0 for s in sensor_ids}
+        start = datetime(2025, 1, 1)
+        records = []
+        for i in range(rows):
+            sensor_id = sensor_ids[i % len(sensor_ids)]
+            level[sensor_id] = min(140.0, max(-40.0, level[sensor_id] + random.gauss(0, 6)))
+            records.append((sensor_id, round(level[sensor_id], 2),
+                            (start + timedelta(seconds=i // len(sensor_ids))).isoformat(sep=" ")))
+
+        engine = alarm_engine.AlarmEngine()
+        started = time.perf_counter()
+        raised = cleared = 0
+        for offset in range(0, rows, batch_size):
+            changes = engine.evaluate(conn, company_id, records[offset:offset + batch_size])
+            raised += len(changes["raised"])
+            cleared += len(changes["cleared"])
+            conn.commit()
+        evaluate_elapsed = time.perf_counter() - started
+        alarm_rows = conn.execute("SELECT COUNT(*) FROM alarms").fetchone()[0]
+        conn.execute("DELETE FROM alarms")
+        conn.commit()
+
+        as_dicts = [{"sensor_id": s, "value": v, "timestamp": t} for s, v, t in records]
+        timings = {}
+        for label, alarms in (("without alarms", None), ("with alarms", alarm_engine.AlarmEngine())):
+            conn.execute("DELETE FROM sensor_readings")
+            conn.commit()
+            started = time.perf_counter()
+            ingest.ingest(conn, company_id, as_dicts, batch_size=batch_size, alarms=alarms)
+            timings[label] = time.perf_counter() - started
+        rules = engine.stats()["rules"]
+        conn.close()
+    finally:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+    print(f"Evaluated {rows} readings against {rules} rules in batches of {batch_size} "
+          f"({raised} alarms raised, {cleared} cleared, {alarm_rows} alarm rows after coalescing)")
+    print(f"   - engine only: {evaluate_elapsed:.2f}s, {rows / evaluate_elapsed:,.0f} readings/second")
+    for label, elapsed in timings.items():
+        print(f"   - ingest {label}: {elapsed:.2f}s, {rows / elapsed:,.0f} readings/second")
+    return rows / evaluate_elapsed
+
+
+def bench_bulk(count=300):
+    """Acknowledging `count` alarms one request at a time vs one bulk transaction."""
+    import bulk
+
+    path, company_id, sensor_ids = scratch_db()
+    try:
+        conn = dbpool.connect(path)
+        timings = {}
+        for label in ("one by one", "bulk"):
+            conn.execute("DELETE FROM alarms")
+            conn.executemany(
+                "INSERT INTO alarms (machine_id, severity, message, raised_at, company_id) "
+                "VALUES (1, 'warning', ?, datetime('now'), ?)",
+                [(f"Alarm {i}", company_id) for i in range(count)]
+            )
+            conn.commit()
+            ids = [r[0] for r in conn.execute("SELECT id FROM alarms")]
+            started = time.perf_counter()
+            if label == "bulk":
+                bulk.acknowledge_alarms(conn, company_id, ("ids", ids), "bench")
+                conn.commit()
+            else:
+                # What acknowledge_alert() does per request: lookup, update, commit
+                for alarm_id in ids:
+                    conn.execute("SELECT id FROM alarms WHERE id=? AND company_id=?", (alarm_id, company_id)).fetchone()
+                    conn.execute(
+                        "UPDATE alarms SET acknowledged = 1, acknowledged_by = ?, acknowledged_at = datetime('now'), "
+                        "comment = ? WHERE id = ? AND company_id = ?",
+                        ("bench", None, alarm_id, company_id)
+                    )
+                    conn.commit()
+            timings[label] = time.perf_counter() - started
+        conn.close()
+    finally:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+    print(f"Acknowledged {count} alarms")
+    for label, elapsed in timings.items():
+        print(f"   - {label}: {elapsed * 1000:.1f} ms")
+    return timings["one by one"] / timings["bulk"]
+
+
+def bench_audit(entries=5000, threads=4):
+    """Audit entries/second: one INSERT + commit per entry (the old log()) vs the write-behind AuditLog."""
+    import audit
+
+    path, company_id, _ = scratch_db()
+    try:
+        conn = dbpool.connect(path)
+        audit.ensure_schema(conn)
+        conn.close()
+        per_thread = entries // threads
+
+        def synchronous(n):
+            c = dbpool.connect(path)
+            for i in range(per_thread):
+                c.execute(
+                    "INSERT INTO audit_log(user,action,entity,entity_id,company_id) VALUES (?,?,?,?,?)",
+                    ("bench", "update", "machine", n * per_thread + i, company_id)
+                )
+                c.commit()
+            c.close()
+
+        log = audit.AuditLog(path)
+
+        def write_behind(n):
+            for i in range(per_thread):
+                log.record("bench", "update", "machine", n * per_thread + i, company_id)
+
+        timings = {}
+        for label, fn in (("synchronous", synchronous), ("write-behind", write_behind)):
+            started = time.perf_counter()
+            with ThreadPoolExecutor(threads) as pool:
+                list(pool.map(fn, range(threads)))
+            # Callers return once queued; the drain is timed separately
+            timings[label] = time.perf_counter() - started
+            if label == "write-behind":
+                log.flush(timeout=60)
+                timings["write-behind incl. flush"] = time.perf_counter() - started
+        stats = log.stats()
+        log.close()
+    finally:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+    total = per_thread * threads
+    print(f"Recorded {total} audit entries from {threads} threads "
+          f"(write-behind: {stats['written']} written in {stats['batches']} batches, {stats['dropped']} dropped)")
+    for label, elapsed in timings.items():
+        print(f"   - {label}: {elapsed:.3f}s, {total / elapsed:,.0f} entries/second")
+    return timings["synchronous"] / timings["write-behind incl. flush"]
+
+
+def bench_writer(writes=4000, threads=16):
+    """Small concurrent writes: each thread committing on its own connection vs the group-committing Writer."""
+    import writer
+
+    path, company_id, _ = scratch_db()
+    try:
+        conn = dbpool.connect(path)
+        machine_id = conn.execute("SELECT id FROM machines LIMIT 1").fetchone()[0]
+        conn.close()
+        per_thread = writes // threads
+
+        def create_alarm(c, n):
+            c.execute(
+                "INSERT INTO alarms (machine_id, severity, message, raised_at, company_id) "
+                "VALUES (?, 'warning', ?, datetime('now'), ?)",
+                (machine_id, f"Alarm {n}", company_id)
+            )
+            c.execute("UPDATE machines SET last_seen = datetime('now') WHERE id = ?", (machine_id,))
+
+        def own_connection(t, latencies, errors):
+            c = dbpool.connect(path)
+            for i in range(per_thread):
+                started = time.perf_counter()
+                try:
+                    create_alarm(c, t * per_thread + i)
+                    c.commit()
+                except Exception:
+                    c.rollback()
+                    errors.append(1)
+                latencies.append(time.perf_counter() - started)
+            c.close()
+
+        single = writer.Writer(path)
+
+        def through_writer(t, latencies, errors):
+            for i in range(per_thread):
+                started = time.perf_counter()
+                try:
+                    single.run(create_alarm, t * per_thread + i)
+                except Exception:
+                    errors.append(1)
+                latencies.append(time.perf_counter() - started)
+
+        results = {}
+        for label, fn in (("own connection per thread", own_connection), ("single writer", through_writer)):
+            latencies, errors = [], []
+            started = time.perf_counter()
+            workers = [threading.Thread(target=fn, args=(t, latencies, errors)) for t in range(threads)]
+            for w in workers:
+                w.start()
+            for w in workers:
+                w.join()
+            results[label] = (time.perf_counter() - started, sorted(latencies), len(errors))
+        stats = single.stats()
+        single.close()
+    finally:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+    total = per_thread * threads
+    print(f"{total} small write transactions from {threads} threads "
+          f"(single writer: {stats['groups']} commits, {stats['avg_group']} writes per commit)")
+    for label, (elapsed, latencies, errors) in results.items():
+        p50 = latencies[len(latencies) // 2] * 1000
+        p99 = latencies[int(len(latencies) * 0.99)] * 1000
+        print(f"   - {label}: {total / elapsed:,.0f} writes/second, "
+              f"p50 {p50:.2f} ms, p99 {p99:.2f} ms, max {latencies[-1] * 1000:.1f} ms, {errors} errors")
+    return results
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+
+    if command == "ingest":
+        rows = int(sys.argv[2]) if len(sys.argv) > 2 else 200000
+        batch_size = int(sys.argv[3]) if len(sys.argv) > 3 else 5000
+        bench_ingest(rows, batch_size)
+    elif command == "fleet":
+        bench_fleet(int(sys.argv[2]) if len(sys.argv) > 2 else 2000)
+    elif command == "render":
+        renders = int(sys.argv[2]) if len(sys.argv) > 2 else 400
+        threads = int(sys.argv[3]) if len(sys.argv) > 3 else 8
+        sys.exit(0 if bench_render(renders, threads) else 2)
+    elif command == "render-pool":
+        renders = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+        bench_render_pool(renders, int(sys.argv[3]) if len(sys.argv) > 3 else None)
+    elif command == "datasets":
+        bench_datasets(int(sys.argv[2]) if len(sys.argv) > 2 else 1000)
+    elif command == "import":
+        bench_import(int(sys.argv[2]) if len(sys.argv) > 2 else 100)
+    elif command == "alarms":
+        rows = int(sys.argv[2]) if len(sys.argv) > 2 else 500000
+        bench_alarms(rows, int(sys.argv[3]) if len(sys.argv) > 3 else 5000)
+    elif command == "bulk":
+        bench_bulk(int(sys.argv[2]) if len(sys.argv) > 2 else 300)
+    elif command == "audit":
+        entries = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+        bench_audit(entries, int(sys.argv[3]) if len(sys.argv) > 3 else 4)
+    elif command == "writer":
+        writes = int(sys.argv[2]) if len(sys.argv) > 2 else 4000
+        bench_writer(writes, int(sys.argv[3]) if len(sys.argv) > 3 else 16)
+    elif command == "export":
+        bench_export(int(sys.argv[2]) if len(sys.argv) > 2 else 1000000)
+    else:
+        print(__doc__)
+        sys.exit(1)
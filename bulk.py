@@ -0,0 +1,202 @@
+"""
+Bulk Updates
+Acknowledge alarms or update maintenance tasks by id list or by filter,
+as one UPDATE per statement inside the caller's transaction.
+
+A selection is either {"ids": [...]} or {"filter": {...}}. Id lists get a
+per-id outcome (including ids that do not exist or belong to another
+company); filters resolve to the matching ids first, at most MAX_ITEMS per
+call in id order. When more rows match, the result carries next_after_id:
+repeating the call with that value as filter.after_id continues after the
+last id handled, so it terminates even when the update leaves rows matching.
+The functions return the changed ids so the caller can audit them in one go.
+"""
+import os
+
+from alarm_engine import SEVERITIES
+from ingest import normalize_timestamp
+
+MAX_ITEMS = int(os.environ.get("BULK_MAX_ITEMS", 5000))
+
+TASK_STATUSES = ("open", "in_progress", "completed")
+TASK_PRIORITIES = ("low", "medium", "high")
+TASK_FIELDS = ("status", "technician", "scheduled_date", "priority")
+
+# Per table: filterable columns (None = integer, tuple = allowed values) and
+# the column `since` / `until` apply to
+ALARMS = {
+    "table": "alarms",
+    "filters": {"machine_id": None, "severity": SEVERITIES},
+    "time": "raised_at",
+}
+TASKS = {
+    "table": "maintenance_tasks",
+    "filters": {"machine_id": None, "status": TASK_STATUSES, "priority": TASK_PRIORITIES},
+    "time": "scheduled_date",
+}
+
+
+def _values(key, value, allowed):
+    values = value if isinstance(value, list) else [value]
+    if not values:
+        raise ValueError(f"filter.{key} must not be empty")
+    if allowed is None:
+        try:
+            return [int(v) for v in values]
+        except (TypeError, ValueError):
+            raise ValueError(f"filter.{key} must be an integer or a list of integers") from None
+    bad = [v for v in values if v not in allowed]
+    if bad:
+        raise ValueError(f"filter.{key} must be one of {', '.join(allowed)}")
+    return values
+
+
+def parse_selection(body, spec):
+    """("ids", [ids]) or ("filter", {column: [values], "since"/"until": ts, "after_id": id}) from a request body.
+
+    Raises ValueError on bad input.
+    """
+    body = body or {}
+    if ("ids" in body) == ("filter" in body):
+        raise ValueError("Provide either ids or filter")
+    if "ids" in body:
+        ids = body["ids"]
+        if not isinstance(ids, list) or not ids:
+            raise ValueError("ids must be a non-empty list")
+        if len(ids) > MAX_ITEMS:
+            raise ValueError(f"At most {MAX_ITEMS} ids per request")
+        try:
+            ids = [int(i) for i in ids]
+        except (TypeError, ValueError):
+            raise ValueError("ids must be integers") from None
+        return "ids", list(dict.fromkeys(ids))
+
+    raw = body["filter"]
+    if not isinstance(raw, dict):
+        raise ValueError("filter must be an object")
+    unknown = set(raw) - set(spec["filters"]) - {"since", "until", "after_id"}
+    if unknown:
+        raise ValueError(f"Unknown filter: {', '.join(sorted(unknown))}")
+    selection = {}
+    for key, allowed in spec["filters"].items():
+        if raw.get(key) not in (None, ""):
+            selection[key] = _values(key, raw[key], allowed)
+    for key in ("since", "until"):
+        if raw.get(key):
+            timestamp = normalize_timestamp(raw[key])
+            if timestamp is None:
+                raise ValueError(f"filter.{key} must be an ISO 8601 timestamp")
+            selection[key] = timestamp
+    if raw.get("after_id") not in (None, ""):
+        selection["after_id"] = _values("after_id", raw["after_id"], None)[0]
+    return "filter", selection
+
+
+def select(conn, company_id, spec, selection, columns, where=()):
+    """Rows (id plus `columns`) of the company's selection, and the next_after_id of a filter (or None).
+
+    `where` adds conditions applied to filters only; id lists always return
+    every id that exists so the caller can tell "already done" from "not found".
+    """
+    kind, value = selection
+    table = spec["table"]
+    select_list = ", ".join(("id",) + tuple(columns))
+    if kind == "ids":
+        placeholders = ",".join("?" * len(value))
+        rows = conn.execute(
+            f"SELECT {select_list} FROM {table} WHERE company_id = ? AND id IN ({placeholders})",
+            (company_id, *value)
+        ).fetchall()
+        return rows, None
+
+    conditions = ["company_id = ?", *where]
+    params = [company_id]
+    for key in spec["filters"]:
+        if key in value:
+            conditions.append(f"{key} IN ({','.join('?' * len(value[key]))})")
+            params.extend(value[key])
+    # datetime() accepts both date-only and full timestamps, as users enter either
+    if "since" in value:
+        conditions.append(f"datetime({spec['time']}) >= ?")
+        params.append(value["since"])
+    if "until" in value:
+        conditions.append(f"datetime({spec['time']}) < ?")
+        params.append(value["until"])
+    if "after_id" in value:
+        conditions.append("id > ?")
+        params.append(value["after_id"])
+    rows = conn.execute(
+        f"SELECT {select_list} FROM {table} WHERE {' AND '.join(conditions)} ORDER BY id LIMIT ?",
+        (*params, MAX_ITEMS + 1)
+    ).fetchall()
+    rows, more = rows[:MAX_ITEMS], len(rows) > MAX_ITEMS
+    return rows, rows[-1]["id"] if more else None
+
+
+def _update(conn, table, assignments, params, ids):
+    for start in range(0, len(ids), 500):
+        chunk = ids[start:start + 500]
+        conn.execute(
+            f"UPDATE {table} SET {assignments} WHERE id IN ({','.join('?' * len(chunk))})",
+            (*params, *chunk)
+        )
+
+
+def _outcomes(selection, ids, status, skipped=(), skipped_status=None):
+    """Per-id results in request order; ids that were not found are reported too."""
+    done = set(ids)
+    requested = selection[1] if selection[0] == "ids" else ids
+    results = []
+    for i in requested:
+        if i in done:
+            results.append({"id": i, "status": status})
+        elif i in skipped:
+            results.append({"id": i, "status": skipped_status})
+        else:
+            results.append({"id": i, "status": "not_found"})
+    return results
+
+
+def acknowledge_alarms(conn, company_id, selection, user, comment=None):
+    """Acknowledge the selected alarms; does not commit.
+
+    Returns (results, ids, next_after_id): per-id outcomes ("acknowledged",
+    "already_acknowledged" or "not_found"), the ids actually changed, and
+    where to continue when a filter matched more than MAX_ITEMS alarms.
+    """
+    rows, next_after_id = select(conn, company_id, ALARMS, selection, ("acknowledged",), ("acknowledged = 0",))
+    ids = [r["id"] for r in rows if not r["acknowledged"]]
+    already = {r["id"] for r in rows if r["acknowledged"]}
+    _update(
+        conn, "alarms",
+        "acknowledged = 1, acknowledged_by = ?, acknowledged_at = datetime('now'), comment = ?",
+        (user, comment), ids
+    )
+    return _outcomes(selection, ids, "acknowledged", already, "already_acknowledged"), ids, next_after_id
+
+
+def parse_task_changes(data):
+    """(assignments, params, changes) for a maintenance update; raises ValueError on bad input."""
+    changes = {k: data[k] for k in TASK_FIELDS if k in (data or {})}
+    if not changes:
+        raise ValueError("No fields to update")
+    if "status" in changes and changes["status"] not in TASK_STATUSES:
+        raise ValueError(f"status must be one of {', '.join(TASK_STATUSES)}")
+    if "priority" in changes and changes["priority"] not in TASK_PRIORITIES:
+        raise ValueError(f"priority must be one of {', '.join(TASK_PRIORITIES)}")
+    assignments = [f"{k} = ?" for k in changes]
+    if changes.get("status") == "completed":
+        assignments.append("completed_at = datetime('now')")
+    return ", ".join(assignments), list(changes.values()), changes
+
+
+def update_tasks(conn, company_id, selection, assignments, params):
+    """Apply parse_task_changes() output to the selected maintenance tasks; does not commit.
+
+    Returns (results, ids, next_after_id) like acknowledge_alarms, with
+    "updated" or "not_found" outcomes.
+    """
+    rows, next_after_id = select(conn, company_id, TASKS, selection, ())
+    ids = [r["id"] for r in rows]
+    _update(conn, "maintenance_tasks", assignments, params, ids)
+    return _outcomes(selection, ids, "updated"), ids, next_after_id
@@ -0,0 +1,258 @@
+"""
+Response Cache
+Per-tenant TTL/LRU cache for read APIs with write-driven invalidation.
+
+Cached responses depend on data "tags" (machines, readings, alarms,
+maintenance). Write paths bump the (company, tag) version in the
+data_versions table inside their own transaction; the current versions are
+part of every cache key, so a write makes stale entries unreachable in every
+worker process, not just the one that handled it.
+
+ChartCache applies the same versioning to rendered PNGs, keyed by a content
+fingerprint so identical charts are rendered once and can be revalidated by
+browsers with ETag / If-None-Match.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+TAGS = ("machines", "readings", "alarms", "maintenance")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS data_versions (
+    company_id INTEGER NOT NULL,
+    tag TEXT NOT NULL,
+    version INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (company_id, tag)
+) WITHOUT ROWID;
+"""
+
+
+def ensure_schema(conn):
+    conn.executescript(SCHEMA)
+
+
+def bump(conn, company_id, *tags):
+    """Advance the data version of `tags` for a company (call before commit)."""
+    conn.executemany(
+        """INSERT INTO data_versions (company_id, tag, version) VALUES (?, ?, 1)
+           ON CONFLICT(company_id, tag) DO UPDATE SET version = version + 1""",
+        [(company_id, tag) for tag in tags]
+    )
+
+
+def versions(conn, company_id, tags):
+    """Current versions of `tags` for a company, as a tuple in `tags` order."""
+    rows = conn.execute(
+        f"SELECT tag, version FROM data_versions WHERE company_id = ? AND tag IN ({','.join('?' * len(tags))})",
+        (company_id, *tags)
+    ).fetchall()
+    found = {r[0]: r[1] for r in rows}
+    return tuple(found.get(tag, 0) for tag in tags)
+
+
+class ResponseCache:
+    """Thread-safe LRU cache with per-entry TTL and tag-based invalidation."""
+
+    def __init__(self, max_entries=1000, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            expires_at, _, value = entry
+            if expires_at <= now:
+                del self._entries[key]
+                self._stats["expirations"] += 1
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return value
+
+    def set(self, key, value, tags=(), ttl=None):
+        """Store `value`; key[0] must be the company id for invalidation."""
+        expires_at = time.monotonic() + (ttl or self.ttl)
+        with self._lock:
+            self._entries[key] = (expires_at, frozenset(tags), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def invalidate(self, company_id, tags=None):
+        """Drop a company's entries that depend on any of `tags` (all if None)."""
+        tags = set(tags) if tags else None
+        with self._lock:
+            stale = [
+                key for key, (_, entry_tags, _) in self._entries.items()
+                if key[0] == company_id and (tags is None or entry_tags & tags)
+            ]
+            for key in stale:
+                del self._entries[key]
+            self._stats["invalidations"] += len(stale)
+        return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hit_ratio": round(self._stats["hits"] / lookups, 3) if lookups else 0.0,
+            }
+
+
+class ChartCache:
+    """Content-addressed PNG cache: a byte-capped in-memory LRU, optionally
+    backed by a directory shared between worker processes.
+
+    Entries are keyed by a fingerprint of everything that affects the
+    rendered image and hold (png_bytes, etag) where the etag is a hash of
+    the bytes themselves.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, ttl=300, directory=None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.directory = directory
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stores = 0
+        self._stats = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+
+    @staticmethod
+    def fingerprint(*parts):
+        return hashlib.sha256(repr(parts).encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.png")
+
+    def get(self, key):
+        """Return (png_bytes, etag) or None."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, png, etag = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return png, etag
+                self._drop(key)
+                self._stats["expirations"] += 1
+
+        png = self._read_disk(key)
+        with self._lock:
+            if png is None:
+                self._stats["misses"] += 1
+                return None
+            self._stats["disk_hits"] += 1
+        etag = hashlib.sha256(png).hexdigest()[:32]
+        self._remember(key, png, etag)
+        return png, etag
+
+    def set(self, key, png):
+        """Store rendered bytes and return their etag."""
+        etag = hashlib.sha256(png).hexdigest()[:32]
+        self._remember(key, png, etag)
+        if self.directory:
+            self._write_disk(key, png)
+        return etag
+
+    def _remember(self, key, png, etag):
+        if len(png) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic() + self.ttl, png, etag)
+            self._bytes += len(png)
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self._stats["evictions"] += 1
+
+    def _drop(self, key):
+        _, png, _ = self._entries.pop(key)
+        self._bytes -= len(png)
+
+    def _read_disk(self, key):
+        if not self.directory:
+            return None
+        path = self._path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl:
+                return None
+            with open(path, "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _write_disk(self, key, png):
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                f.write(png)
+            os.replace(tmp, path)  # atomic, so other workers never read a partial file
+        except OSError:
+            return
+        with self._lock:
+            self._stores += 1
+            prune = self._stores % 100 == 0
+        if prune:
+            self.prune_disk()
+
+    def prune_disk(self):
+        """Delete expired files from the shared directory."""
+        if not self.directory:
+            return 0
+        cutoff = time.time() - self.ttl
+        removed = 0
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed += 1
+            except OSError:
+                pass
+        return removed
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["disk_hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl,
+                "directory": self.directory,
+                "hit_ratio": round((self._stats["hits"] + self._stats["disk_hits"]) / lookups, 3) if lookups else 0.0,
+            }
@@ -0,0 +1,297 @@
+"""
+Columnar Dataset Store
+Uploaded datasets converted once into per-column binary files and read back
+through NumPy memory maps, so previews, column reads and aggregates touch
+only the columns and row ranges they need.
+
+A dataset is a directory:
+
+    meta.json        row count, source file and one entry per column
+                     (name, type, profile, storage dtype and file names)
+    c<i>.bin         numeric   float64, NaN for nulls
+                     boolean   int8, 1/0 and -1 for nulls
+                     timestamp int64 nanoseconds since the epoch, NaT for nulls
+                     text      UTF-8 bytes of all values back to back
+    c<i>.off         text only: uint64 end offset of each value (empty = null)
+
+ColumnarWriter is fed chunk by chunk from datasets.profile_csv(); meta.json
+is written last, so a directory without it is an incomplete conversion.
+"""
+import json
+import os
+import shutil
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from datasets import TRUE_VALUES, parse_timestamps
+
+META = "meta.json"
+DTYPES = {"numeric": "<f8", "boolean": "i1", "timestamp": "<i8", "text": "u1"}
+NULLS = {"numeric": np.nan, "boolean": -1, "timestamp": np.iinfo(np.int64).min}
+BLOCK_ROWS = 1 << 20
+TRUE_STRINGS = {"true", "yes"}
+
+
+def _encode(kind, series):
+    """Fixed-width column values for one chunk."""
+    if kind == "numeric":
+        return pd.to_numeric(series, errors="coerce").to_numpy(dtype="<f8", na_value=np.nan)
+    if kind == "boolean":
+        text = series.astype(str).str.strip().str.lower()
+        out = np.full(len(series), -1, dtype="i1")
+        out[text.isin(TRUE_STRINGS).to_numpy()] = 1
+        out[text.isin(TRUE_VALUES - TRUE_STRINGS).to_numpy()] = 0
+        return out
+    stamps = parse_timestamps(series)
+    if getattr(stamps.dt, "tz", None) is not None:
+        stamps = stamps.dt.tz_convert(None)
+    return stamps.to_numpy(dtype="datetime64[ns]").view("<i8")
+
+
+def _decode(kind, values):
+    """Python values (None for nulls) from a fixed-width column slice."""
+    if kind == "numeric":
+        return [None if v != v else v for v in values.tolist()]
+    if kind == "boolean":
+        return [None if v < 0 else bool(v) for v in values.tolist()]
+    stamps = values.view("datetime64[ns]")
+    return [None if np.isnat(v) else str(v.astype("datetime64[s]")).replace("T", " ") for v in stamps]
+
+
+class ColumnarWriter:
+    """Appends parsed chunks to a dataset directory."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.kinds = []        # storage type per column (None until first non-null)
+        self.pending = []      # leading all-null rows not yet written
+        self.offsets = []      # current end offset of text columns
+        self.rows = 0
+
+    def _path(self, i, ext):
+        return os.path.join(self.directory, f"c{i}.{ext}")
+
+    def append(self, chunk, profiles):
+        """Write one chunk; `profiles` carry each column's merged type so far."""
+        if not self.kinds:
+            self.kinds = [None] * len(profiles)
+            self.pending = [0] * len(profiles)
+            self.offsets = [0] * len(profiles)
+        for i, (profile, column) in enumerate(zip(profiles, chunk.columns)):
+            kind = profile.type
+            if kind is None:
+                self.pending[i] += len(chunk)
+                continue
+            if self.kinds[i] is None:
+                self.kinds[i] = kind
+                self._write_nulls(i, self.pending[i])
+            elif self.kinds[i] != kind:
+                self._widen_to_text(i)
+            self._write(i, chunk[column])
+        self.rows += len(chunk)
+
+    def _write(self, i, series):
+        kind = self.kinds[i]
+        if kind != "text":
+            with open(self._path(i, "bin"), "ab") as f:
+                f.write(_encode(kind, series).tobytes())
+            return
+        strings = series.where(series.notna(), "").astype(str)
+        self._write_text(i, [s.encode("utf-8") for s in strings])
+
+    def _write_text(self, i, encoded):
+        lengths = np.fromiter((len(b) for b in encoded), dtype="<u8", count=len(encoded))
+        ends = self.offsets[i] + np.cumsum(lengths, dtype="<u8")
+        with open(self._path(i, "bin"), "ab") as f:
+            f.write(b"".join(encoded))
+        with open(self._path(i, "off"), "ab") as f:
+            f.write(ends.tobytes())
+        if len(ends):
+            self.offsets[i] = int(ends[-1])
+
+    def _write_nulls(self, i, count):
+        if not count:
+            return
+        if self.kinds[i] == "text":
+            self._write_text(i, [b""] * count)
+        else:
+            with open(self._path(i, "bin"), "ab") as f:
+                f.write(np.full(count, NULLS[self.kinds[i]], dtype=DTYPES[self.kinds[i]]).tobytes())
+
+    def _widen_to_text(self, i):
+        """Rewrite a fixed-width column as text once a later chunk turns out not to fit."""
+        kind, path = self.kinds[i], self._path(i, "bin")
+        old = np.fromfile(path, dtype=DTYPES[kind])
+        os.remove(path)
+        self.kinds[i] = "text"
+        for start in range(0, len(old), BLOCK_ROWS):
+            values = _decode(kind, old[start:start + BLOCK_ROWS])
+            if kind == "numeric":
+                # Whole numbers were most likely written without a fraction
+                values = [v if v is None or not v.is_integer() else int(v) for v in values]
+            self._write_text(i, [b"" if v is None else str(v).encode("utf-8") for v in values])
+
+    def close(self, profile, source=None):
+        """Write meta.json from a datasets.profile_csv() result."""
+        columns = []
+        for i, column in enumerate(profile["columns"]):
+            kind = self.kinds[i] if i < len(self.kinds) else None
+            if kind is None:
+                # Never saw a value: store as text so every row still has an entry
+                self.kinds[i] = kind = "text"
+                self.offsets[i] = 0
+                self._write_nulls(i, self.pending[i])
+            for ext in (("bin", "off") if kind == "text" else ("bin",)):
+                open(self._path(i, ext), "ab").close()  # columns without rows still get their files
+            entry = dict(column, storage=kind, dtype=DTYPES[kind], file=f"c{i}.bin")
+            if kind == "text":
+                entry["offsets"] = f"c{i}.off"
+            columns.append(entry)
+        meta = {
+            "version": 1,
+            "row_count": self.rows,
+            "source": source,
+            "created_at": datetime.utcnow().isoformat(timespec="seconds"),
+            "columns": columns,
+        }
+        tmp = os.path.join(self.directory, META + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp, os.path.join(self.directory, META))
+        return meta
+
+    def abort(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+class ColumnarDataset:
+    """Read-only view of a converted dataset; arrays are mapped lazily."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, META)) as f:
+            self.meta = json.load(f)
+        self.row_count = self.meta["row_count"]
+        self.columns = [c["name"] for c in self.meta["columns"]]
+        self._index = {name: i for i, name in enumerate(self.columns)}
+        self._maps = {}
+
+    @staticmethod
+    def exists(directory):
+        return os.path.exists(os.path.join(directory, META))
+
+    def _map(self, file, dtype):
+        if file not in self._maps:
+            path = os.path.join(self.directory, file)
+            if os.path.getsize(path) == 0:
+                self._maps[file] = np.empty(0, dtype=dtype)  # mmap cannot map empty files
+            else:
+                self._maps[file] = np.memmap(path, dtype=dtype, mode="r")
+        return self._maps[file]
+
+    def _info(self, name):
+        if name not in self._index:
+            raise KeyError(name)
+        return self.meta["columns"][self._index[name]]
+
+    def kind(self, name):
+        """Storage type of a column: numeric, boolean, timestamp or text."""
+        return self._info(name)["storage"]
+
+    def decode(self, name, values):
+        """Python values of raw fixed-width values taken from array(name)."""
+        return _decode(self.kind(name), np.asarray(values, dtype=self._info(name)["dtype"]))
+
+    def array(self, name):
+        """Memory-mapped values of a fixed-width column (no copy)."""
+        info = self._info(name)
+        if info["storage"] == "text":
+            raise TypeError(f"{name} is a text column")
+        return self._map(info["file"], info["dtype"])
+
+    def column(self, name, start=0, stop=None):
+        """Python values of rows [start, stop) of one column, None for nulls."""
+        info = self._info(name)
+        start, stop, _ = slice(start, stop).indices(self.row_count)
+        if start >= stop:
+            return []
+        if info["storage"] != "text":
+            return _decode(info["storage"], self.array(name)[start:stop])
+        ends = self._map(info["offsets"], "<u8")
+        first = int(ends[start - 1]) if start else 0
+        blob = bytes(self._map(info["file"], "u1")[first:int(ends[stop - 1])])
+        bounds = np.r_[0, ends[start:stop].astype(np.int64) - first]
+        return [
+            blob[a:b].decode("utf-8") if b > a else None
+            for a, b in zip(bounds[:-1].tolist(), bounds[1:].tolist())
+        ]
+
+    def rows(self, start=0, stop=None, columns=None):
+        """Rows [start, stop) as dicts, reading only `columns` (default all)."""
+        names = [c for c in (columns or self.columns) if c in self._index]
+        values = [self.column(name, start, stop) for name in names]
+        return [dict(zip(names, row)) for row in zip(*values)]
+
+    def take(self, indices, columns=None):
+        """Rows at arbitrary positions `indices` as dicts, in the given order."""
+        indices = np.asarray(indices, dtype=np.int64)
+        names = [c for c in (columns or self.columns) if c in self._index]
+        values = []
+        for name in names:
+            info = self._info(name)
+            if info["storage"] != "text":
+                values.append(_decode(info["storage"], self.array(name)[indices]))
+                continue
+            ends = self._map(info["offsets"], "<u8")
+            blob = self._map(info["file"], "u1")
+            starts = np.where(indices > 0, ends[np.maximum(indices - 1, 0)], 0).astype(np.int64).tolist()
+            stops = ends[indices].astype(np.int64).tolist()
+            values.append([bytes(blob[a:b]).decode("utf-8") if b > a else None for a, b in zip(starts, stops)])
+        return [dict(zip(names, row)) for row in zip(*values)]
+
+    def stats(self, name):
+        """Aggregates of one column, computed block by block over the memory map."""
+        info = self._info(name)
+        kind = info["storage"]
+        if kind == "text":
+            ends = self._map(info["offsets"], "<u8").astype(np.int64)
+            empty = int(np.count_nonzero(np.diff(np.r_[0, ends]) == 0))
+            return {"name": name, "type": kind, "count": self.row_count - empty, "nulls": empty}
+
+        values = self.array(name)
+        count = nulls = 0
+        total = total_sq = 0.0
+        lo = hi = None
+        true_count = 0
+        for start in range(0, len(values), BLOCK_ROWS):
+            block = values[start:start + BLOCK_ROWS]
+            if kind == "numeric":
+                valid = block[~np.isnan(block)]
+            else:
+                valid = block[block != NULLS[kind]]
+            nulls += len(block) - len(valid)
+            if not len(valid):
+                continue
+            count += len(valid)
+            block_lo, block_hi = valid.min(), valid.max()
+            lo = block_lo if lo is None else min(lo, block_lo)
+            hi = block_hi if hi is None else max(hi, block_hi)
+            if kind == "numeric":
+                total += float(valid.sum())
+                total_sq += float(np.square(valid).sum())
+            elif kind == "boolean":
+                true_count += int(valid.sum())
+
+        result = {"name": name, "type": kind, "count": count, "nulls": nulls}
+        if kind == "numeric" and count:
+            mean = total / count
+            result.update(min=float(lo), max=float(hi), sum=total, mean=mean,
+                          std=float(np.sqrt(max(total_sq / count - mean * mean, 0.0) * count / max(count - 1, 1))))
+        elif kind == "boolean":
+            result.update(true=true_count, false=count - true_count)
+        elif kind == "timestamp" and count:
+            result.update(min=_decode(kind, np.array([lo]))[0], max=_decode(kind, np.array([hi]))[0])
+        return result
@@ -0,0 +1,164 @@
+"""
+Dataset Catalogue
+Per-company registry of uploaded datasets, kept in the database.
+
+Uploads are hashed (SHA-256) while they are written to disk, so a file a
+company has uploaded before is served from its existing columnar store
+instead of being parsed again. Each company's stores are capped at
+DATASET_QUOTA_MB; the least recently used datasets are evicted first.
+"""
+import hashlib
+import json
+import os
+import shutil
+
+QUOTA = int(os.environ.get("DATASET_QUOTA_MB", 1024)) * 1024 * 1024
+COPY_BLOCK = 1024 * 1024
+# last_used_at is only rewritten when older than this, so paging through a
+# dataset does not turn every read into a write
+TOUCH_INTERVAL = 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS datasets (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    company_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    columns TEXT NOT NULL,
+    row_count INTEGER NOT NULL,
+    size_bytes INTEGER NOT NULL,
+    storage TEXT NOT NULL,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    last_used_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY(company_id) REFERENCES companies(id),
+    UNIQUE(company_id, content_hash)
+);
+CREATE INDEX IF NOT EXISTS idx_datasets_company_used ON datasets(company_id, last_used_at);
+"""
+
+COLUMNS = "id, name, content_hash, columns, row_count, size_bytes, storage, created_at, last_used_at"
+
+
+def ensure_schema(conn):
+    """Create the catalogue; a pre-catalogue `datasets` table is renamed to datasets_legacy first."""
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(datasets)")}
+    if columns and "content_hash" not in columns:
+        # Old (name, filename, content_type, uploaded_at, meta) layout that nothing reads any more
+        conn.execute("ALTER TABLE datasets RENAME TO datasets_legacy")
+    conn.executescript(SCHEMA)
+
+
+def save_upload(stream, path):
+    """Copy an upload stream to `path`, hashing it on the way; returns (sha256, size)."""
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, "wb") as f:
+        while True:
+            block = stream.read(COPY_BLOCK)
+            if not block:
+                break
+            digest.update(block)
+            f.write(block)
+            size += len(block)
+    return digest.hexdigest(), size
+
+
+def storage_name(company_id, content_hash):
+    """Directory of a dataset's columnar store, relative to the upload folder."""
+    return f"ds_{company_id}_{content_hash[:32]}"
+
+
+def directory_size(directory):
+    return sum(e.stat().st_size for e in os.scandir(directory) if e.is_file())
+
+
+def as_dict(row):
+    entry = dict(row)
+    entry["columns"] = json.loads(entry["columns"])
+    entry["cache_key"] = entry["storage"]
+    return entry
+
+
+def _one(conn, where, params):
+    row = conn.execute(f"SELECT {COLUMNS} FROM datasets WHERE {where}", params).fetchone()
+    return as_dict(row) if row else None
+
+
+def find(conn, company_id, content_hash):
+    return _one(conn, "company_id = ? AND content_hash = ?", (company_id, content_hash))
+
+
+def get(conn, company_id, dataset_id):
+    return _one(conn, "company_id = ? AND id = ?", (company_id, dataset_id))
+
+
+def by_storage(conn, company_id, storage):
+    return _one(conn, "company_id = ? AND storage = ?", (company_id, storage))
+
+
+def entries(conn, company_id):
+    """All of a company's datasets, most recently used first."""
+    rows = conn.execute(
+        f"SELECT {COLUMNS} FROM datasets WHERE company_id = ? ORDER BY last_used_at DESC, id DESC",
+        (company_id,)
+    ).fetchall()
+    return [as_dict(r) for r in rows]
+
+
+def register(conn, company_id, name, content_hash, profile, storage, size_bytes):
+    """Add a converted dataset; returns its entry (the existing one if it raced another upload)."""
+    conn.execute(
+        """INSERT INTO datasets (company_id, name, content_hash, columns, row_count, size_bytes, storage)
+           VALUES (?, ?, ?, ?, ?, ?, ?)
+           ON CONFLICT(company_id, content_hash) DO NOTHING""",
+        (company_id, name, content_hash, json.dumps(profile["columns"]),
+         profile["row_count"], size_bytes, storage)
+    )
+    return find(conn, company_id, content_hash)
+
+
+def touch(conn, dataset_id, force=False):
+    """Mark a dataset as used now (at most once per TOUCH_INTERVAL unless forced)."""
+    conn.execute(
+        f"""UPDATE datasets SET last_used_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND (? OR last_used_at < datetime('now', '-{TOUCH_INTERVAL} seconds'))""",
+        (dataset_id, int(force))
+    )
+
+
+def remove(conn, company_id, dataset_id):
+    """Delete a catalogue entry; returns its storage directory name, or None if not found."""
+    entry = get(conn, company_id, dataset_id)
+    if entry is None:
+        return None
+    conn.execute("DELETE FROM datasets WHERE id = ?", (dataset_id,))
+    return entry["storage"]
+
+
+def evict(conn, company_id, quota=QUOTA, keep=None):
+    """Drop least recently used entries until the company fits in `quota` bytes.
+
+    `keep` (a dataset id) is never evicted. Returns the storage directory
+    names of the evicted entries; delete them with discard() after commit.
+    """
+    rows = conn.execute(
+        "SELECT id, size_bytes, storage FROM datasets WHERE company_id = ? ORDER BY last_used_at, id",
+        (company_id,)
+    ).fetchall()
+    used = sum(r[1] for r in rows)
+    evicted = []
+    for dataset_id, size, storage in rows:
+        if used <= quota:
+            break
+        if dataset_id == keep:
+            continue
+        evicted.append((dataset_id, storage))
+        used -= size
+    conn.executemany("DELETE FROM datasets WHERE id = ?", [(d,) for d, _ in evicted])
+    return [storage for _, storage in evicted]
+
+
+def discard(root, storages):
+    """Remove columnar store directories under `root`."""
+    for storage in storages:
+        shutil.rmtree(os.path.join(root, storage), ignore_errors=True)
@@ -0,0 +1,341 @@
+"""
+Dataset Import
+Loads a stored (columnar) dataset into machines, sensors and sensor_readings.
+
+A plan maps dataset columns onto the plant model:
+
+    {"machine": {"column": "equipment", "location_column": "location", "type": "Equipment"},
+                 # or a single machine: {"name": "Press 4", "location": "Line A"}
+     "sensors": {"temperature": {"name": "Temperature", "unit": "°C",
+                                 "min_threshold": 20, "max_threshold": 100},
+                 "vibration": {"unit": "mm/s"}},
+     "timestamp": {"policy": "column", "column": "recorded_at"},
+                 # or {"policy": "interval", "seconds": 60, "start": "2025-01-01T00:00:00"}
+     "alarms": true}
+
+With the interval policy each machine's rows are consecutive samples,
+`seconds` apart from `start` (default: the last sample is now).
+
+Machines are matched by (name, location) and sensors by (machine, name);
+missing ones are created with one executemany each. Readings are built with
+NumPy per batch of dataset rows, inserted in one transaction per batch and
+folded into the rollups from the inserted id range. Like ingested readings,
+every batch is checked by the alarm engine in its transaction; set
+"alarms": false to load historical backfills without raising alarms.
+"""
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import cache
+import rollups
+
+BATCH_ROWS = 20000
+DEFAULT_LOCATION = "Imported"
+VALUE_KINDS = ("numeric", "boolean")
+
+
+def _text(dataset, name):
+    """Per-row string values of any column (None for nulls)."""
+    if dataset.kind(name) == "text":
+        return dataset.column(name)
+    return [None if v is None else str(v) for v in dataset.decode(name, dataset.array(name))]
+
+
+def _stamp(value, field):
+    try:
+        stamp = pd.Timestamp(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{field} must be an ISO 8601 timestamp") from None
+    if stamp.tzinfo is not None:
+        stamp = stamp.tz_convert(None)
+    return stamp.value
+
+
+def parse_plan(dataset, body):
+    """Validated import plan from a JSON body; raises ValueError on bad input."""
+    if not isinstance(body, dict):
+        raise ValueError("plan must be a JSON object")
+
+    machine = body.get("machine") or {}
+    if machine.get("column"):
+        if machine["column"] not in dataset.columns:
+            raise ValueError(f"machine.column: unknown column {machine['column']!r}")
+    elif not machine.get("name"):
+        raise ValueError("machine needs a column or a name")
+    location_column = machine.get("location_column")
+    if location_column and location_column not in dataset.columns:
+        raise ValueError(f"machine.location_column: unknown column {location_column!r}")
+
+    sensors = body.get("sensors")
+    if not isinstance(sensors, dict) or not sensors:
+        raise ValueError("sensors must map at least one column to a sensor")
+    mapped = []
+    for column, spec in sensors.items():
+        spec = spec or {}
+        if column not in dataset.columns:
+            raise ValueError(f"sensors: unknown column {column!r}")
+        if dataset.kind(column) not in VALUE_KINDS:
+            raise ValueError(f"sensors: {column} is a {dataset.kind(column)} column; readings must be numeric")
+        try:
+            thresholds = [None if spec.get(k) is None else float(spec[k]) for k in ("min_threshold", "max_threshold")]
+        except (TypeError, ValueError):
+            raise ValueError(f"sensors: thresholds of {column} must be numbers") from None
+        mapped.append({
+            "column": column,
+            "name": str(spec.get("name") or column.replace("_", " ").title()),
+            "unit": str(spec.get("unit") or ""),
+            "min_threshold": thresholds[0],
+            "max_threshold": thresholds[1],
+        })
+    if len({s["name"] for s in mapped}) != len(mapped):
+        raise ValueError("sensors: two columns map to the same sensor name")
+
+    timestamp = body.get("timestamp") or {"policy": "interval"}
+    policy = timestamp.get("policy")
+    if policy == "column":
+        column = timestamp.get("column")
+        if column not in dataset.columns or dataset.kind(column) != "timestamp":
+            raise ValueError("timestamp.column must name a timestamp column")
+        timestamp = {"policy": "column", "column": column}
+    elif policy == "interval":
+        try:
+            seconds = float(timestamp.get("seconds", 60))
+        except (TypeError, ValueError):
+            seconds = 0
+        if seconds <= 0:
+            raise ValueError("timestamp.seconds must be a positive number")
+        start = timestamp.get("start")
+        timestamp = {
+            "policy": "interval",
+            "seconds": seconds,
+            "start": _stamp(start, "timestamp.start") if start else None,
+        }
+    else:
+        raise ValueError("timestamp.policy must be column or interval")
+
+    alarms = body.get("alarms", True)
+    if not isinstance(alarms, bool):
+        raise ValueError("alarms must be true or false")
+
+    return {
+        "machine": {
+            "column": machine.get("column"),
+            "name": machine.get("name"),
+            "type": machine.get("type"),
+            "location_column": location_column,
+            "location": machine.get("location") or DEFAULT_LOCATION,
+        },
+        "sensors": mapped,
+        "timestamp": timestamp,
+        "alarms": alarms,
+    }
+
+
+def _machine_rows(dataset, plan):
+    """(machine index per row, -1 for rows without a machine name; [(name, location)] per index)."""
+    spec = plan["machine"]
+    n = dataset.row_count
+    if spec["column"]:
+        names = np.array(_text(dataset, spec["column"]), dtype=object)
+    else:
+        names = np.full(n, spec["name"], dtype=object)
+    if spec["location_column"]:
+        locations = np.array(_text(dataset, spec["location_column"]), dtype=object)
+        locations[pd.isna(locations)] = spec["location"]
+    else:
+        locations = np.full(n, spec["location"], dtype=object)
+
+    name_codes, name_values = pd.factorize(names)
+    location_codes, location_values = pd.factorize(locations)
+    width = max(len(location_values), 1)
+    valid = name_codes >= 0
+    present, inverse = np.unique(name_codes[valid] * width + location_codes[valid], return_inverse=True)
+    codes = np.full(n, -1, dtype=np.int64)
+    codes[valid] = inverse
+    machines = [(str(name_values[k // width]), str(location_values[k % width])) for k in present.tolist()]
+    return codes, machines
+
+
+def ensure_machines(conn, company_id, machines, machine_type=None):
+    """Ids of (name, location) machines, creating the missing ones; returns (ids, created)."""
+    existing = {
+        (r[1], r[2]): r[0]
+        for r in conn.execute("SELECT id, name, location FROM machines WHERE company_id = ?", (company_id,))
+    }
+    missing = [m for m in dict.fromkeys(machines) if m not in existing]
+    conn.executemany(
+        "INSERT INTO machines (name, type, location, status, company_id) VALUES (?, ?, ?, 'idle', ?)",
+        [(name, machine_type or name, location, company_id) for name, location in missing]
+    )
+    if missing:
+        existing = {
+            (r[1], r[2]): r[0]
+            for r in conn.execute("SELECT id, name, location FROM machines WHERE company_id = ?", (company_id,))
+        }
+    return [existing[m] for m in machines], len(missing)
+
+
+def ensure_sensors(conn, machine_ids, sensors):
+    """Sensor id matrix [machine index][sensor index], creating missing sensors; returns (ids, created)."""
+    existing = {}
+    ids = sorted(set(machine_ids))
+    for start in range(0, len(ids), 500):
+        chunk = ids[start:start + 500]
+        for r in conn.execute(
+            f"SELECT id, machine_id, name FROM sensors WHERE machine_id IN ({','.join('?' * len(chunk))})", chunk
+        ):
+            existing.setdefault((r[1], r[2]), r[0])
+    missing = [
+        (machine_id, s["name"], s["unit"], s["min_threshold"], s["max_threshold"])
+        for machine_id in ids for s in sensors if (machine_id, s["name"]) not in existing
+    ]
+    conn.executemany(
+        "INSERT INTO sensors (machine_id, name, unit, min_threshold, max_threshold) VALUES (?, ?, ?, ?, ?)",
+        missing
+    )
+    if missing:
+        last = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+        for offset, row in enumerate(missing):
+            existing[(row[0], row[1])] = last - len(missing) + 1 + offset
+    matrix = np.array([[existing[(m, s["name"])] for s in sensors] for m in machine_ids], dtype=np.int64)
+    return matrix.reshape(len(machine_ids), len(sensors)), len(missing)
+
+
+def _timestamps(dataset, plan, machine_rows):
+    """int64 nanoseconds per row (int64 min where unknown)."""
+    policy = plan["timestamp"]
+    if policy["policy"] == "column":
+        return np.asarray(dataset.array(policy["column"]))
+    # k-th row of each machine -> start + k * seconds
+    order = np.argsort(machine_rows, kind="stable")
+    sorted_rows = machine_rows[order]
+    first = np.searchsorted(sorted_rows, sorted_rows, side="left")
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order)) - first
+    step = int(policy["seconds"] * 1e9)
+    start = policy["start"]
+    if start is None:
+        now = pd.Timestamp(datetime.utcnow()).floor("s").value
+        start = now - step * (int(rank.max()) if len(rank) else 0)
+    return start + rank * step
+
+
+def _format(stamps):
+    """'YYYY-MM-DD HH:MM:SS' strings for int64 nanosecond timestamps (distinct values formatted once)."""
+    unique, inverse = np.unique(stamps, return_inverse=True)
+    text = np.datetime_as_string(unique.astype("datetime64[ns]").astype("datetime64[s]"))
+    text = np.array([t.replace("T", " ") for t in text.tolist()], dtype=object)
+    return text[inverse]
+
+
+def _ensure_fleet(conn, company_id, machines, plan):
+    machine_ids, machines_created = ensure_machines(conn, company_id, machines, plan["machine"]["type"])
+    sensor_ids, sensors_created = ensure_sensors(conn, machine_ids, plan["sensors"])
+    if machines_created or sensors_created:
+        cache.bump(conn, company_id, "machines")
+    return machines_created, sensor_ids, sensors_created
+
+
+def _insert(conn, company_id, batch, alarms=None):
+    conn.executemany("INSERT INTO sensor_readings (sensor_id, value, timestamp) VALUES (?, ?, ?)", batch)
+    # The transaction holds the write lock, so the new ids are one contiguous range
+    last = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+    rollups.record_range(conn, last - len(batch) + 1, last)
+    cache.bump(conn, company_id, "readings")
+    if alarms is None:
+        return None
+    changes = alarms.evaluate(conn, company_id, batch)
+    if changes["raised"] or changes["cleared"]:
+        cache.bump(conn, company_id, "alarms")
+    return changes
+
+
+def run(conn, company_id, dataset, plan, batch_rows=BATCH_ROWS, progress=None, writer=None, alarms=None):
+    """Import a dataset according to a parse_plan() result.
+
+    Args:
+        conn: Writer connection (committed per batch; unused with `writer`)
+        company_id: Tenant that owns the machines
+        dataset: columnar.ColumnarDataset
+        plan: Result of parse_plan()
+        progress: Optional callback(rows_done, rows_total, readings) after each batch
+        writer: Optional writer.Writer that applies each batch as an intent
+        alarms: Optional alarm_engine.AlarmEngine run on every batch unless
+            the plan sets "alarms": false
+
+    Returns a summary dict; with alarms evaluated, "alarms" counts the
+    raised and cleared ones.
+    """
+    def apply(fn, *args):
+        if writer is not None:
+            return writer.run(fn, *args)
+        try:
+            result = fn(conn, *args)
+            conn.commit()
+            return result
+        except Exception:
+            conn.rollback()
+            raise
+
+    started = time.perf_counter()
+    machine_rows, machines = _machine_rows(dataset, plan)
+    machines_created, sensor_ids, sensors_created = apply(_ensure_fleet, company_id, machines, plan)
+
+    stamps = _timestamps(dataset, plan, machine_rows)
+    null_stamp = np.iinfo(np.int64).min
+    values = [dataset.array(s["column"]) for s in plan["sensors"]]
+    total = dataset.row_count
+    readings = skipped = batches = 0
+    # Plans queued before the flag existed evaluate too
+    engine = alarms if plan.get("alarms", True) else None
+    alarm_counts = {"raised": 0, "cleared": 0}
+
+    for start in range(0, total, batch_rows):
+        stop = min(start + batch_rows, total)
+        rows = machine_rows[start:stop]
+        batch_stamps = stamps[start:stop]
+        usable = (rows >= 0) & (batch_stamps != null_stamp)
+        ids, vals, when = [], [], []
+        for i, column in enumerate(values):
+            column = np.asarray(column[start:stop])
+            valid = usable & (~np.isnan(column) if column.dtype.kind == "f" else column >= 0)
+            ids.append(sensor_ids[rows[valid], i])
+            vals.append(column[valid].astype(float))
+            when.append(batch_stamps[valid])
+            skipped += int(len(column) - valid.sum())
+        ids, vals, when = np.concatenate(ids), np.concatenate(vals), np.concatenate(when)
+        if len(ids):
+            batch = list(zip(ids.tolist(), vals.tolist(), _format(when).tolist()))
+            try:
+                changes = apply(_insert, company_id, batch, engine)
+            except Exception:
+                # The engine's in-memory state already counts the rolled-back batch
+                if engine is not None:
+                    engine.invalidate(company_id)
+                raise
+            for kind in alarm_counts:
+                alarm_counts[kind] += len((changes or {}).get(kind, ()))
+            readings += len(batch)
+        batches += 1
+        if progress:
+            progress(stop, total, readings)
+
+    elapsed = time.perf_counter() - started
+    summary = {
+        "rows": total,
+        "readings": readings,
+        "skipped_values": skipped,
+        "machines": len(machines),
+        "machines_created": machines_created,
+        "sensors_created": sensors_created,
+        "batches": batches,
+        "elapsed_ms": round(elapsed * 1000, 1),
+        "rows_per_second": round(total / elapsed) if elapsed > 0 else total,
+        "readings_per_second": round(readings / elapsed) if elapsed > 0 else readings,
+    }
+    if engine is not None:
+        summary["alarms"] = alarm_counts
+    return summary
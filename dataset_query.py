@@ -0,0 +1,451 @@
+"""
+Dataset Queries
+Filter, group-by/aggregate, histogram and top-N queries over a columnar
+dataset, evaluated with NumPy against the memory-mapped columns so only the
+small result leaves the server.
+
+A query is a JSON object; `filters` (all must match) apply to every type:
+
+    {"filters": [{"column": "temperature", "op": ">", "value": 80},
+                 {"column": "equipment", "op": "in", "value": ["Pump", "Turbine"]}],
+     "type": "aggregate", "group_by": ["equipment"],
+     "aggregates": [{"fn": "avg", "column": "temperature"}, {"fn": "count"}],
+     "order_by": "avg_temperature", "order": "desc", "limit": 10}
+
+    {"type": "histogram", "column": "vibration", "bins": 20}
+    {"type": "top", "column": "pressure", "n": 10, "order": "desc", "columns": ["equipment"]}
+
+Text columns are factorised into sorted integer codes once per dataset and
+kept in a small LRU, so filters and group-bys on them are integer work.
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+import downsample
+
+TYPES = ("aggregate", "histogram", "top")
+OPERATORS = ("=", "!=", "<", "<=", ">", ">=", "in", "not_in", "contains", "is_null", "not_null")
+AGGREGATES = ("count", "sum", "avg", "min", "max", "std")
+# Aggregates that make sense for each storage type (count works everywhere)
+KIND_AGGREGATES = {
+    "numeric": set(AGGREGATES),
+    "boolean": set(AGGREGATES),
+    "timestamp": {"count", "min", "max"},
+    "text": {"count"},
+}
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 10000
+DEFAULT_BINS = 20
+MAX_BINS = 500
+MAX_GROUP_BY = 4
+TEXT_CACHE_COLUMNS = 32
+# Stores are content-addressed and never change, so results only age out of the cache
+RESULT_TTL = 3600
+
+_text_codes = OrderedDict()
+_text_lock = threading.Lock()
+
+
+def _factorize(dataset, name):
+    """(codes, categories) of a text column; codes are -1 for nulls and follow sorted order."""
+    key = (dataset.directory, name)
+    with _text_lock:
+        if key in _text_codes:
+            _text_codes.move_to_end(key)
+            return _text_codes[key]
+    codes, categories = pd.factorize(np.array(dataset.column(name), dtype=object), sort=True)
+    result = (codes, np.asarray(categories, dtype=object))
+    with _text_lock:
+        _text_codes[key] = result
+        while len(_text_codes) > TEXT_CACHE_COLUMNS:
+            _text_codes.popitem(last=False)
+    return result
+
+
+def _values(dataset, name):
+    """(values, valid) over all rows; text columns as integer codes."""
+    kind = dataset.kind(name)
+    if kind == "text":
+        codes, _ = _factorize(dataset, name)
+        return codes, codes >= 0
+    values = dataset.array(name)
+    if kind == "numeric":
+        return values, ~np.isnan(values)
+    if kind == "boolean":
+        return values, values >= 0
+    return values, values != np.iinfo(np.int64).min
+
+
+def _label(dataset, name, values):
+    """Python values for raw values (codes for text) of one column."""
+    if dataset.kind(name) == "text":
+        _, categories = _factorize(dataset, name)
+        return [None if v < 0 else categories[v] for v in np.asarray(values).tolist()]
+    return dataset.decode(name, values)
+
+
+# ===================== PARSING =====================
+
+def _column(dataset, name, field):
+    if not isinstance(name, str) or name not in dataset.columns:
+        raise ValueError(f"{field}: unknown column {name!r}")
+    return name
+
+
+def _limit(value, default, maximum, field):
+    try:
+        value = int(default if value is None else value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{field} must be an integer") from None
+    return max(1, min(value, maximum))
+
+
+def _coerce(kind, value):
+    """A filter value in the column's storage representation."""
+    if kind == "numeric":
+        return float(value)
+    if kind == "boolean":
+        return 1 if str(value).strip().lower() in ("true", "yes", "1") else 0
+    if kind == "timestamp":
+        stamp = pd.Timestamp(value)
+        if stamp.tzinfo is not None:
+            stamp = stamp.tz_convert(None)
+        return stamp.value
+    return str(value)
+
+
+def _parse_filter(dataset, spec):
+    if not isinstance(spec, dict):
+        raise ValueError("filters must be objects with column, op and value")
+    name = _column(dataset, spec.get("column"), "filters")
+    op = spec.get("op", "=")
+    if op not in OPERATORS:
+        raise ValueError(f"filters: unknown op {op!r}; expected one of {', '.join(OPERATORS)}")
+    kind = dataset.kind(name)
+    if op == "contains" and kind != "text":
+        raise ValueError("filters: contains only applies to text columns")
+    if op in ("is_null", "not_null"):
+        return {"column": name, "op": op}
+    value = spec.get("value")
+    try:
+        if op in ("in", "not_in"):
+            if not isinstance(value, list):
+                raise ValueError
+            value = [_coerce(kind, v) for v in value]
+        else:
+            value = _coerce(kind, value)
+    except (TypeError, ValueError):
+        raise ValueError(f"filters: invalid value for {name} ({kind})") from None
+    return {"column": name, "op": op, "value": value}
+
+
+def parse_query(dataset, body):
+    """Validated, normalised query from a JSON body; raises ValueError on bad input.
+
+    The result is deterministic for equivalent queries, so it can be part of a cache key.
+    """
+    if not isinstance(body, dict):
+        raise ValueError("query must be a JSON object")
+    kind = body.get("type", "aggregate")
+    if kind not in TYPES:
+        raise ValueError(f"type must be one of {', '.join(TYPES)}")
+    query = {
+        "type": kind,
+        "filters": [_parse_filter(dataset, f) for f in body.get("filters") or []],
+    }
+
+    if kind == "aggregate":
+        group_by = body.get("group_by") or []
+        if isinstance(group_by, str):
+            group_by = [group_by]
+        if len(group_by) > MAX_GROUP_BY:
+            raise ValueError(f"group_by takes at most {MAX_GROUP_BY} columns")
+        query["group_by"] = [_column(dataset, c, "group_by") for c in group_by]
+        aggregates = []
+        for spec in body.get("aggregates") or [{"fn": "count"}]:
+            fn = spec.get("fn") if isinstance(spec, dict) else None
+            if fn not in AGGREGATES:
+                raise ValueError(f"aggregates: fn must be one of {', '.join(AGGREGATES)}")
+            name = spec.get("column")
+            if name is None and fn != "count":
+                raise ValueError(f"aggregates: {fn} needs a column")
+            if name is not None:
+                _column(dataset, name, "aggregates")
+                if fn not in KIND_AGGREGATES[dataset.kind(name)]:
+                    raise ValueError(f"aggregates: {fn} does not apply to {dataset.kind(name)} column {name}")
+            aggregates.append({"fn": fn, "column": name, "key": fn if name is None else f"{fn}_{name}"})
+        query["aggregates"] = aggregates
+        outputs = query["group_by"] + [a["key"] for a in aggregates]
+        order_by = body.get("order_by")
+        if order_by is not None and order_by not in outputs:
+            raise ValueError(f"order_by must be one of {', '.join(outputs)}")
+        query["order_by"] = order_by
+        # Aggregates rank highest first by default, group keys ascending
+        default_order = "asc" if order_by is None or order_by in query["group_by"] else "desc"
+        query["order"] = "asc" if body.get("order", default_order) == "asc" else "desc"
+        query["limit"] = _limit(body.get("limit"), DEFAULT_LIMIT, MAX_LIMIT, "limit")
+
+    elif kind == "histogram":
+        query["column"] = _column(dataset, body.get("column"), "column")
+        query["bins"] = _limit(body.get("bins"), DEFAULT_BINS, MAX_BINS, "bins")
+        if dataset.kind(query["column"]) in ("numeric", "timestamp") and body.get("range"):
+            try:
+                lo, hi = (_coerce(dataset.kind(query["column"]), v) for v in body["range"])
+            except (TypeError, ValueError):
+                raise ValueError("range must be [low, high]") from None
+            query["range"] = [lo, hi]
+
+    else:
+        query["column"] = _column(dataset, body.get("column"), "column")
+        if dataset.kind(query["column"]) == "text":
+            raise ValueError("top needs a numeric, boolean or timestamp column")
+        query["n"] = _limit(body.get("n"), 10, MAX_LIMIT, "n")
+        query["order"] = "asc" if body.get("order") == "asc" else "desc"
+        columns = body.get("columns")
+        query["columns"] = [_column(dataset, c, "columns") for c in columns] if columns else None
+    return query
+
+
+# ===================== EVALUATION =====================
+
+def _compare(op, values, value):
+    if op == "=":
+        return values == value
+    if op == "!=":
+        return values != value
+    if op == "<":
+        return values < value
+    if op == "<=":
+        return values <= value
+    if op == ">":
+        return values > value
+    if op == ">=":
+        return values >= value
+    if op == "in":
+        return np.isin(values, value)
+    return ~np.isin(values, value)  # not_in
+
+
+def _mask(dataset, filters):
+    """Boolean mask of the rows matching every filter (None when unfiltered)."""
+    mask = None
+    for spec in filters:
+        values, valid = _values(dataset, spec["column"])
+        op = spec["op"]
+        if op == "is_null":
+            matched = ~valid
+        elif op == "not_null":
+            matched = valid
+        elif dataset.kind(spec["column"]) == "text":
+            # Evaluate against the distinct values, then select rows by code
+            _, categories = _factorize(dataset, spec["column"])
+            if op == "contains":
+                hits = np.array([spec["value"] in c for c in categories], dtype=bool)
+            else:
+                hits = _compare(op, categories, spec["value"]) if len(categories) else np.zeros(0, bool)
+            matched = np.isin(values, np.flatnonzero(hits)) & valid
+        else:
+            matched = _compare(op, values, spec["value"]) & valid
+        mask = matched if mask is None else mask & matched
+    return mask
+
+
+def _selected(dataset, name, rows):
+    values, valid = _values(dataset, name)
+    if rows is None:
+        return np.asarray(values), valid
+    return values[rows], valid[rows]
+
+
+def _aggregate(dataset, query, rows, matched):
+    group_ids = np.zeros(matched, dtype=np.int64)
+    keys = []
+    groups = 1  # without group_by, one row even when nothing matched
+    if query["group_by"]:
+        inverses, uniques = [], []
+        for name in query["group_by"]:
+            values, _ = _selected(dataset, name, rows)
+            unique, inverse = np.unique(values, return_inverse=True)
+            uniques.append(unique)
+            inverses.append(inverse)
+        # One integer per key combination (mixed radix), so grouping is a 1-D unique
+        sizes = [len(u) for u in uniques]
+        combined = np.ravel_multi_index(inverses, sizes) if inverses[0].size else np.zeros(0, np.int64)
+        present, group_ids = np.unique(combined, return_inverse=True)
+        combos = np.stack(np.unravel_index(present, sizes), axis=1)
+        group_ids = group_ids.reshape(-1)
+        groups = len(combos)
+        keys = [(name, uniques[i][combos[:, i]]) for i, name in enumerate(query["group_by"])]
+
+    results = {}
+    sizes = np.bincount(group_ids, minlength=groups)
+    for agg in query["aggregates"]:
+        fn, name = agg["fn"], agg["column"]
+        if name is None:
+            results[agg["key"]] = sizes.astype(float)
+            continue
+        values, valid = _selected(dataset, name, rows)
+        ids, values = group_ids[valid], values[valid]
+        counts = np.bincount(ids, minlength=groups).astype(float)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            if fn == "count":
+                out = counts
+            elif fn in ("sum", "avg", "std"):
+                values = values.astype(float)
+                sums = np.bincount(ids, weights=values, minlength=groups)
+                means = sums / counts
+                if fn == "sum":
+                    out = np.where(counts > 0, sums, np.nan)
+                elif fn == "avg":
+                    out = means
+                else:
+                    squares = np.bincount(ids, weights=(values - means[ids]) ** 2, minlength=groups)
+                    out = np.where(counts > 1, np.sqrt(squares / (counts - 1)), np.where(counts == 1, 0.0, np.nan))
+            else:
+                # Sorted by (group, value): each group's first entry is its min and last its max
+                order = np.lexsort((values, ids))
+                ids, values = ids[order], values[order]
+                starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]]) if len(ids) else np.zeros(0, np.int64)
+                picks = starts if fn == "min" else np.r_[starts[1:], len(ids)] - 1
+                out = np.full(groups, None, dtype=object)
+                if len(picks):
+                    out[ids[picks]] = values[picks] if dataset.kind(name) != "numeric" else values[picks].astype(float)
+        results[agg["key"]] = out
+
+    order_by = query["order_by"]
+    if order_by in results and results[order_by].dtype != object:
+        ranking = results[order_by].astype(float)
+        ranking = np.where(np.isnan(ranking), np.inf, ranking if query["order"] == "asc" else -ranking)
+        order = np.argsort(ranking, kind="stable")
+    elif order_by in results:
+        present = np.array([v is not None for v in results[order_by]])
+        order = np.flatnonzero(present)
+        raw = np.array(results[order_by][present].tolist())
+        order = order[np.argsort(raw, kind="stable")]
+        if query["order"] == "desc":
+            order = order[::-1]
+        order = np.r_[order, np.flatnonzero(~present)].astype(np.int64)
+    else:
+        # Group ids follow the sorted group keys
+        order = np.arange(groups) if query["order"] == "asc" else np.arange(groups)[::-1]
+    order = order[:query["limit"]]
+
+    columns = {name: _label(dataset, name, values[order]) for name, values in keys}
+    for agg in query["aggregates"]:
+        out = results[agg["key"]][order]
+        name = agg["column"]
+        if agg["fn"] == "count":
+            columns[agg["key"]] = [int(v) for v in out]
+        elif out.dtype == object and name is not None and dataset.kind(name) == "timestamp":
+            present = [v is not None for v in out]
+            labels = iter(dataset.decode(name, np.array([v for v in out if v is not None], dtype=np.int64)))
+            columns[agg["key"]] = [next(labels) if p else None for p in present]
+        else:
+            columns[agg["key"]] = [None if v is None or v != v else float(v) for v in out.tolist()]
+    names = list(columns)
+    return {
+        "groups": int(groups),
+        "rows": [dict(zip(names, row)) for row in zip(*(columns[n] for n in names))] if names else [],
+    }
+
+
+def _histogram(dataset, query, rows):
+    name = query["column"]
+    kind = dataset.kind(name)
+    values, valid = _selected(dataset, name, rows)
+    present = values[valid]
+    result = {"column": name, "type": kind, "nulls": int(len(values) - len(present))}
+    if kind in ("text", "boolean"):
+        # Categorical columns: the most frequent values
+        unique, counts = np.unique(present, return_counts=True)
+        top = np.argsort(-counts, kind="stable")[:query["bins"]]
+        result.update(values=_label(dataset, name, unique[top]), counts=counts[top].tolist(),
+                      distinct=int(len(unique)))
+        return result
+    if not len(present):
+        result.update(edges=[], counts=[])
+        return result
+    counts, edges = np.histogram(present.astype(float), bins=query["bins"], range=query.get("range"))
+    if kind == "timestamp":
+        edges = dataset.decode(name, edges.astype(np.int64))
+    else:
+        edges = edges.tolist()
+    result.update(edges=edges, counts=counts.tolist())
+    return result
+
+
+def _top(dataset, query, rows):
+    name = query["column"]
+    values, valid = _selected(dataset, name, rows)
+    positions = np.flatnonzero(valid) if rows is None else rows[valid]
+    present = values[valid].astype(float)
+    n = min(query["n"], len(present))
+    if not n:
+        return {"column": name, "rows": []}
+    ranking = -present if query["order"] == "desc" else present
+    best = np.argpartition(ranking, n - 1)[:n]
+    best = best[np.argsort(ranking[best], kind="stable")]
+    columns = query["columns"] or dataset.columns
+    picked = dataset.take(positions[best], columns)
+    for position, row in zip(positions[best].tolist(), picked):
+        row["_row"] = position
+    return {"column": name, "rows": picked}
+
+
+def run(dataset, query):
+    """Evaluate a parse_query() result against a ColumnarDataset."""
+    mask = _mask(dataset, query["filters"])
+    rows = None if mask is None else np.flatnonzero(mask)
+    matched = dataset.row_count if rows is None else len(rows)
+    if query["type"] == "aggregate":
+        result = _aggregate(dataset, query, rows, matched)
+    elif query["type"] == "histogram":
+        result = _histogram(dataset, query, rows)
+    else:
+        result = _top(dataset, query, rows)
+    return {"type": query["type"], "row_count": dataset.row_count, "matched": int(matched), **result}
+
+
+def overview(dataset, max_points=downsample.DEFAULT_MAX_POINTS):
+    """Numeric summaries and a downsampled time series of a stored dataset.
+
+    Same shape as the /api/csv-visualize response for posted rows, computed
+    over every row instead of the client's preview.
+    """
+    numeric = [c for c in dataset.columns if dataset.kind(c) == "numeric"]
+    dates = [c for c in dataset.columns if dataset.kind(c) == "timestamp"]
+    summary = {}
+    for name in numeric:
+        stats = dataset.stats(name)
+        if stats["count"]:
+            summary[name] = {k: stats[k] for k in ("min", "max", "mean", "std")}
+
+    time_series = None
+    if dates and numeric:
+        stamps, stamp_valid = _values(dataset, dates[0])
+        values, value_valid = _values(dataset, numeric[0])
+        rows = np.flatnonzero(stamp_valid & value_valid)
+        x, y = stamps[rows], values[rows]
+        if len(x) > 1 and np.any(x[1:] < x[:-1]):
+            order = np.argsort(x, kind="stable")
+            x, y = x[order], y[order]
+        keep = downsample.lttb(x.astype(float), y, max_points) if max_points else np.arange(len(x))
+        time_series = {
+            "labels": dataset.decode(dates[0], x[keep]),
+            "data": y[keep].astype(float).tolist(),
+            "label": numeric[0]
+        }
+
+    return {
+        "numeric_columns": numeric,
+        "date_columns": dates,
+        "summary": summary,
+        "time_series": time_series,
+        "chart_data": {
+            "bar": numeric[:5],
+            "line": time_series
+        }
+    }
@@ -0,0 +1,202 @@
+"""
+Dataset Profiling
+Streaming CSV reader for uploaded datasets.
+
+Files are parsed in chunks whose row count adapts to the measured size of
+each chunk, so memory stays under DATASET_MEMORY_MB whatever the file size.
+While streaming, every column gets an incrementally merged type (numeric,
+boolean, timestamp or text) and a running profile (nulls, capped distinct
+count, min/max, mean and standard deviation), and only the first
+PREVIEW_ROWS rows are kept.
+"""
+import math
+import os
+
+import numpy as np
+import pandas as pd
+
+MEMORY_LIMIT = int(os.environ.get("DATASET_MEMORY_MB", 256)) * 1024 * 1024
+FIRST_CHUNK_ROWS = 10000
+MIN_CHUNK_ROWS = 1000
+PREVIEW_ROWS = 1000
+MAX_DISTINCT = 1000
+TRUE_VALUES = {"true", "false", "yes", "no"}
+
+# A chunk's parsed frame plus pandas' parsing buffers take a few times the
+# frame's own size, so chunks are sized to a fraction of the ceiling
+CHUNK_FRACTION = 4
+
+
+class ColumnProfile:
+    """Running type and statistics of one column across chunks."""
+
+    def __init__(self, name):
+        self.name = name
+        self.type = None        # None until a non-null value is seen
+        self.count = 0          # non-null values
+        self.nulls = 0
+        self.distinct = set()
+        self.distinct_capped = False
+        self.min = None
+        self.max = None
+        self.mean = 0.0
+        self.m2 = 0.0           # sum of squared deviations (Chan et al. merge)
+
+    def update(self, series):
+        values = series.dropna()
+        self.nulls += len(series) - len(values)
+        if values.empty:
+            return
+        # Text absorbs every other type, so text columns skip detection
+        kind = "text" if self.type == "text" else _kind(values)
+        if self.type is not None and kind != self.type:
+            kind = _merge_kinds(self.type, kind)
+            if kind == "text" and self.type != "text":
+                # Earlier chunks were profiled as another type: keep counts only
+                self.min = self.max = None
+                self.mean = self.m2 = 0.0
+        self.type = kind
+
+        self._track_distinct(values)
+        if kind == "numeric":
+            numbers = pd.to_numeric(values).astype(float)
+            self._merge_moments(numbers.to_numpy())
+            self._merge_range(float(numbers.min()), float(numbers.max()))
+        elif kind == "timestamp":
+            stamps = parse_timestamps(values).dropna()
+            if not stamps.empty:
+                self._merge_range(stamps.min().isoformat(), stamps.max().isoformat())
+        self.count += len(values)
+
+    def _track_distinct(self, values):
+        if self.distinct_capped:
+            return
+        self.distinct.update(str(v) for v in pd.unique(values)[:MAX_DISTINCT + 1])
+        if len(self.distinct) > MAX_DISTINCT:
+            self.distinct_capped = True
+            self.distinct = set()
+
+    def _merge_moments(self, numbers):
+        n_a, n_b = self.count, len(numbers)
+        mean_b = float(numbers.mean())
+        m2_b = float(((numbers - mean_b) ** 2).sum())
+        delta = mean_b - self.mean
+        total = n_a + n_b
+        self.mean += delta * n_b / total
+        self.m2 += m2_b + delta * delta * n_a * n_b / total
+
+    def _merge_range(self, lo, hi):
+        self.min = lo if self.min is None else min(self.min, lo)
+        self.max = hi if self.max is None else max(self.max, hi)
+
+    def as_dict(self):
+        profile = {
+            "name": self.name,
+            "type": self.type or "text",
+            "count": self.count,
+            "nulls": self.nulls,
+            "distinct": f">{MAX_DISTINCT}" if self.distinct_capped else len(self.distinct),
+        }
+        if self.type in ("numeric", "timestamp"):
+            profile["min"] = self.min
+            profile["max"] = self.max
+        if self.type == "numeric" and self.count:
+            profile["mean"] = round(self.mean, 6)
+            profile["std"] = round(math.sqrt(self.m2 / (self.count - 1)), 6) if self.count > 1 else 0.0
+        return profile
+
+
+def _kind(values):
+    """Type of one chunk's non-null values."""
+    if pd.api.types.is_bool_dtype(values):
+        return "boolean"
+    if pd.api.types.is_numeric_dtype(values):
+        return "numeric"
+    # Repeated values are common (categories, dates), so test each distinct value once
+    distinct = pd.Series(pd.unique(values))
+    sample = distinct.astype(str).str.strip().str.lower()
+    if sample.isin(TRUE_VALUES).all():
+        return "boolean"
+    # Only strings that look like dates are tried as timestamps
+    if sample.str.match(r"\d{4}-\d{2}-\d{2}|\d{1,2}/\d{1,2}/\d{4}").all():
+        if parse_timestamps(distinct).notna().all():
+            return "timestamp"
+    return "text"
+
+
+def parse_timestamps(values):
+    # ISO 8601 parses in C; only fall back to per-value parsing for other layouts
+    parsed = pd.to_datetime(values, errors="coerce", format="ISO8601")
+    if parsed.isna().any():
+        parsed = pd.to_datetime(values, errors="coerce", format="mixed")
+    return parsed
+
+
+def _merge_kinds(a, b):
+    return a if a == b else "text"
+
+
+def _json_rows(frame):
+    """Records with NaN/NaT as None and NumPy scalars as Python values."""
+    frame = frame.astype(object).where(frame.notna(), None)
+    return [
+        {k: (v.item() if isinstance(v, np.generic) else v) for k, v in row.items()}
+        for row in frame.to_dict("records")
+    ]
+
+
+def profile_csv(path, preview_rows=PREVIEW_ROWS, memory_limit=MEMORY_LIMIT, store=None, progress=None):
+    """Stream a CSV file once and return its profile.
+
+    Args:
+        store: Optional columnar.ColumnarWriter that receives every chunk;
+            the caller closes it with the returned profile
+        progress: Optional callback(rows_read) after each chunk
+
+    Returns {"columns": [profile dicts], "rows": first preview_rows rows,
+    "row_count", "chunks", "bytes"}. Raises ValueError if the file is not
+    valid CSV.
+    """
+    budget = max(memory_limit // CHUNK_FRACTION, 1)
+    profiles = None
+    preview = []
+    row_count = chunks = 0
+    rows_per_chunk = FIRST_CHUNK_ROWS
+
+    try:
+        # Chunks are already bounded, so pandas need not split them again (and warn about mixed types)
+        with pd.read_csv(path, chunksize=rows_per_chunk, low_memory=False) as reader:
+            while True:
+                try:
+                    chunk = reader.get_chunk(rows_per_chunk)
+                except StopIteration:
+                    break
+                if profiles is None:
+                    profiles = [ColumnProfile(str(c)) for c in chunk.columns]
+                for profile, column in zip(profiles, chunk.columns):
+                    profile.update(chunk[column])
+                if store is not None:
+                    store.append(chunk, profiles)
+                if len(preview) < preview_rows:
+                    preview.extend(_json_rows(chunk.head(preview_rows - len(preview))))
+                row_count += len(chunk)
+                chunks += 1
+                if progress:
+                    progress(row_count)
+
+                # Size the next chunk from this one's real memory footprint
+                bytes_per_row = chunk.memory_usage(deep=True).sum() / max(len(chunk), 1)
+                rows_per_chunk = max(MIN_CHUNK_ROWS, int(budget // max(bytes_per_row, 1)))
+                del chunk
+    except pd.errors.EmptyDataError:
+        profiles = []
+    except (pd.errors.ParserError, UnicodeDecodeError) as e:
+        raise ValueError(str(e)) from None
+
+    return {
+        "columns": [p.as_dict() for p in profiles or []],
+        "rows": preview,
+        "row_count": row_count,
+        "chunks": chunks,
+        "bytes": os.path.getsize(path),
+    }
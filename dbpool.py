@@ -0,0 +1,162 @@
+"""
+SQLite Connection Pool
+Per-thread pooled connections with WAL mode and tuned pragmas.
+
+Every thread (and every forked gunicorn worker) gets at most one writer and
+one reader connection, opened lazily and reused for the lifetime of the
+thread instead of reconnecting on every call.
+"""
+import os
+import sqlite3
+import threading
+import time
+import weakref
+
+# Tuned defaults, overridable through environment variables
+BUSY_TIMEOUT_MS = int(os.environ.get("IMCS_DB_BUSY_TIMEOUT_MS", 5000))
+CACHE_SIZE_KB = int(os.environ.get("IMCS_DB_CACHE_SIZE_KB", 20000))
+MMAP_SIZE = int(os.environ.get("IMCS_DB_MMAP_SIZE", 256 * 1024 * 1024))
+SYNCHRONOUS = os.environ.get("IMCS_DB_SYNCHRONOUS", "NORMAL")
+
+
+class PooledConnection(sqlite3.Connection):
+    """sqlite3 connection that remembers its pool role (and supports weakrefs)."""
+    role = "writer"
+
+
+def _apply_pragmas(conn, readonly=False):
+    """Apply performance pragmas to a freshly opened connection."""
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    conn.execute(f"PRAGMA synchronous = {SYNCHRONOUS}")
+    conn.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KB}")
+    conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    if readonly:
+        conn.execute("PRAGMA query_only = ON")
+
+
+def connect(path, readonly=False):
+    """Open a standalone tuned connection (for scripts and background jobs).
+
+    The caller owns the connection and must close it.
+    """
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_MS / 1000, factory=PooledConnection)
+    conn.row_factory = sqlite3.Row
+    if not readonly:
+        conn.execute("PRAGMA journal_mode = WAL")
+    _apply_pragmas(conn, readonly=readonly)
+    return conn
+
+
+class ConnectionPool:
+    """Thread-local pool of reader/writer connections to a single database.
+
+    - Writers run in WAL mode so readers never block on them.
+    - Readers are opened with ``query_only`` so accidental writes fail fast.
+    - Connections are discarded (not shared) after ``fork()``.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = weakref.WeakSet()
+        self._wal_ready = False
+        self._stats = {
+            "opened": {"reader": 0, "writer": 0},
+            "checkouts": {"reader": 0, "writer": 0},
+            "reused": {"reader": 0, "writer": 0},
+            "rollbacks_on_release": 0,
+            "connect_time_ms": 0.0,
+        }
+        self._created_at = time.time()
+
+    def _slots(self):
+        """Per-thread connection slots, reset after a fork."""
+        local = self._local
+        pid = os.getpid()
+        if getattr(local, "pid", None) != pid:
+            # Inherited from the parent process: never reuse across fork
+            local.pid = pid
+            local.conns = {}
+        return local.conns
+
+    def _open(self, role):
+        started = time.perf_counter()
+        conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_MS / 1000, factory=PooledConnection)
+        conn.row_factory = sqlite3.Row
+        conn.role = role
+        if role == "writer" and not self._wal_ready:
+            # journal_mode is persistent in the database file; set it once per process
+            conn.execute("PRAGMA journal_mode = WAL")
+            self._wal_ready = True
+        _apply_pragmas(conn, readonly=(role == "reader"))
+        elapsed = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self._connections.add(conn)
+            self._stats["opened"][role] += 1
+            self._stats["connect_time_ms"] += elapsed
+        return conn
+
+    def get(self, readonly=False):
+        """Return this thread's reader or writer connection, opening it if needed."""
+        role = "reader" if readonly else "writer"
+        slots = self._slots()
+        conn = slots.get(role)
+        with self._lock:
+            self._stats["checkouts"][role] += 1
+            if conn is not None:
+                self._stats["reused"][role] += 1
+        if conn is None:
+            conn = slots[role] = self._open(role)
+        return conn
+
+    def writer(self):
+        return self.get(readonly=False)
+
+    def reader(self):
+        return self.get(readonly=True)
+
+    def release(self):
+        """Roll back anything a request left uncommitted on this thread's writer."""
+        conn = self._slots().get("writer")
+        if conn is not None and conn.in_transaction:
+            conn.rollback()
+            with self._lock:
+                self._stats["rollbacks_on_release"] += 1
+
+    def close_thread(self):
+        """Close and forget the calling thread's connections."""
+        slots = self._slots()
+        for conn in slots.values():
+            conn.close()
+        slots.clear()
+
+    def stats(self):
+        """Pool statistics for monitoring."""
+        with self._lock:
+            live = list(self._connections)
+            stats = {
+                "database": self.path,
+                "pid": os.getpid(),
+                "uptime_seconds": round(time.time() - self._created_at, 1),
+                "open_connections": {
+                    "reader": sum(1 for c in live if c.role == "reader"),
+                    "writer": sum(1 for c in live if c.role == "writer"),
+                },
+                "opened": dict(self._stats["opened"]),
+                "checkouts": dict(self._stats["checkouts"]),
+                "reused": dict(self._stats["reused"]),
+                "rollbacks_on_release": self._stats["rollbacks_on_release"],
+                "avg_connect_ms": round(
+                    self._stats["connect_time_ms"] / max(sum(self._stats["opened"].values()), 1), 3
+                ),
+            }
+        stats["pragmas"] = {
+            "journal_mode": "wal",
+            "synchronous": SYNCHRONOUS.lower(),
+            "cache_size_kb": CACHE_SIZE_KB,
+            "mmap_size": MMAP_SIZE,
+            "busy_timeout_ms": BUSY_TIMEOUT_MS,
+        }
+        return stats
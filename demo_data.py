@@ -2,17 +2,40 @@
 Demo Data Generator
 Creates sample machines, sensors, and sensor readings for testing
 """
-import sqlite3
 import random
 from datetime import datetime, timedelta
-import os
+
+import dbpool
+import rollups
 
 DB = "imcs.db"
 
-def generate_demo_data(company_id=1, num_machines=5, days_of_data=30):
-    """Generate comprehensive demo data for testing"""
-    conn = sqlite3.connect(DB)
+def insert_readings(conn, readings):
+    """Insert readings and fold them into the rollups (no commit)."""
+    conn.executemany("""
+        INSERT INTO sensor_readings (sensor_id, value, timestamp)
+        VALUES (?, ?, ?)
+    """, readings)
+    rollups.record_readings(conn, readings)
+
+def generate_demo_data(company_id=1, num_machines=5, days_of_data=30, writer=None, progress=None):
+    """Generate comprehensive demo data for testing
+
+    With a writer.Writer each step is applied as an intent on the app's
+    single writer (one machine's readings per intent) instead of holding
+    the write lock on a private connection. progress(done, total), if
+    given, is called after each machine's readings; an exception it raises
+    stops the generation, keeping what was already written.
+    """
+    conn = dbpool.connect(DB)
     c = conn.cursor()
+
+    def apply(fn, *args):
+        if writer is not None:
+            return writer.run(fn, *args)
+        result = fn(conn, *args)
+        conn.commit()
+        return result
     
     try:
         # Machine types and locations
@@ -30,48 +53,47 @@ def generate_demo_data(company_id=1, num_machines=5, days_of_data=30):
             {'name': 'Power Consumption', 'unit': 'kW', 'min': 0, 'max': 100, 'normal_range': (10, 80)},
         ]
         
-        machine_ids = []
-        
         # Create machines
         print(f"Creating {num_machines} demo machines...")
-        for i in range(num_machines):
-            machine_type = random.choice(machine_types)
-            location = random.choice(locations)
-            status = random.choice(statuses)
-            rated_capacity = random.randint(50, 200)
-            
-            c.execute("""
-                INSERT INTO machines (name, type, location, rated_capacity, status, company_id, last_seen)
-                VALUES (?, ?, ?, ?, ?, ?, datetime('now'))
-            """, (f"{machine_type} {i+1}", machine_type, location, rated_capacity, status, company_id))
-            
-            machine_id = c.lastrowid
-            machine_ids.append(machine_id)
-            
-            # Create 2-4 sensors per machine
-            num_sensors = random.randint(2, 4)
-            selected_sensors = random.sample(sensor_configs, num_sensors)
-            
-            for sensor_config in selected_sensors:
-                c.execute("""
-                    INSERT INTO sensors (machine_id, name, unit, min_threshold, max_threshold)
-                    VALUES (?, ?, ?, ?, ?)
-                """, (
-                    machine_id,
-                    sensor_config['name'],
-                    sensor_config['unit'],
-                    sensor_config['min'],
-                    sensor_config['max']
-                ))
+        def create_machines(w):
+            machine_ids = []
+            for i in range(num_machines):
+                machine_type = random.choice(machine_types)
+                location = random.choice(locations)
+                status = random.choice(statuses)
+                rated_capacity = random.randint(50, 200)
+                
+                machine_id = w.execute("""
+                    INSERT INTO machines (name, type, location, rated_capacity, status, company_id, last_seen)
+                    VALUES (?, ?, ?, ?, ?, ?, datetime('now'))
+                """, (f"{machine_type} {i+1}", machine_type, location, rated_capacity, status, company_id)).lastrowid
+                machine_ids.append(machine_id)
+                
+                # Create 2-4 sensors per machine
+                num_sensors = random.randint(2, 4)
+                selected_sensors = random.sample(sensor_configs, num_sensors)
+                
+                for sensor_config in selected_sensors:
+                    w.execute("""
+                        INSERT INTO sensors (machine_id, name, unit, min_threshold, max_threshold)
+                        VALUES (?, ?, ?, ?, ?)
+                    """, (
+                        machine_id,
+                        sensor_config['name'],
+                        sensor_config['unit'],
+                        sensor_config['min'],
+                        sensor_config['max']
+                    ))
+            return machine_ids
         
-        conn.commit()
+        machine_ids = apply(create_machines)
         print(f"Created {len(machine_ids)} machines with sensors")
         
         # Generate sensor readings for the last N days
         print(f"Generating sensor readings for last {days_of_data} days...")
         total_readings = 0
         
-        for machine_id in machine_ids:
+        for done, machine_id in enumerate(machine_ids, 1):
             # Get sensors for this machine
             sensors = c.execute(
                 "SELECT id, name, unit, min_threshold, max_threshold FROM sensors WHERE machine_id = ?",
@@ -84,6 +106,7 @@ def generate_demo_data(company_id=1, num_machines=5, days_of_data=30):
             # Generate readings every 15 minutes for the last N days
             start_date = datetime.now() - timedelta(days=days_of_data)
             current_date = start_date
+            readings = []
             
             while current_date <= datetime.now():
                 for sensor in sensors:
@@ -111,10 +134,7 @@ def generate_demo_data(company_id=1, num_machines=5, days_of_data=30):
                     
                     timestamp = current_date.strftime('%Y-%m-%d %H:%M:%S')
                     
-                    c.execute("""
-                        INSERT INTO sensor_readings (sensor_id, value, timestamp)
-                        VALUES (?, ?, ?)
-                    """, (sensor_id, value, timestamp))
+                    readings.append((sensor_id, value, timestamp))
                     total_readings += 1
                 
                 # Move to next 15-minute interval
@@ -124,15 +144,18 @@ def generate_demo_data(company_id=1, num_machines=5, days_of_data=30):
                 if total_readings > 50000:
                     break
             
+            apply(insert_readings, readings)
+            if progress:
+                progress(done, len(machine_ids))
+            
             if total_readings > 50000:
                 break
         
-        conn.commit()
         print(f"Generated {total_readings} sensor readings")
         
         # Generate some alerts
         print("Generating sample alerts...")
-        alert_count = 0
+        alerts = []
         for machine_id in machine_ids[:3]:  # Alerts for first 3 machines
             for _ in range(random.randint(2, 5)):
                 severities = ['info', 'warning', 'critical']
@@ -150,18 +173,18 @@ def generate_demo_data(company_id=1, num_machines=5, days_of_data=30):
                 raised_at = (datetime.now() - timedelta(days=random.randint(0, days_of_data))).strftime('%Y-%m-%d %H:%M:%S')
                 acknowledged = 1 if random.random() < 0.6 else 0
                 
-                c.execute("""
-                    INSERT INTO alarms (machine_id, severity, message, raised_at, acknowledged, company_id)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                """, (machine_id, severity, message, raised_at, acknowledged, company_id))
-                alert_count += 1
+                alerts.append((machine_id, severity, message, raised_at, acknowledged, company_id))
         
-        conn.commit()
+        alert_count = len(alerts)
+        apply(lambda w: w.executemany("""
+            INSERT INTO alarms (machine_id, severity, message, raised_at, acknowledged, company_id)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, alerts))
         print(f"Generated {alert_count} alerts")
         
         # Generate maintenance tasks
         print("Generating maintenance tasks...")
-        maint_count = 0
+        tasks = []
         for machine_id in machine_ids:
             for _ in range(random.randint(1, 3)):
                 descriptions = [
@@ -181,14 +204,14 @@ def generate_demo_data(company_id=1, num_machines=5, days_of_data=30):
                 scheduled_date = (datetime.now() + timedelta(days=random.randint(-10, 30))).strftime('%Y-%m-%d')
                 technician = random.choice(['John Doe', 'Jane Smith', 'Mike Johnson', 'Sarah Williams', None])
                 
-                c.execute("""
-                    INSERT INTO maintenance_tasks 
-                    (machine_id, description, priority, technician, scheduled_date, status, company_id)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                """, (machine_id, description, priority, technician, scheduled_date, status, company_id))
-                maint_count += 1
+                tasks.append((machine_id, description, priority, technician, scheduled_date, status, company_id))
         
-        conn.commit()
+        maint_count = len(tasks)
+        apply(lambda w: w.executemany("""
+            INSERT INTO maintenance_tasks 
+            (machine_id, description, priority, technician, scheduled_date, status, company_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, tasks))
         print(f"Generated {maint_count} maintenance tasks")
         
         print(f"\n✅ Demo data generation complete!")
@@ -0,0 +1,102 @@
+"""
+Time Series Downsampling
+Reduces long sensor series to a fixed number of points before they are
+charted or sent to the browser.
+
+Two methods, both vectorised with NumPy so a month of readings is reduced
+in milliseconds:
+
+    lttb     Largest-Triangle-Three-Buckets: keeps the points that best
+             preserve the visual shape of the line
+    minmax   Minimum and maximum of each bucket: keeps every spike and dip,
+             suited to alarm-style signals
+
+Both return indices into the input, always keep the first and last point,
+and return the series unchanged when it already fits in max_points.
+"""
+import numpy as np
+
+METHODS = ("lttb", "minmax")
+DEFAULT_MAX_POINTS = 500
+MAX_POINTS_LIMIT = 5000
+
+
+def to_epoch(timestamps):
+    """Seconds since the epoch for 'YYYY-MM-DD HH:MM:SS'/ISO strings, as float64."""
+    return np.array(timestamps, dtype="datetime64[ms]").astype(np.int64) / 1000.0
+
+
+def lttb(x, y, max_points):
+    """Indices of the Largest-Triangle-Three-Buckets selection of (x, y)."""
+    n = len(y)
+    if max_points >= n or max_points < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+
+    # Interior points split into max_points - 2 buckets; first/last kept as-is
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+    # Average of each following bucket (the last bucket looks at the final point)
+    sums_x = np.add.reduceat(x[1:n - 1], edges[:-1] - 1)
+    sums_y = np.add.reduceat(y[1:n - 1], edges[:-1] - 1)
+    counts = np.diff(edges)
+    avg_x = np.append(sums_x / counts, x[-1])[1:]
+    avg_y = np.append(sums_y / counts, y[-1])[1:]
+
+    selected = np.empty(max_points, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(max_points - 2):
+        start, end = edges[i], edges[i + 1]
+        # Twice the triangle area between the previous pick, each candidate
+        # and the next bucket's average (the constant factor does not matter)
+        area = np.abs(
+            (x[a] - avg_x[i]) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (avg_y[i] - y[a])
+        )
+        a = selected[i + 1] = start + int(area.argmax())
+    return selected
+
+
+def minmax(y, max_points):
+    """Indices of the minimum and maximum of each of max_points // 2 buckets."""
+    n = len(y)
+    if max_points >= n or max_points < 4:
+        return np.arange(n)
+    y = np.asarray(y, dtype=float)
+
+    buckets = (max_points - 2) // 2
+    edges = np.linspace(1, n - 1, buckets + 1).astype(np.int64)
+    idx = np.arange(n)
+    # Sort each bucket by value: its first and last entries are its min and max
+    bucket_of = np.searchsorted(edges, idx[1:n - 1], side="right") - 1
+    order = np.lexsort((y[1:n - 1], bucket_of)) + 1
+    picks = np.concatenate(([0], order[edges[:-1] - 1], order[edges[1:] - 2], [n - 1]))
+    return np.unique(picks)
+
+
+def downsample(timestamps, values, max_points=DEFAULT_MAX_POINTS, method="lttb"):
+    """Downsample parallel timestamp/value lists; returns (timestamps, values).
+
+    Timestamps must be in ascending order. Unknown methods fall back to lttb.
+    """
+    if not max_points or len(values) <= max_points:
+        return list(timestamps), list(values)
+    if method == "minmax":
+        keep = minmax(values, max_points)
+    else:
+        keep = lttb(to_epoch(timestamps), values, max_points)
+    return [timestamps[i] for i in keep], [values[i] for i in keep]
+
+
+def parse_args(args, default=DEFAULT_MAX_POINTS):
+    """(max_points, method) from a query-string mapping.
+
+    ?max_points=300&method=minmax; ?resolution= is accepted as an alias of
+    max_points. max_points=0 disables downsampling.
+    """
+    max_points = args.get("max_points", type=int)
+    if max_points is None:
+        max_points = args.get("resolution", default, type=int)
+    method = args.get("method", "lttb")
+    return max(0, min(max_points, MAX_POINTS_LIMIT)), method if method in METHODS else "lttb"
@@ -0,0 +1,171 @@
+"""
+Live Events
+In-process publish/subscribe bus behind the /api/stream Server-Sent Events
+endpoint.
+
+Write routes publish small events (alarm raised, machine status changed,
+KPI deltas, ...) after they commit. Each company keeps a bounded history so
+a reconnecting browser can replay what it missed via Last-Event-ID; event
+ids carry a per-process token, so an id from another worker or an earlier
+process triggers a "resync" (the client reloads everything) instead of a
+silent gap.
+"""
+import itertools
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+
+HISTORY = int(os.environ.get("SSE_HISTORY", 500))
+MAX_CONNECTIONS = int(os.environ.get("SSE_MAX_CONNECTIONS", 48))
+HEARTBEAT_SECONDS = float(os.environ.get("SSE_HEARTBEAT_SECONDS", 15))
+MAX_STREAM_SECONDS = float(os.environ.get("SSE_MAX_STREAM_SECONDS", 600))
+RETRY_MS = 5000
+
+
+class StreamLimitReached(Exception):
+    """This worker already serves its maximum number of streams."""
+
+
+def format_event(event_type, data, event_id=None):
+    """Encode one SSE message."""
+    lines = [f"id: {event_id}"] if event_id else []
+    lines.append(f"event: {event_type}")
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'), default=str)}")
+    return "\n".join(lines) + "\n\n"
+
+
+class EventBus:
+    """Per-company event history with blocking waits for stream threads."""
+
+    def __init__(self, history=HISTORY, max_connections=MAX_CONNECTIONS):
+        self.history = history
+        self.max_connections = max_connections
+        self.token = uuid.uuid4().hex[:8]
+        self._seq = itertools.count(1)
+        self._last_seq = 0
+        self._events = {}   # company_id -> deque[(seq, type, data)]
+        self._dropped = {}  # company_id -> newest seq evicted from history
+        self._kpis = {}     # company_id -> last published KPI snapshot
+        self._cond = threading.Condition()
+        self._connections = 0
+        self._stats = {"published": 0, "streams_opened": 0, "streams_rejected": 0}
+
+    # ---- publishing ----
+    def publish(self, company_id, event_type, data):
+        with self._cond:
+            seq = self._last_seq = next(self._seq)
+            events = self._events.setdefault(company_id, deque(maxlen=self.history))
+            if len(events) == events.maxlen:
+                self._dropped[company_id] = events[0][0]
+            events.append((seq, event_type, data))
+            self._stats["published"] += 1
+            self._cond.notify_all()
+        return seq
+
+    def publish_kpis(self, company_id, snapshot):
+        """Publish only the KPI fields that changed since the last snapshot."""
+        with self._cond:
+            last = self._kpis.get(company_id, {})
+            delta = {k: v for k, v in snapshot.items() if last.get(k) != v}
+            self._kpis[company_id] = dict(snapshot)
+        if delta:
+            self.publish(company_id, "kpis", delta)
+        return delta
+
+    def seed_kpis(self, company_id, snapshot):
+        """Record a baseline snapshot (if none yet) so the first delta is minimal."""
+        with self._cond:
+            self._kpis.setdefault(company_id, dict(snapshot))
+
+    @property
+    def connections(self):
+        return self._connections
+
+    # ---- subscribing ----
+    def event_id(self, seq):
+        return f"{self.token}-{seq}"
+
+    def parse_event_id(self, value):
+        """Sequence number from a Last-Event-ID issued by this bus, else None."""
+        token, _, seq = (value or "").partition("-")
+        if token != self.token or not seq.isdigit():
+            return None
+        return int(seq)
+
+    def _since(self, company_id, last_seq):
+        if last_seq < self._dropped.get(company_id, 0):
+            return None
+        return [e for e in self._events.get(company_id, ()) if e[0] > last_seq]
+
+    def wait(self, company_id, last_seq, timeout):
+        """Events newer than last_seq, waiting up to `timeout` for some.
+
+        Returns [] on timeout and None when events after last_seq have
+        already been evicted from the history.
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._since(company_id, last_seq) != [], timeout)
+            return self._since(company_id, last_seq)
+
+    def acquire(self):
+        """Reserve a stream slot; raises StreamLimitReached when full."""
+        with self._cond:
+            if self._connections >= self.max_connections:
+                self._stats["streams_rejected"] += 1
+                raise StreamLimitReached(f"{self._connections} streams open")
+            self._connections += 1
+            self._stats["streams_opened"] += 1
+
+    def release(self):
+        with self._cond:
+            self._connections -= 1
+
+    def stream(self, company_id, last_event_id=None, initial=(), on_heartbeat=None,
+               heartbeat=HEARTBEAT_SECONDS, max_seconds=MAX_STREAM_SECONDS):
+        """Yield SSE chunks for one client until max_seconds have passed.
+
+        Args:
+            last_event_id: Client's Last-Event-ID; events after it are replayed
+            initial: (type, data) pairs sent first, without ids
+            on_heartbeat: Called on every idle heartbeat; returns (type, data)
+                pairs to send (used to pick up changes made by other workers)
+        """
+        last_seq = self.parse_event_id(last_event_id)
+        yield f"retry: {RETRY_MS}\n\n"
+        if last_seq is None:
+            if last_event_id:
+                yield format_event("resync", {})
+            with self._cond:
+                last_seq = self._last_seq
+        for event_type, data in initial:
+            yield format_event(event_type, data)
+
+        # Streams end periodically so clients reconnect and spread across workers
+        deadline = time.monotonic() + max_seconds
+        while time.monotonic() < deadline:
+            events = self.wait(company_id, last_seq, heartbeat)
+            if events is None:
+                with self._cond:
+                    last_seq = self._last_seq
+                yield format_event("resync", {})
+            elif not events:
+                yield ": heartbeat\n\n"
+                for event_type, data in (on_heartbeat() if on_heartbeat else ()):
+                    yield format_event(event_type, data)
+            else:
+                for seq, event_type, data in events:
+                    yield format_event(event_type, data, self.event_id(seq))
+                    last_seq = seq
+
+    def stats(self):
+        with self._cond:
+            return {
+                **self._stats,
+                "connections": self._connections,
+                "max_connections": self.max_connections,
+                "companies": len(self._events),
+                "buffered_events": sum(len(e) for e in self._events.values()),
+            }
@@ -0,0 +1,154 @@
+"""
+Fleet Queries
+Set-based machine listings with efficiency, filtering, sorting and paging,
+computed in a single query from the per-sensor running statistics.
+"""
+
+SORT_COLUMNS = {
+    "id": "m.id",
+    "name": "m.name",
+    "type": "m.type",
+    "location": "m.location",
+    "status": "m.status",
+    "rated_capacity": "m.rated_capacity",
+    "last_seen": "m.last_seen",
+    "efficiency": "efficiency",
+}
+FILTER_COLUMNS = ("status", "type", "location")
+
+INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_machines_company_status ON machines(company_id, status);
+CREATE INDEX IF NOT EXISTS idx_machines_company_location ON machines(company_id, location);
+"""
+
+
+def ensure_schema(conn):
+    """Create the fleet listing indexes on older databases."""
+    has_machines = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='machines'"
+    ).fetchone()
+    if has_machines:
+        conn.executescript(INDEXES)
+
+
+def fleet_query(conn, company_id, filters=None, sort="id", order="asc", limit=None, offset=0):
+    """List a company's machines with efficiency in one pass.
+
+    Args:
+        conn: Database connection
+        company_id: Tenant to list
+        filters: {"status"|"type"|"location": value or list of values}
+        sort: Key of SORT_COLUMNS (unknown keys fall back to "id")
+        order: "asc" or "desc"
+        limit: Page size (None returns every machine)
+        offset: Rows to skip
+
+    Returns (rows, total) where rows are dicts with an `efficiency` key
+    and total is the number of machines matching the filters.
+    """
+    where = ["m.company_id = ?"]
+    params = [company_id, company_id]
+    for column, value in (filters or {}).items():
+        if column not in FILTER_COLUMNS or value in (None, "", []):
+            continue
+        values = value if isinstance(value, (list, tuple)) else [value]
+        where.append(f"m.{column} IN ({','.join('?' * len(values))})")
+        params.extend(values)
+
+    sort_column = SORT_COLUMNS.get(sort, "m.id")
+    direction = "DESC" if str(order).lower() == "desc" else "ASC"
+    query = f"""
+        SELECT m.*, COALESCE(e.efficiency, 0) AS efficiency, COUNT(*) OVER () AS total_count
+        FROM machines m
+        LEFT JOIN (
+            SELECT s.machine_id, SUM(st.value_sum) / SUM(st.reading_count) AS efficiency
+            FROM sensor_stats st
+            JOIN sensors s ON st.sensor_id = s.id
+            JOIN machines mm ON s.machine_id = mm.id
+            WHERE mm.company_id = ?
+            GROUP BY s.machine_id
+        ) e ON e.machine_id = m.id
+        WHERE {' AND '.join(where)}
+        ORDER BY {sort_column} {direction}, m.id {direction}
+    """
+    if limit is not None:
+        query += " LIMIT ? OFFSET ?"
+        params.extend([int(limit), int(offset or 0)])
+
+    rows = conn.execute(query, params).fetchall()
+    total = rows[0]["total_count"] if rows else 0
+    if not rows and limit is not None and offset:
+        # Page past the end: still report how many machines match
+        total = conn.execute(
+            f"SELECT COUNT(*) FROM machines m WHERE {' AND '.join(where)}", params[1:len(params) - 2]
+        ).fetchone()[0]
+
+    result = []
+    for row in rows:
+        machine = dict(row)
+        machine.pop("total_count", None)
+        machine["efficiency"] = round(float(machine["efficiency"] or 0), 2)
+        result.append(machine)
+    return result, total
+
+
+STATUSES = ("running", "idle", "down", "maintenance")
+
+
+def location_breakdown(conn, company_id=None):
+    """Per-location fleet aggregates in a single grouped query.
+
+    Returns one dict per location (sorted by name) with machine_count,
+    per-status counts, running_count, machine-weighted efficiency (mean of
+    machine averages), reading-weighted efficiency (all readings pooled),
+    open_alerts and pending_maintenance. company_id=None covers all tenants.
+    """
+    scope = "" if company_id is None else "WHERE company_id = ?"
+    params = [] if company_id is None else [company_id] * 3
+    status_columns = ",\n               ".join(
+        f"SUM(CASE WHEN m.status = '{status}' THEN 1 ELSE 0 END) AS {status}_count"
+        for status in STATUSES
+    )
+    rows = conn.execute(f"""
+        WITH scoped AS (
+            SELECT id, location, status FROM machines {scope}
+        ),
+        machine_eff AS (
+            SELECT s.machine_id, SUM(st.value_sum) AS value_sum, SUM(st.reading_count) AS reading_count
+            FROM sensor_stats st
+            JOIN sensors s ON st.sensor_id = s.id
+            JOIN scoped sm ON s.machine_id = sm.id
+            GROUP BY s.machine_id
+        ),
+        open_alerts AS (
+            SELECT machine_id, COUNT(*) AS n FROM alarms
+            {scope} {'AND' if scope else 'WHERE'} acknowledged = 0
+            GROUP BY machine_id
+        ),
+        pending AS (
+            SELECT machine_id, COUNT(*) AS n FROM maintenance_tasks
+            {scope} {'AND' if scope else 'WHERE'} status = 'open'
+            GROUP BY machine_id
+        )
+        SELECT m.location,
+               COUNT(*) AS machine_count,
+               {status_columns},
+               AVG(CASE WHEN e.reading_count > 0 THEN e.value_sum / e.reading_count END) AS efficiency_machine_weighted,
+               SUM(e.value_sum) / SUM(e.reading_count) AS efficiency_reading_weighted,
+               COALESCE(SUM(a.n), 0) AS open_alerts,
+               COALESCE(SUM(p.n), 0) AS pending_maintenance
+        FROM scoped m
+        LEFT JOIN machine_eff e ON e.machine_id = m.id
+        LEFT JOIN open_alerts a ON a.machine_id = m.id
+        LEFT JOIN pending p ON p.machine_id = m.id
+        GROUP BY m.location
+        ORDER BY m.location
+    """, params).fetchall()
+
+    result = []
+    for row in rows:
+        entry = dict(row)
+        entry["status_counts"] = {status: entry.pop(f"{status}_count") or 0 for status in STATUSES}
+        entry["running_count"] = entry["status_counts"]["running"]
+        result.append(entry)
+    return result
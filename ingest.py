@@ -0,0 +1,297 @@
+"""
+Sensor Reading Ingestion
+Bulk parsing, validation and insertion of readings pushed by PLC gateways.
+
+Accepted payloads (one reading per record):
+    NDJSON      {"sensor_id": 12, "value": 71.3, "timestamp": "2025-01-01T10:00:00Z"}
+    CSV         sensor_id,value,timestamp header followed by rows, e.g.
+                12,71.3,2025-01-01T10:00:00Z
+                12,71.9,1735725660
+    JSON array  [{"sensor_id": ..., "value": ..., "timestamp": ...}, ...]
+
+`timestamp` is optional (defaults to now, UTC) and may be ISO 8601 or epoch
+seconds, as a number or a numeric string; it is stored as 'YYYY-MM-DD HH:MM:SS' like the rest of the schema.
+"""
+import csv
+import io
+import json
+import math
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+import cache
+import rollups
+
+BATCH_SIZE = 5000
+MAX_ERROR_SAMPLES = 20
+# Batches handed to a writer.Writer but not yet committed, per ingest() call
+MAX_PENDING = 4
+
+
+class PartialIngest(Exception):
+    """ingest() failed after some batches were committed.
+
+    `error` is the original exception; `summary` covers the committed batches only.
+    """
+
+    def __init__(self, error, summary):
+        super().__init__(str(error))
+        self.error = error
+        self.summary = summary
+
+
+def normalize_timestamp(value):
+    """Return 'YYYY-MM-DD HH:MM:SS' (UTC for zone-aware input) or None if invalid."""
+    if value is None or value == "":
+        return datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+    try:
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            parsed = datetime.fromtimestamp(value, tz=timezone.utc)
+        else:
+            text = str(value).strip()
+            try:
+                # CSV and form values are strings: "1700000000" is epoch seconds too
+                parsed = datetime.fromtimestamp(float(text), tz=timezone.utc)
+            except ValueError:
+                parsed = datetime.fromisoformat(text)
+    except (ValueError, OverflowError, OSError):
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    # isoformat() is several times faster than strftime() on the hot path
+    return parsed.isoformat(sep=" ", timespec="seconds")
+
+
+def parse_ndjson(lines):
+    """Yield one record per non-blank line; malformed lines yield None."""
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+        yield record if isinstance(record, dict) else None
+
+
+def parse_csv(lines):
+    """Yield one record per CSV row (header row required)."""
+    yield from csv.DictReader(lines)
+
+
+def parse_json_array(payload):
+    """Yield records from a JSON array or a {"readings": [...]} object."""
+    if isinstance(payload, dict):
+        payload = payload.get("readings", [])
+    if not isinstance(payload, list):
+        return
+    for record in payload:
+        yield record if isinstance(record, dict) else None
+
+
+def iter_records(stream, content_type):
+    """Pick a parser from the request content type and stream records from `stream`."""
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    if content_type in ("application/x-ndjson", "application/ndjson", "application/jsonl",
+                        "application/x-jsonlines"):
+        return parse_ndjson(io.TextIOWrapper(stream, encoding="utf-8"))
+    if content_type in ("text/csv", "application/csv"):
+        return parse_csv(io.TextIOWrapper(stream, encoding="utf-8", newline=""))
+    if content_type == "application/json":
+        return parse_json_array(json.load(io.TextIOWrapper(stream, encoding="utf-8")))
+    raise ValueError(f"Unsupported content type: {content_type or 'none'}")
+
+
+def company_sensor_ids(conn, company_id):
+    """All sensor ids owned by a company, fetched in one query for bulk validation."""
+    rows = conn.execute("""
+        SELECT s.id FROM sensors s
+        JOIN machines m ON s.machine_id = m.id
+        WHERE m.company_id = ?
+    """, (company_id,)).fetchall()
+    return {r[0] for r in rows}
+
+
+def validate(record, sensor_ids):
+    """Return ((sensor_id, value, timestamp), None) or (None, reason)."""
+    if record is None:
+        return None, "malformed"
+    try:
+        sensor_id = int(record.get("sensor_id"))
+    except (TypeError, ValueError):
+        return None, "invalid_sensor_id"
+    if sensor_id not in sensor_ids:
+        return None, "unknown_sensor"
+    try:
+        value = float(record.get("value"))
+    except (TypeError, ValueError):
+        return None, "invalid_value"
+    if not math.isfinite(value):
+        return None, "invalid_value"
+    timestamp = normalize_timestamp(record.get("timestamp"))
+    if timestamp is None:
+        return None, "invalid_timestamp"
+    return (sensor_id, value, timestamp), None
+
+
+def insert_batch(conn, rows, company_id=None, alarms=None):
+    """Insert one batch of validated rows and its rollups without committing.
+
+    With an alarm_engine.AlarmEngine the batch is evaluated in the same
+    transaction; returns its alarm changes (or None). The company's data
+    versions are bumped with the batch so each commit invalidates on its
+    own. If the batch fails
+    here or its transaction does not commit, the engine's state for the
+    company is invalidated (see _abandon()).
+    """
+    try:
+        conn.executemany(
+            "INSERT INTO sensor_readings (sensor_id, value, timestamp) VALUES (?, ?, ?)",
+            rows
+        )
+        rollups.record_readings(conn, rows)
+        sensor_ids = sorted({r[0] for r in rows})
+        conn.execute(
+            f"""UPDATE machines SET last_seen = datetime('now')
+                WHERE id IN (SELECT machine_id FROM sensors WHERE id IN ({','.join('?' * len(sensor_ids))}))""",
+            sensor_ids
+        )
+        changes = alarms.evaluate(conn, company_id, rows) if alarms else None
+        if company_id is not None:
+            tags = ["readings", "machines"]
+            if changes and (changes["raised"] or changes["cleared"]):
+                tags.append("alarms")
+            cache.bump(conn, company_id, *tags)
+        return changes
+    except Exception:
+        _abandon(company_id, alarms)
+        raise
+
+
+def _abandon(company_id, alarms):
+    """A batch was rolled back: make the alarm engine reload its active alarms.
+
+    evaluate() updates rule state in memory before the transaction commits,
+    so it may hold alarms that were never written.
+    """
+    if alarms:
+        alarms.invalidate(company_id)
+
+
+def write_batch(conn, rows, company_id=None, alarms=None):
+    """insert_batch() in a transaction of its own."""
+    try:
+        changes = insert_batch(conn, rows, company_id, alarms)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        _abandon(company_id, alarms)
+        raise
+    return changes
+
+
+def ingest(conn, company_id, records, batch_size=BATCH_SIZE, alarms=None, writer=None):
+    """Validate and insert readings in grouped transactions.
+
+    Args:
+        conn: Writer connection (any connection when `writer` is given)
+        company_id: Tenant the readings must belong to
+        records: Iterable of dicts (see module docstring)
+        batch_size: Rows per transaction
+        alarms: Optional alarm_engine.AlarmEngine run on every batch
+        writer: Optional writer.Writer; batches are then submitted to it and
+            the next one is parsed while earlier ones are being written
+
+    Returns a summary dict with per-batch accepted/rejected counts; with
+    `alarms`, "alarms" holds the raised and cleared alarms. Batches commit
+    independently: if one fails after others were committed, PartialIngest
+    is raised with the summary of the committed ones.
+    """
+    started = time.perf_counter()
+    sensor_ids = company_sensor_ids(conn, company_id)
+    batches = []
+    rejected_reasons = {}
+    errors = []
+    rows = []
+    rejected = 0
+    alarm_changes = {"raised": [], "cleared": []}
+    pending = deque()
+    flushed = 0
+
+    def settle(limit):
+        while len(pending) > limit:
+            future, batch = pending.popleft()
+            try:
+                changes = future.result(writer.timeout)
+            except Exception:
+                # The group holding the batch did not commit
+                _abandon(company_id, alarms)
+                raise
+            committed(batch, changes)
+
+    def committed(batch, changes):
+        batches.append(batch)
+        for kind, changed in (changes or {}).items():
+            alarm_changes[kind].extend(changed)
+
+    def flush():
+        nonlocal rows, rejected, flushed
+        if rows or rejected:
+            flushed += 1
+            batch = {"batch": flushed, "accepted": len(rows), "rejected": rejected}
+            if rows and writer is not None:
+                pending.append((writer.submit(insert_batch, rows, company_id, alarms), batch))
+                settle(MAX_PENDING)
+            elif rows:
+                committed(batch, write_batch(conn, rows, company_id, alarms))
+            else:
+                committed(batch, None)
+        rows, rejected = [], 0
+
+    try:
+        for index, record in enumerate(records):
+            row, reason = validate(record, sensor_ids)
+            if row is None:
+                rejected += 1
+                rejected_reasons[reason] = rejected_reasons.get(reason, 0) + 1
+                if len(errors) < MAX_ERROR_SAMPLES:
+                    errors.append({"index": index, "reason": reason})
+            else:
+                rows.append(row)
+            if len(rows) + rejected >= batch_size:
+                flush()
+        flush()
+        settle(0)
+    except Exception as e:
+        # Batches already handed to the writer still commit or fail on their own
+        while pending:
+            try:
+                settle(len(pending) - 1)
+            except Exception:
+                pass
+        if not any(b["accepted"] for b in batches):
+            raise
+        raise PartialIngest(e, _summary(batches, rejected_reasons, errors, alarm_changes, alarms, started)) from e
+
+    return _summary(batches, rejected_reasons, errors, alarm_changes, alarms, started)
+
+
+def _summary(batches, rejected_reasons, errors, alarm_changes, alarms, started):
+    """The ingest() result for the committed `batches`."""
+    batches.sort(key=lambda b: b["batch"])
+    elapsed = time.perf_counter() - started
+    accepted = sum(b["accepted"] for b in batches)
+    summary = {
+        "accepted": accepted,
+        "rejected": sum(b["rejected"] for b in batches),
+        "batches": batches,
+        "rejected_reasons": rejected_reasons,
+        "errors": errors,
+        "elapsed_ms": round(elapsed * 1000, 1),
+        "rows_per_second": round(accepted / elapsed) if elapsed > 0 else accepted
+    }
+    if alarms:
+        summary["alarms"] = alarm_changes
+    return summary
@@ -0,0 +1,419 @@
+"""
+Background Jobs
+SQLite-backed job queue for operations that outlive an HTTP request (demo
+data generation and clearing, CSV conversion, exports, dataset imports).
+
+Routes submit a job and return 202 with its id; given a writer.Writer,
+submitting, cancelling and retrying run as its intents (insert_job(),
+cancel_job(), requeue_job()), so request threads never commit job rows
+themselves. Worker threads in every web process claim queued jobs in one
+BEGIN IMMEDIATE transaction, so a job runs exactly once whichever process
+picks it up. At most JOBS_PER_COMPANY jobs of
+one company run at a time, so a tenant's bulk work cannot take every worker.
+
+Handlers are registered per kind and receive a JobContext; calling
+ctx.progress() records progress, refreshes the heartbeat and raises
+JobCancelled once the job has been cancelled. A monitor thread per process
+keeps the heartbeat of its running jobs fresh, fails jobs whose process
+died, wakes workers for jobs submitted by other processes and purges
+finished jobs after JOBS_RETENTION_DAYS.
+"""
+import json
+import os
+import threading
+import time
+import traceback
+from datetime import datetime
+
+import dbpool
+
+WORKERS = int(os.environ.get("JOBS_WORKERS", 2))
+PER_COMPANY = int(os.environ.get("JOBS_PER_COMPANY", 1))
+HEARTBEAT_SECONDS = float(os.environ.get("JOBS_HEARTBEAT_SECONDS", 10))
+STALE_SECONDS = float(os.environ.get("JOBS_STALE_SECONDS", 120))
+RETENTION_DAYS = int(os.environ.get("JOBS_RETENTION_DAYS", 7))
+PROGRESS_INTERVAL = 0.5
+PURGE_INTERVAL = 3600
+
+STATES = ("queued", "running", "done", "failed", "cancelled")
+FINAL_STATES = ("done", "failed", "cancelled")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    company_id INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    params TEXT NOT NULL DEFAULT '{}',
+    state TEXT NOT NULL DEFAULT 'queued',
+    progress REAL NOT NULL DEFAULT 0,
+    message TEXT,
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    created_by TEXT,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    started_at TEXT,
+    finished_at TEXT,
+    heartbeat_at TEXT,
+    FOREIGN KEY(company_id) REFERENCES companies(id)
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_state_company ON jobs(state, company_id);
+CREATE INDEX IF NOT EXISTS idx_jobs_company_created ON jobs(company_id, created_at);
+"""
+
+COLUMNS = ("id, company_id, kind, params, state, progress, message, result, error, attempts, "
+           "cancel_requested, created_by, created_at, started_at, finished_at")
+
+
+class JobCancelled(Exception):
+    """Raised inside a handler once its job has been cancelled."""
+
+
+def ensure_schema(conn):
+    conn.executescript(SCHEMA)
+
+
+def _now():
+    return datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def as_dict(row):
+    job = dict(row)
+    job["params"] = json.loads(job["params"] or "{}")
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    job["cancel_requested"] = bool(job["cancel_requested"])
+    return job
+
+
+def get(conn, company_id, job_id):
+    row = conn.execute(f"SELECT {COLUMNS} FROM jobs WHERE id = ? AND company_id = ?", (job_id, company_id)).fetchone()
+    return as_dict(row) if row else None
+
+
+def entries(conn, company_id, state=None, limit=50):
+    """A company's most recent jobs, optionally of one state."""
+    where, params = "company_id = ?", [company_id]
+    if state:
+        where += " AND state = ?"
+        params.append(state)
+    rows = conn.execute(
+        f"SELECT {COLUMNS} FROM jobs WHERE {where} ORDER BY id DESC LIMIT ?", params + [limit]
+    ).fetchall()
+    return [as_dict(r) for r in rows]
+
+
+# ---- intents (the caller commits) ----
+def insert_job(conn, company_id, kind, params=None, user=None):
+    """Insert a queued job; returns its id."""
+    cur = conn.execute(
+        "INSERT INTO jobs (company_id, kind, params, created_by) VALUES (?, ?, ?, ?)",
+        (company_id, kind, json.dumps(params or {}), user)
+    )
+    return cur.lastrowid
+
+
+def cancel_job(conn, company_id, job_id):
+    """Cancel a queued job, or flag a running one to stop; returns True if it was cancelled outright."""
+    cur = conn.execute(
+        "UPDATE jobs SET state = 'cancelled', finished_at = ? WHERE id = ? AND company_id = ? AND state = 'queued'",
+        (_now(), job_id, company_id)
+    )
+    if cur.rowcount:
+        return True
+    conn.execute(
+        "UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND company_id = ? AND state = 'running'",
+        (job_id, company_id)
+    )
+    return False
+
+
+def requeue_job(conn, company_id, job_id):
+    """Reset a failed or cancelled job to queued under the same id; returns whether it was."""
+    cur = conn.execute(
+        """UPDATE jobs SET state = 'queued', progress = 0, message = NULL, result = NULL, error = NULL,
+               cancel_requested = 0, started_at = NULL, finished_at = NULL, heartbeat_at = NULL
+           WHERE id = ? AND company_id = ? AND state IN ('failed', 'cancelled')""",
+        (job_id, company_id)
+    )
+    return cur.rowcount > 0
+
+
+class JobContext:
+    """What a handler sees of its job."""
+
+    def __init__(self, queue, conn, job):
+        self.queue = queue
+        self.id = job["id"]
+        self.company_id = job["company_id"]
+        self.kind = job["kind"]
+        self.params = job["params"]
+        self.user = job["created_by"]
+        self._conn = conn
+        self._last_write = 0.0
+
+    def progress(self, fraction=None, message=None, force=False):
+        """Record progress (0..1) and a status line; raises JobCancelled if cancelled.
+
+        Writes are throttled to one per PROGRESS_INTERVAL unless forced.
+        """
+        now = time.monotonic()
+        if not force and now - self._last_write < PROGRESS_INTERVAL:
+            return
+        self._last_write = now
+        self._conn.execute(
+            """UPDATE jobs SET progress = COALESCE(?, progress), message = COALESCE(?, message), heartbeat_at = ?
+               WHERE id = ?""",
+            (None if fraction is None else max(0.0, min(float(fraction), 1.0)), message, _now(), self.id)
+        )
+        self._conn.commit()
+        self.check()
+        self.queue._changed(self._conn, self.id)
+
+    def check(self):
+        """Raise JobCancelled if a cancel was requested."""
+        row = self._conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (self.id,)).fetchone()
+        if row and row[0]:
+            raise JobCancelled()
+
+
+class JobQueue:
+    """Job submission plus this process's worker and monitor threads.
+
+    on_change(job) is called whenever a job changes state or reports
+    progress; teardown() runs on the worker thread after every job. With a
+    writer, submit(), cancel() and retry() write through it and `conn` is
+    only read from.
+    """
+
+    def __init__(self, path, workers=WORKERS, per_company=PER_COMPANY, on_change=None, teardown=None,
+                 writer=None):
+        self.path = path
+        self.writer = writer
+        self.workers = workers
+        self.per_company = max(per_company, 1)
+        self.on_change = on_change
+        self.teardown = teardown
+        self._handlers = {}
+        self._cleanups = {}
+        self._uncancellable = set()
+        self._running = set()     # job ids running in this process
+        self._cond = threading.Condition()
+        self._pid = None
+        self._stats = {"submitted": 0, "done": 0, "failed": 0, "cancelled": 0, "recovered": 0, "purged": 0}
+
+    def register(self, kind, handler, cleanup=None, cancellable=True):
+        """Run `handler(ctx)` for jobs of `kind`; its return value is the job result.
+
+        cleanup(job), if given, runs when a finished job is purged (for files
+        the job left behind). Kinds whose handler never calls ctx.progress()
+        should pass cancellable=False: they can only be cancelled while queued.
+        """
+        self._handlers[kind] = handler
+        if cleanup:
+            self._cleanups[kind] = cleanup
+        if not cancellable:
+            self._uncancellable.add(kind)
+
+    def cancellable(self, kind):
+        """Whether a running job of `kind` stops when cancelled."""
+        return kind not in self._uncancellable
+
+    # ---- submitting and managing ----
+    def _write(self, conn, fn, *args):
+        if self.writer is not None:
+            return self.writer.run(fn, *args)
+        result = fn(conn, *args)
+        conn.commit()
+        return result
+
+    def submit(self, conn, company_id, kind, params=None, user=None):
+        """Queue a job; returns its id."""
+        if kind not in self._handlers:
+            raise ValueError(f"unknown job kind {kind!r}")
+        job_id = self._write(conn, insert_job, company_id, kind, params, user)
+        with self._cond:
+            self._stats["submitted"] += 1
+        self._wake()
+        return job_id
+
+    def cancel(self, conn, company_id, job_id):
+        """Cancel a queued job now, or ask a running one to stop; returns the job or None."""
+        if self._write(conn, cancel_job, company_id, job_id):
+            with self._cond:
+                self._stats["cancelled"] += 1
+            self._changed(conn, job_id)
+        return get(conn, company_id, job_id)
+
+    def retry(self, conn, company_id, job_id):
+        """Queue a failed or cancelled job again under the same id; returns the job or None."""
+        if self._write(conn, requeue_job, company_id, job_id):
+            self._wake()
+            self._changed(conn, job_id)
+        return get(conn, company_id, job_id)
+
+    # ---- workers ----
+    def start(self):
+        """Start this process's workers (again after a fork); safe to call repeatedly."""
+        with self._cond:
+            if self._pid == os.getpid() or not self.workers:
+                return
+            self._pid = os.getpid()
+            self._running = set()
+        for i in range(self.workers):
+            threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True).start()
+        threading.Thread(target=self._monitor, name="job-monitor", daemon=True).start()
+
+    def _wake(self):
+        with self._cond:
+            self._cond.notify_all()
+
+    def _claim(self, conn):
+        """Atomically move the oldest runnable job to running; returns it or None."""
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                f"""SELECT {COLUMNS} FROM jobs j WHERE j.state = 'queued'
+                    AND (SELECT COUNT(*) FROM jobs r WHERE r.company_id = j.company_id AND r.state = 'running') < ?
+                    ORDER BY j.id LIMIT 1""",
+                (self.per_company,)
+            ).fetchone()
+            if row is not None:
+                now = _now()
+                conn.execute(
+                    """UPDATE jobs SET state = 'running', attempts = attempts + 1, started_at = ?, heartbeat_at = ?
+                       WHERE id = ?""",
+                    (now, now, row["id"])
+                )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return as_dict(row) if row else None
+
+    def _work(self):
+        conn = dbpool.connect(self.path)
+        while True:
+            try:
+                job = self._claim(conn)
+            except Exception:
+                traceback.print_exc()
+                job = None
+            if job is None:
+                with self._cond:
+                    self._cond.wait(HEARTBEAT_SECONDS)
+                continue
+            with self._cond:
+                self._running.add(job["id"])
+            try:
+                self._run(conn, job)
+            finally:
+                with self._cond:
+                    self._running.discard(job["id"])
+                if self.teardown:
+                    self.teardown()
+            # A finished job may unblock another of the same company
+            self._wake()
+
+    def _run(self, conn, job):
+        self._changed(conn, job["id"])
+        ctx = JobContext(self, conn, job)
+        try:
+            ctx.check()
+            result = self._handlers[job["kind"]](ctx)
+            state, values = "done", {"result": json.dumps(result, default=str), "progress": 1}
+        except JobCancelled:
+            state, values = "cancelled", {}
+        except Exception as e:
+            traceback.print_exc()
+            state, values = "failed", {"error": str(e) or type(e).__name__}
+        if conn.in_transaction:
+            conn.rollback()
+        sets = ", ".join(f"{k} = ?" for k in values)
+        conn.execute(
+            f"UPDATE jobs SET state = ?, finished_at = ?{', ' + sets if sets else ''} WHERE id = ?",
+            (state, _now(), *values.values(), job["id"])
+        )
+        conn.commit()
+        with self._cond:
+            self._stats[state] += 1
+        self._changed(conn, job["id"])
+
+    def _changed(self, conn, job_id):
+        if not self.on_change:
+            return
+        row = conn.execute(f"SELECT {COLUMNS} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row:
+            try:
+                self.on_change(as_dict(row))
+            except Exception:
+                traceback.print_exc()
+
+    # ---- monitor ----
+    def _monitor(self):
+        conn = dbpool.connect(self.path)
+        last_purge = 0.0
+        while True:
+            try:
+                self._beat(conn)
+                if time.monotonic() - last_purge >= PURGE_INTERVAL:
+                    self.purge(conn)
+                    last_purge = time.monotonic()
+            except Exception:
+                if conn.in_transaction:
+                    conn.rollback()
+                traceback.print_exc()
+            # Picks up jobs queued by other processes
+            self._wake()
+            time.sleep(HEARTBEAT_SECONDS)
+
+    def _beat(self, conn):
+        """Refresh this process's heartbeats and fail running jobs nobody is beating for."""
+        with self._cond:
+            running = list(self._running)
+        now = _now()
+        conn.executemany("UPDATE jobs SET heartbeat_at = ? WHERE id = ?", [(now, i) for i in running])
+        stale = conn.execute(
+            f"""SELECT id FROM jobs WHERE state = 'running'
+                AND heartbeat_at < datetime('now', '-{int(STALE_SECONDS)} seconds')"""
+        ).fetchall()
+        conn.executemany(
+            """UPDATE jobs SET state = 'failed', error = 'worker stopped while running the job', finished_at = ?
+               WHERE id = ? AND state = 'running'""",
+            [(now, r[0]) for r in stale]
+        )
+        conn.commit()
+        with self._cond:
+            self._stats["recovered"] += len(stale)
+        for r in stale:
+            self._changed(conn, r[0])
+
+    def purge(self, conn, days=RETENTION_DAYS):
+        """Delete finished jobs older than `days`, running their kind's cleanup first."""
+        rows = conn.execute(
+            f"""SELECT {COLUMNS} FROM jobs WHERE state IN ('done', 'failed', 'cancelled')
+                AND finished_at < datetime('now', ?)""",
+            (f"-{int(days)} days",)
+        ).fetchall()
+        for job in map(as_dict, rows):
+            cleanup = self._cleanups.get(job["kind"])
+            if cleanup:
+                try:
+                    cleanup(job)
+                except Exception:
+                    traceback.print_exc()
+        conn.executemany("DELETE FROM jobs WHERE id = ?", [(r["id"],) for r in rows])
+        conn.commit()
+        with self._cond:
+            self._stats["purged"] += len(rows)
+        return len(rows)
+
+    def stats(self):
+        with self._cond:
+            return {
+                **self._stats,
+                "workers": self.workers if self._pid == os.getpid() else 0,
+                "per_company": self.per_company,
+                "running_here": len(self._running),
+                "kinds": sorted(self._handlers),
+            }
@@ -0,0 +1,187 @@
+"""
+Sensor Reading Queries
+Keyset-paginated listings and constant-memory exports of sensor readings.
+
+Pages are ordered by (timestamp, id) and continue from an opaque cursor
+holding the last row's key, so every page costs index seeks no matter
+how deep into the history it is (unlike LIMIT/OFFSET). Readings are read
+per sensor of the company off the (sensor_id, timestamp) index and merged
+on that key, so a small tenant never walks other tenants' rows. Exports
+iterate the SQLite cursors in batches and yield encoded chunks, so a
+response of any size is never held in memory.
+"""
+import base64
+import csv
+import heapq
+import io
+import json
+from itertools import islice
+
+from ingest import normalize_timestamp
+
+DEFAULT_LIMIT = 500
+MAX_LIMIT = 5000
+EXPORT_BATCH = 2000
+EXPORT_COLUMNS = ("id", "timestamp", "machine_id", "machine_name", "sensor_id", "sensor_name", "unit", "value")
+PAGE_COLUMNS = ("id", "value", "timestamp", "sensor_id", "sensor_name", "unit", "machine_id", "machine_name")
+
+
+def encode_cursor(timestamp, reading_id):
+    return base64.urlsafe_b64encode(f"{timestamp}|{reading_id}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(value):
+    """(timestamp, id) from a cursor string; raises ValueError if malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(value + "=" * (-len(value) % 4)).decode()
+        timestamp, _, reading_id = raw.rpartition("|")
+        if not timestamp:
+            raise ValueError
+        return timestamp, int(reading_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("invalid cursor") from None
+
+
+def parse_filters(args):
+    """Filters from a query-string mapping; raises ValueError on bad input.
+
+    ?machine_id=3&sensor_id=12&sensor=Temperature&since=2025-01-01&until=2025-02-01
+    `since` is inclusive and `until` exclusive; both accept ISO 8601.
+    """
+    filters = {}
+    for key in ("machine_id", "sensor_id"):
+        if args.get(key):
+            try:
+                filters[key] = int(args.get(key))
+            except ValueError:
+                raise ValueError(f"{key} must be an integer") from None
+    if args.get("sensor"):
+        filters["sensor"] = args.get("sensor")
+    for key in ("since", "until"):
+        if args.get(key):
+            timestamp = normalize_timestamp(args.get(key))
+            if timestamp is None:
+                raise ValueError(f"{key} must be an ISO 8601 timestamp")
+            filters[key] = timestamp
+    return filters
+
+
+def _sensors(conn, company_id, filters):
+    """{sensor_id: (sensor name, unit, machine id, machine name)} of the company matching the filters."""
+    where = ["m.company_id = ?"]
+    params = [company_id]
+    if "machine_id" in filters:
+        where.append("m.id = ?")
+        params.append(filters["machine_id"])
+    if "sensor_id" in filters:
+        where.append("s.id = ?")
+        params.append(filters["sensor_id"])
+    if "sensor" in filters:
+        where.append("s.name = ?")
+        params.append(filters["sensor"])
+    rows = conn.execute(
+        f"""SELECT s.id, s.name, s.unit, m.id, m.name
+            FROM sensors s JOIN machines m ON s.machine_id = m.id
+            WHERE {' AND '.join(where)}""",
+        params
+    ).fetchall()
+    return {r[0]: tuple(r[1:]) for r in rows}
+
+
+def _scan(conn, sensor_ids, filters, after=None, descending=True):
+    """Yield (timestamp, id, value, sensor_id) of the sensors' readings in that key order.
+
+    One index range scan per sensor, merged lazily: a page reads about
+    `limit` rows plus one seek per sensor, and exports hold one pending row
+    per sensor.
+    """
+    where = ["sensor_id = ?"]
+    params = []
+    if "since" in filters:
+        where.append("timestamp >= ?")
+        params.append(filters["since"])
+    if "until" in filters:
+        where.append("timestamp < ?")
+        params.append(filters["until"])
+    if after is not None:
+        where.append(f"(timestamp, id) {'<' if descending else '>'} (?, ?)")
+        params.extend(after)
+    direction = "DESC" if descending else "ASC"
+    sql = f"""SELECT timestamp, id, value, sensor_id FROM sensor_readings
+              WHERE {' AND '.join(where)} ORDER BY timestamp {direction}, id {direction}"""
+    cursors = []
+    for sensor_id in sensor_ids:
+        cur = conn.cursor()
+        # Plain tuples compare by (timestamp, id) themselves, so the merge needs no key function
+        cur.row_factory = None
+        cursors.append(cur.execute(sql, (sensor_id, *params)))
+    try:
+        yield from heapq.merge(*cursors, reverse=descending)
+    finally:
+        # Ends the read transaction even if the client disconnects mid-export
+        for cur in cursors:
+            cur.close()
+
+
+def page(conn, company_id, filters=None, cursor=None, limit=DEFAULT_LIMIT):
+    """One page of readings, newest first.
+
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    filters = filters or {}
+    limit = max(1, min(int(limit or DEFAULT_LIMIT), MAX_LIMIT))
+    after = decode_cursor(cursor) if cursor else None
+    sensors = _sensors(conn, company_id, filters)
+    scan = _scan(conn, sensors, filters, after)
+    try:
+        rows = list(islice(scan, limit + 1))
+    finally:
+        scan.close()
+
+    result = [dict(zip(PAGE_COLUMNS, (r[1], r[2], r[0], r[3], *sensors[r[3]]))) for r in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        last = result[-1]
+        next_cursor = encode_cursor(last["timestamp"], last["id"])
+    return result, next_cursor
+
+
+def iter_rows(conn, company_id, filters=None, batch=EXPORT_BATCH):
+    """Yield batches of row tuples (EXPORT_COLUMNS order), oldest first."""
+    filters = filters or {}
+    sensors = _sensors(conn, company_id, filters)
+    scan = _scan(conn, sensors, filters, descending=False)
+    try:
+        while True:
+            rows = list(islice(scan, batch))
+            if not rows:
+                break
+            yield [
+                (r[1], r[0], meta[2], meta[3], r[3], meta[0], meta[1], r[2])
+                for r in rows for meta in (sensors[r[3]],)
+            ]
+    finally:
+        scan.close()
+
+
+def export_csv(batches):
+    """Encode row batches as CSV text chunks, header first."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(EXPORT_COLUMNS)
+    for rows in batches:
+        writer.writerows(rows)
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue()
+
+
+def export_ndjson(batches):
+    """Encode row batches as newline-delimited JSON chunks."""
+    for rows in batches:
+        yield "".join(
+            json.dumps(dict(zip(EXPORT_COLUMNS, row)), separators=(",", ":")) + "\n"
+            for row in rows
+        )
@@ -0,0 +1,156 @@
+"""
+Chart Render Pool
+Renders charts in a bounded pool of pre-warmed worker processes so that
+CPU-bound matplotlib work never holds the web worker's GIL.
+
+Callers query the data themselves (visualization.*_data) and submit it with
+a renderer name from visualization.RENDERERS; workers never see a database
+connection. When the queue is deep, requests are rendered at a cheaper
+quality_mode, and past the hard limit they are rejected with RenderPoolBusy.
+"""
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+POOL_SIZE = int(os.environ.get("CHART_POOL_SIZE", min(2, os.cpu_count() or 1)))
+MAX_QUEUE = int(os.environ.get("CHART_POOL_QUEUE", POOL_SIZE * 4))
+RENDER_TIMEOUT = float(os.environ.get("CHART_RENDER_TIMEOUT", 15))
+
+# Cheaper quality used when the pool is saturated
+QUALITY_FALLBACK = {"high": "normal", "normal": "fast", "fast": "fast"}
+
+
+class RenderPoolBusy(Exception):
+    """The pool's queue is full; the caller should retry later."""
+
+
+class RenderTimeout(Exception):
+    """A render did not finish within the timeout."""
+
+
+def _warm_worker():
+    """Import matplotlib and build the font cache once per worker process."""
+    import visualization
+    visualization.oee_gauge_chart(0, quality_mode="fast")
+
+
+def _render(name, quality_mode, data):
+    import visualization
+    return visualization.RENDERERS[name](**data, quality_mode=quality_mode).getvalue()
+
+
+class RenderPool:
+    """Bounded process pool for chart rendering.
+
+    size=0 renders in the calling thread (useful for development and for
+    platforms without working multiprocessing).
+    """
+
+    def __init__(self, size=POOL_SIZE, max_queue=MAX_QUEUE, timeout=RENDER_TIMEOUT):
+        self.size = size
+        self.max_queue = max(max_queue, 1)
+        self.timeout = timeout
+        self._executor = None
+        self._pid = None
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._stats = {
+            "rendered": 0, "inline": 0, "degraded": 0, "rejected": 0,
+            "timeouts": 0, "restarts": 0, "render_ms_total": 0.0,
+        }
+
+    def _get_executor(self):
+        # Executors do not survive fork, so each gunicorn worker builds its own
+        if self._executor is None or self._pid != os.getpid():
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.size,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_warm_worker
+            )
+            self._pid = os.getpid()
+            for _ in range(self.size):
+                self._executor.submit(int)  # start workers now rather than on the first chart
+        return self._executor
+
+    def render(self, name, quality_mode="normal", **data):
+        """Render chart `name` from `data`; returns (png_bytes, quality_mode_used).
+
+        Raises RenderPoolBusy when the queue is past twice its limit and
+        RenderTimeout when the render takes longer than the timeout.
+        """
+        if not self.size:
+            started = time.perf_counter()
+            png = _render(name, quality_mode, data)
+            self._record("inline", started)
+            return png, quality_mode
+
+        with self._lock:
+            if self._pending >= 2 * self.max_queue:
+                self._stats["rejected"] += 1
+                raise RenderPoolBusy(f"{self._pending} charts queued")
+            if self._pending >= self.max_queue:
+                degraded = QUALITY_FALLBACK.get(quality_mode, "fast")
+                if degraded != quality_mode:
+                    self._stats["degraded"] += 1
+                    quality_mode = degraded
+            self._pending += 1
+            executor = self._get_executor()
+
+        started = time.perf_counter()
+        try:
+            future = executor.submit(_render, name, quality_mode, data)
+        except Exception:
+            self._finished(None)
+            raise
+        # A timed-out render keeps its worker busy, so it stays counted until it ends
+        future.add_done_callback(self._finished)
+        try:
+            png = future.result(timeout=self.timeout)
+        except TimeoutError:
+            future.cancel()
+            with self._lock:
+                self._stats["timeouts"] += 1
+            raise RenderTimeout(f"{name} chart took longer than {self.timeout}s")
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM-killed): rebuild the pool, render this one here
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = None
+                    self._stats["restarts"] += 1
+            png = _render(name, quality_mode, data)
+            self._record("inline", started)
+            return png, quality_mode
+
+        self._record("rendered", started)
+        return png, quality_mode
+
+    def _finished(self, future):
+        with self._lock:
+            self._pending -= 1
+
+    def _record(self, counter, started):
+        with self._lock:
+            self._stats[counter] += 1
+            self._stats["render_ms_total"] += (time.perf_counter() - started) * 1000
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None and self._pid == os.getpid():
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        with self._lock:
+            done = self._stats["rendered"] + self._stats["inline"]
+            stats = {k: v for k, v in self._stats.items() if k != "render_ms_total"}
+            return {
+                **stats,
+                "size": self.size,
+                "max_queue": self.max_queue,
+                "timeout_seconds": self.timeout,
+                "pending": self._pending,
+                "avg_render_ms": round(self._stats["render_ms_total"] / done, 1) if done else 0.0,
+            }
@@ -0,0 +1,397 @@
+"""
+Sensor Reading Rollups
+Hourly, daily and hour-of-day aggregates of sensor_readings, plus lifetime
+per-sensor statistics, kept up to date incrementally so dashboards never have
+to scan raw history.
+
+Each rollup row stores count, sum, min, max and sum of squares for one sensor
+and one bucket, which is enough to derive averages and standard deviations.
+sensor_stats holds one row per sensor (count, sum, min, max, last value).
+
+Usage:
+    python rollups.py rebuild [db_path]
+    python rollups.py check [db_path]
+"""
+import sqlite3
+import sys
+
+DB = "imcs.db"
+
+# Bucket expressions shared by incremental updates and full rebuilds
+HOUR_BUCKET = "strftime('%Y-%m-%d %H:00:00', {col})"
+DAY_BUCKET = "DATE({col})"
+HOUR_OF_DAY = "strftime('%H', {col})"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sensor_rollup_hourly (
+    sensor_id INTEGER NOT NULL,
+    bucket TEXT NOT NULL,
+    reading_count INTEGER NOT NULL,
+    value_sum REAL NOT NULL,
+    value_min REAL,
+    value_max REAL,
+    value_sum_sq REAL NOT NULL,
+    PRIMARY KEY (sensor_id, bucket)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS sensor_rollup_daily (
+    sensor_id INTEGER NOT NULL,
+    bucket TEXT NOT NULL,
+    reading_count INTEGER NOT NULL,
+    value_sum REAL NOT NULL,
+    value_min REAL,
+    value_max REAL,
+    value_sum_sq REAL NOT NULL,
+    PRIMARY KEY (sensor_id, bucket)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS sensor_rollup_hour_of_day (
+    sensor_id INTEGER NOT NULL,
+    hour TEXT NOT NULL,
+    reading_count INTEGER NOT NULL,
+    value_sum REAL NOT NULL,
+    value_sum_sq REAL NOT NULL,
+    PRIMARY KEY (sensor_id, hour)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS sensor_stats (
+    sensor_id INTEGER PRIMARY KEY,
+    reading_count INTEGER NOT NULL,
+    value_sum REAL NOT NULL,
+    value_min REAL,
+    value_max REAL,
+    last_value REAL,
+    last_timestamp TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_rollup_hourly_bucket ON sensor_rollup_hourly(bucket);
+CREATE INDEX IF NOT EXISTS idx_rollup_daily_bucket ON sensor_rollup_daily(bucket);
+CREATE INDEX IF NOT EXISTS idx_sensor_readings_sensor_ts ON sensor_readings(sensor_id, timestamp);
+"""
+
+_STAGING = "temp.rollup_staging"
+# Hourly partial aggregates of a bulk-loaded id range (see record_range)
+_PARTIAL = "temp.rollup_partial"
+
+# Aggregates over raw readings, and the same merged from _PARTIAL rows
+_RAW = {"bucket": "timestamp", "count": "COUNT(*)", "sum": "SUM(value)", "min": "MIN(value)",
+        "max": "MAX(value)", "sum_sq": "SUM(value * value)", "last": "value", "last_ts": "MAX(timestamp)"}
+_MERGED = {"bucket": "bucket", "count": "SUM(reading_count)", "sum": "SUM(value_sum)", "min": "MIN(value_min)",
+           "max": "MAX(value_max)", "sum_sq": "SUM(value_sum_sq)", "last": "last_value",
+           "last_ts": "MAX(last_timestamp)"}
+
+
+def _upsert_bucketed(table, bucket_expr, source, where="1", agg=_RAW):
+    """INSERT ... SELECT that merges aggregated rows into a min/max rollup table."""
+    bucket = bucket_expr.format(col=agg["bucket"])
+    return f"""
+        INSERT INTO {table} (sensor_id, bucket, reading_count, value_sum, value_min, value_max, value_sum_sq)
+        SELECT sensor_id, {bucket}, {agg["count"]}, {agg["sum"]}, {agg["min"]}, {agg["max"]}, {agg["sum_sq"]}
+        FROM {source}
+        WHERE {where}
+        GROUP BY sensor_id, {bucket}
+        ON CONFLICT(sensor_id, bucket) DO UPDATE SET
+            reading_count = reading_count + excluded.reading_count,
+            value_sum = value_sum + excluded.value_sum,
+            value_min = MIN(value_min, excluded.value_min),
+            value_max = MAX(value_max, excluded.value_max),
+            value_sum_sq = value_sum_sq + excluded.value_sum_sq
+    """
+
+
+def _upsert_hour_of_day(source, where="1", agg=_RAW):
+    hour = HOUR_OF_DAY.format(col=agg["bucket"])
+    return f"""
+        INSERT INTO sensor_rollup_hour_of_day (sensor_id, hour, reading_count, value_sum, value_sum_sq)
+        SELECT sensor_id, {hour}, {agg["count"]}, {agg["sum"]}, {agg["sum_sq"]}
+        FROM {source}
+        WHERE {where}
+        GROUP BY sensor_id, {hour}
+        ON CONFLICT(sensor_id, hour) DO UPDATE SET
+            reading_count = reading_count + excluded.reading_count,
+            value_sum = value_sum + excluded.value_sum,
+            value_sum_sq = value_sum_sq + excluded.value_sum_sq
+    """
+
+
+def _upsert_stats(source, where="1", agg=_RAW):
+    """INSERT ... SELECT that merges per-sensor lifetime statistics."""
+    # The bare `value` column comes from the row holding MAX(timestamp)
+    return f"""
+        INSERT INTO sensor_stats (sensor_id, reading_count, value_sum, value_min, value_max,
+                                  last_value, last_timestamp)
+        SELECT a.sensor_id, a.cnt, a.total, a.lo, a.hi, l.value, l.ts
+        FROM (SELECT sensor_id, {agg["count"]} AS cnt, {agg["sum"]} AS total,
+                     {agg["min"]} AS lo, {agg["max"]} AS hi
+              FROM {source} WHERE {where} GROUP BY sensor_id) a
+        JOIN (SELECT sensor_id, {agg["last"]} AS value, {agg["last_ts"]} AS ts
+              FROM {source} WHERE {where} GROUP BY sensor_id) l ON l.sensor_id = a.sensor_id
+        WHERE 1
+        ON CONFLICT(sensor_id) DO UPDATE SET
+            reading_count = reading_count + excluded.reading_count,
+            value_sum = value_sum + excluded.value_sum,
+            value_min = MIN(COALESCE(value_min, excluded.value_min), excluded.value_min),
+            value_max = MAX(COALESCE(value_max, excluded.value_max), excluded.value_max),
+            last_value = CASE WHEN last_timestamp IS NULL OR excluded.last_timestamp >= last_timestamp
+                              THEN excluded.last_value ELSE last_value END,
+            last_timestamp = MAX(COALESCE(last_timestamp, excluded.last_timestamp), excluded.last_timestamp)
+    """
+
+
+def ensure_schema(conn):
+    """Create rollup tables if missing and backfill them once from raw readings."""
+    has_readings = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='sensor_readings'"
+    ).fetchone()
+    if not has_readings:
+        return
+    conn.executescript(SCHEMA)
+    if conn.execute("SELECT 1 FROM sensor_readings LIMIT 1").fetchone() is None:
+        return
+    if conn.execute("SELECT 1 FROM sensor_rollup_hourly LIMIT 1").fetchone() is None:
+        rebuild(conn)
+        conn.commit()
+    elif conn.execute("SELECT 1 FROM sensor_stats LIMIT 1").fetchone() is None:
+        conn.execute(_upsert_stats("sensor_readings"))
+        conn.commit()
+
+
+def record_readings(conn, rows):
+    """Fold newly inserted readings into the rollups.
+
+    Args:
+        conn: Connection holding the transaction that inserted the readings
+        rows: Iterable of (sensor_id, value, timestamp) tuples
+
+    The caller inserts the raw rows and commits; this only updates rollups.
+    """
+    conn.execute(
+        f"CREATE TABLE IF NOT EXISTS {_STAGING} (sensor_id INTEGER, value REAL, timestamp TEXT)"
+    )
+    conn.executemany(f"INSERT INTO {_STAGING} VALUES (?, ?, ?)", rows)
+    conn.execute(_upsert_bucketed("sensor_rollup_hourly", HOUR_BUCKET, _STAGING))
+    conn.execute(_upsert_bucketed("sensor_rollup_daily", DAY_BUCKET, _STAGING))
+    conn.execute(_upsert_hour_of_day(_STAGING))
+    conn.execute(_upsert_stats(_STAGING))
+    conn.execute(f"DELETE FROM {_STAGING}")
+
+
+def record_range(conn, first_id, last_id):
+    """Fold readings with ids in [first_id, last_id] into the rollups.
+
+    For bulk loads that just inserted a contiguous id range. The readings
+    are grouped once into hourly partials (carrying each bucket's last
+    value), and every rollup is merged from those few rows instead of
+    regrouping the raw readings four times.
+    """
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {_PARTIAL} (
+            sensor_id INTEGER, bucket TEXT, reading_count INTEGER, value_sum REAL, value_min REAL,
+            value_max REAL, value_sum_sq REAL, last_value REAL, last_timestamp TEXT
+        )
+    """)
+    hour = HOUR_BUCKET.format(col="timestamp")
+    conn.execute(f"""
+        INSERT INTO {_PARTIAL}
+        SELECT sensor_id, {hour}, COUNT(*), SUM(value), MIN(value), MAX(value), SUM(value * value),
+               value, MAX(timestamp)
+        FROM sensor_readings
+        WHERE id BETWEEN ? AND ?
+        GROUP BY sensor_id, {hour}
+    """, (first_id, last_id))
+    # Each partial row already is one (sensor, hour): merging it into the hourly table is 1:1
+    conn.execute(_upsert_bucketed("sensor_rollup_hourly", "{col}", _PARTIAL, agg=_MERGED))
+    conn.execute(_upsert_bucketed("sensor_rollup_daily", DAY_BUCKET, _PARTIAL, agg=_MERGED))
+    conn.execute(_upsert_hour_of_day(_PARTIAL, agg=_MERGED))
+    conn.execute(_upsert_stats(_PARTIAL, agg=_MERGED))
+    conn.execute(f"DELETE FROM {_PARTIAL}")
+
+
+def _refresh_bucket(conn, table, bucket_expr, step, sensor_id, timestamp):
+    """Recompute one (sensor, bucket) row of a min/max rollup from raw readings."""
+    bucket = conn.execute(
+        f"SELECT {bucket_expr.format(col='?')}", (timestamp,)
+    ).fetchone()[0]
+    if bucket is None:
+        return
+    conn.execute(f"DELETE FROM {table} WHERE sensor_id = ? AND bucket = ?", (sensor_id, bucket))
+    conn.execute(
+        f"""
+        INSERT INTO {table} (sensor_id, bucket, reading_count, value_sum, value_min, value_max, value_sum_sq)
+        SELECT sensor_id, ?, COUNT(*), SUM(value), MIN(value), MAX(value), SUM(value * value)
+        FROM sensor_readings
+        WHERE sensor_id = ? AND timestamp >= ? AND timestamp < datetime(?, ?)
+        GROUP BY sensor_id
+        """,
+        (bucket, sensor_id, bucket, bucket, step)
+    )
+
+
+def readings_changed(conn, removed=(), added=()):
+    """Bring rollups in line after readings were updated or deleted in place.
+
+    Args:
+        conn: Connection holding the transaction that changed the readings
+        removed: (sensor_id, value, timestamp) rows as they were before the change
+        added: (sensor_id, value, timestamp) rows as they are after the change
+
+    Min/max cannot be retracted, so the affected hourly and daily buckets are
+    recomputed from raw readings (bounded to one sensor and one bucket each),
+    sensor_stats is re-derived from the daily rollups, and the hour-of-day
+    profile is adjusted by delta.
+    """
+    touched = {(r[0], r[2]) for r in list(removed) + list(added)}
+    for sensor_id, timestamp in touched:
+        _refresh_bucket(conn, "sensor_rollup_hourly", HOUR_BUCKET, "+1 hour", sensor_id, timestamp)
+        _refresh_bucket(conn, "sensor_rollup_daily", DAY_BUCKET, "+1 day", sensor_id, timestamp)
+    for sensor_id in {t[0] for t in touched}:
+        _refresh_sensor_stats(conn, sensor_id)
+
+    deltas = [(r[0], r[2], -1, -r[1], -r[1] * r[1]) for r in removed]
+    deltas += [(r[0], r[2], 1, r[1], r[1] * r[1]) for r in added]
+    hour = HOUR_OF_DAY.format(col="?")
+    for sensor_id, timestamp, count, value, value_sq in deltas:
+        conn.execute(
+            f"""
+            INSERT INTO sensor_rollup_hour_of_day (sensor_id, hour, reading_count, value_sum, value_sum_sq)
+            VALUES (?, {hour}, ?, ?, ?)
+            ON CONFLICT(sensor_id, hour) DO UPDATE SET
+                reading_count = reading_count + excluded.reading_count,
+                value_sum = value_sum + excluded.value_sum,
+                value_sum_sq = value_sum_sq + excluded.value_sum_sq
+            """,
+            (sensor_id, timestamp, count, value, value_sq)
+        )
+    conn.execute("DELETE FROM sensor_rollup_hour_of_day WHERE reading_count <= 0")
+
+
+def _refresh_sensor_stats(conn, sensor_id):
+    """Re-derive one sensor_stats row from its daily rollups and latest raw reading."""
+    conn.execute("DELETE FROM sensor_stats WHERE sensor_id = ?", (sensor_id,))
+    conn.execute("""
+        INSERT INTO sensor_stats (sensor_id, reading_count, value_sum, value_min, value_max,
+                                  last_value, last_timestamp)
+        SELECT d.sensor_id, SUM(d.reading_count), SUM(d.value_sum), MIN(d.value_min), MAX(d.value_max),
+               l.value, l.timestamp
+        FROM sensor_rollup_daily d
+        JOIN (SELECT value, timestamp FROM sensor_readings
+              WHERE sensor_id = ? ORDER BY timestamp DESC, id DESC LIMIT 1) l
+        WHERE d.sensor_id = ?
+        GROUP BY d.sensor_id
+    """, (sensor_id, sensor_id))
+
+
+def purge_company(conn, company_id):
+    """Drop all rollups for a company's sensors (call before deleting the sensors)."""
+    sensor_ids = """
+        SELECT s.id FROM sensors s JOIN machines m ON s.machine_id = m.id
+        WHERE m.company_id = ?
+    """
+    for table in ("sensor_rollup_hourly", "sensor_rollup_daily", "sensor_rollup_hour_of_day",
+                  "sensor_stats"):
+        conn.execute(f"DELETE FROM {table} WHERE sensor_id IN ({sensor_ids})", (company_id,))
+
+
+def rebuild(conn, sensor_ids=None):
+    """Recompute rollups from raw readings (all sensors, or just `sensor_ids`).
+
+    Used for backfills after bulk loads or when rollups are suspected stale.
+    """
+    tables = ("sensor_rollup_hourly", "sensor_rollup_daily", "sensor_rollup_hour_of_day",
+              "sensor_stats")
+    if sensor_ids is None:
+        where, params = "1", ()
+    else:
+        sensor_ids = list(sensor_ids)
+        if not sensor_ids:
+            return
+        where = f"sensor_id IN ({','.join('?' * len(sensor_ids))})"
+        params = tuple(sensor_ids)
+
+    for table in tables:
+        conn.execute(f"DELETE FROM {table} WHERE {where}", params)
+    conn.execute(_upsert_bucketed("sensor_rollup_hourly", HOUR_BUCKET, "sensor_readings", where), params)
+    conn.execute(_upsert_bucketed("sensor_rollup_daily", DAY_BUCKET, "sensor_readings", where), params)
+    conn.execute(_upsert_hour_of_day("sensor_readings", where), params)
+    conn.execute(_upsert_stats("sensor_readings", where), params + params)
+
+
+def _close(a, b, tolerance=1e-6):
+    if a is None or b is None:
+        return a == b
+    if isinstance(a, str) or isinstance(b, str):
+        return a == b
+    return abs(a - b) <= tolerance * max(1.0, abs(a), abs(b))
+
+
+def check(conn):
+    """Recompute sensor_stats from raw readings and diff against the stored rows.
+
+    Returns a list of mismatches: {"sensor_id", "field", "stored", "expected"}.
+    last_value is only compared when the latest timestamp is unique.
+    """
+    expected = {
+        r[0]: r for r in conn.execute("""
+            SELECT a.sensor_id, a.cnt, a.total, a.lo, a.hi, r.value, r.timestamp,
+                   (SELECT COUNT(*) FROM sensor_readings t
+                    WHERE t.sensor_id = a.sensor_id AND t.timestamp = r.timestamp) AS ties
+            FROM (SELECT sensor_id, COUNT(*) AS cnt, SUM(value) AS total,
+                         MIN(value) AS lo, MAX(value) AS hi
+                  FROM sensor_readings GROUP BY sensor_id) a
+            JOIN sensor_readings r ON r.id = (
+                SELECT id FROM sensor_readings t WHERE t.sensor_id = a.sensor_id
+                ORDER BY t.timestamp DESC, t.id DESC LIMIT 1)
+        """)
+    }
+    stored = {
+        r[0]: r for r in conn.execute("""
+            SELECT sensor_id, reading_count, value_sum, value_min, value_max, last_value, last_timestamp
+            FROM sensor_stats
+        """)
+    }
+    fields = ("reading_count", "value_sum", "value_min", "value_max", "last_value", "last_timestamp")
+    mismatches = []
+    for sensor_id in sorted(set(expected) | set(stored)):
+        want = expected.get(sensor_id)
+        have = stored.get(sensor_id)
+        if want is None or have is None:
+            mismatches.append({"sensor_id": sensor_id, "field": "row",
+                               "stored": have is not None, "expected": want is not None})
+            continue
+        for i, field in enumerate(fields, start=1):
+            if field == "last_value" and want[7] > 1:
+                continue
+            if not _close(have[i], want[i]):
+                mismatches.append({"sensor_id": sensor_id, "field": field,
+                                   "stored": have[i], "expected": want[i]})
+    return mismatches
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "rebuild"
+    db_path = sys.argv[2] if len(sys.argv) > 2 else DB
+
+    conn = sqlite3.connect(db_path)
+    try:
+        if command == "rebuild":
+            conn.executescript(SCHEMA)
+            rebuild(conn)
+            conn.commit()
+            hourly = conn.execute("SELECT COUNT(*) FROM sensor_rollup_hourly").fetchone()[0]
+            daily = conn.execute("SELECT COUNT(*) FROM sensor_rollup_daily").fetchone()[0]
+            sensors = conn.execute("SELECT COUNT(*) FROM sensor_stats").fetchone()[0]
+            print(f"Rebuilt rollups: {hourly} hourly rows, {daily} daily rows, {sensors} sensor stats")
+        elif command == "check":
+            mismatches = check(conn)
+            for m in mismatches[:50]:
+                print(f"sensor {m['sensor_id']}: {m['field']} stored={m['stored']} expected={m['expected']}")
+            if mismatches:
+                print(f"{len(mismatches)} mismatches - run 'python rollups.py rebuild' to repair")
+                sys.exit(2)
+            print("sensor_stats consistent with raw readings")
+        else:
+            print(f"Unknown command: {command}")
+            print(__doc__)
+            sys.exit(1)
+    finally:
+        conn.close()
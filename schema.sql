@@ -61,6 +61,50 @@ CREATE TABLE sensor_readings (
     FOREIGN KEY(sensor_id) REFERENCES sensors(id)
 );
 
+-- ---- SENSOR ROLLUPS (Pre-aggregated Time Series) ----
+-- Maintained incrementally by rollups.py; rebuild with `python rollups.py rebuild`
+CREATE TABLE sensor_rollup_hourly (
+    sensor_id INTEGER NOT NULL,
+    bucket TEXT NOT NULL,
+    reading_count INTEGER NOT NULL,
+    value_sum REAL NOT NULL,
+    value_min REAL,
+    value_max REAL,
+    value_sum_sq REAL NOT NULL,
+    PRIMARY KEY (sensor_id, bucket)
+) WITHOUT ROWID;
+
+CREATE TABLE sensor_rollup_daily (
+    sensor_id INTEGER NOT NULL,
+    bucket TEXT NOT NULL,
+    reading_count INTEGER NOT NULL,
+    value_sum REAL NOT NULL,
+    value_min REAL,
+    value_max REAL,
+    value_sum_sq REAL NOT NULL,
+    PRIMARY KEY (sensor_id, bucket)
+) WITHOUT ROWID;
+
+CREATE TABLE sensor_rollup_hour_of_day (
+    sensor_id INTEGER NOT NULL,
+    hour TEXT NOT NULL,
+    reading_count INTEGER NOT NULL,
+    value_sum REAL NOT NULL,
+    value_sum_sq REAL NOT NULL,
+    PRIMARY KEY (sensor_id, hour)
+) WITHOUT ROWID;
+
+-- Lifetime per-sensor statistics; verify with `python rollups.py check`
+CREATE TABLE sensor_stats (
+    sensor_id INTEGER PRIMARY KEY,
+    reading_count INTEGER NOT NULL,
+    value_sum REAL NOT NULL,
+    value_min REAL,
+    value_max REAL,
+    last_value REAL,
+    last_timestamp TEXT
+);
+
 -- ---- ALARMS (Alerts & Notifications) ----
 CREATE TABLE alarms (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -74,6 +118,12 @@ CREATE TABLE alarms (
     comment TEXT,
     company_id INTEGER NOT NULL,
     created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    sensor_id INTEGER,
+    rule_key TEXT,
+    value REAL,
+    cleared_at TEXT,
+    occurrences INTEGER NOT NULL DEFAULT 1,
+    last_seen_at TEXT,
     FOREIGN KEY(machine_id) REFERENCES machines(id),
     FOREIGN KEY(company_id) REFERENCES companies(id)
 );
@@ -101,21 +151,96 @@ CREATE TABLE audit_log (
     action TEXT NOT NULL,
     entity TEXT NOT NULL,
     entity_id INTEGER,
-    timestamp TEXT DEFAULT CURRENT_TIMESTAMP
+    timestamp TEXT DEFAULT CURRENT_TIMESTAMP,
+    company_id INTEGER
+);
+
+-- ---- DATA VERSIONS (Response cache invalidation) ----
+CREATE TABLE data_versions (
+    company_id INTEGER NOT NULL,
+    tag TEXT NOT NULL,
+    version INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (company_id, tag)
+) WITHOUT ROWID;
+
+-- ---- DATASETS (Uploaded dataset catalogue) ----
+CREATE TABLE datasets (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    company_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    columns TEXT NOT NULL,
+    row_count INTEGER NOT NULL,
+    size_bytes INTEGER NOT NULL,
+    storage TEXT NOT NULL,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    last_used_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY(company_id) REFERENCES companies(id),
+    UNIQUE(company_id, content_hash)
+);
+
+CREATE TABLE alarm_rules (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    company_id INTEGER NOT NULL,
+    sensor_id INTEGER NOT NULL,
+    kind TEXT CHECK(kind IN ('threshold','rate')) NOT NULL,
+    low REAL,
+    high REAL,
+    hysteresis REAL NOT NULL DEFAULT 0,
+    trip_count INTEGER NOT NULL DEFAULT 1,
+    trip_window INTEGER NOT NULL DEFAULT 1,
+    severity TEXT CHECK(severity IN ('info','warning','critical')) NOT NULL DEFAULT 'warning',
+    enabled INTEGER NOT NULL DEFAULT 1,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY(company_id) REFERENCES companies(id),
+    FOREIGN KEY(sensor_id) REFERENCES sensors(id)
+);
+
+CREATE TABLE jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    company_id INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    params TEXT NOT NULL DEFAULT '{}',
+    state TEXT NOT NULL DEFAULT 'queued',
+    progress REAL NOT NULL DEFAULT 0,
+    message TEXT,
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    created_by TEXT,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    started_at TEXT,
+    finished_at TEXT,
+    heartbeat_at TEXT,
+    FOREIGN KEY(company_id) REFERENCES companies(id)
 );
 
 -- ---- INDEXES (Performance Optimization) ----
 CREATE INDEX IF NOT EXISTS idx_users_login_id ON users(login_id);
 CREATE INDEX IF NOT EXISTS idx_users_company_id ON users(company_id);
 CREATE INDEX IF NOT EXISTS idx_machines_company_id ON machines(company_id);
+CREATE INDEX IF NOT EXISTS idx_machines_company_status ON machines(company_id, status);
+CREATE INDEX IF NOT EXISTS idx_machines_company_location ON machines(company_id, location);
 CREATE INDEX IF NOT EXISTS idx_sensors_machine_id ON sensors(machine_id);
 CREATE INDEX IF NOT EXISTS idx_sensor_readings_sensor_id ON sensor_readings(sensor_id);
 CREATE INDEX IF NOT EXISTS idx_sensor_readings_timestamp ON sensor_readings(timestamp);
+CREATE INDEX IF NOT EXISTS idx_sensor_readings_sensor_ts ON sensor_readings(sensor_id, timestamp);
+CREATE INDEX IF NOT EXISTS idx_rollup_hourly_bucket ON sensor_rollup_hourly(bucket);
+CREATE INDEX IF NOT EXISTS idx_rollup_daily_bucket ON sensor_rollup_daily(bucket);
 CREATE INDEX IF NOT EXISTS idx_alarms_company_id ON alarms(company_id);
 CREATE INDEX IF NOT EXISTS idx_alarms_machine_id ON alarms(machine_id);
 CREATE INDEX IF NOT EXISTS idx_alarms_raised_at ON alarms(raised_at);
+CREATE INDEX IF NOT EXISTS idx_alarms_rule_active ON alarms(company_id, rule_key) WHERE cleared_at IS NULL;
+CREATE INDEX IF NOT EXISTS idx_alarms_coalesce ON alarms(company_id, machine_id, message) WHERE acknowledged = 0;
+CREATE INDEX IF NOT EXISTS idx_alarm_rules_company ON alarm_rules(company_id);
 CREATE INDEX IF NOT EXISTS idx_maintenance_company_id ON maintenance_tasks(company_id);
 CREATE INDEX IF NOT EXISTS idx_maintenance_machine_id ON maintenance_tasks(machine_id);
 CREATE INDEX IF NOT EXISTS idx_maintenance_status ON maintenance_tasks(status);
 CREATE INDEX IF NOT EXISTS idx_audit_log_timestamp ON audit_log(timestamp);
 CREATE INDEX IF NOT EXISTS idx_audit_log_user ON audit_log(user);
+CREATE INDEX IF NOT EXISTS idx_audit_log_company ON audit_log(company_id, id);
+CREATE INDEX IF NOT EXISTS idx_audit_log_entity ON audit_log(company_id, entity, entity_id);
+CREATE INDEX IF NOT EXISTS idx_datasets_company_used ON datasets(company_id, last_used_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_state_company ON jobs(state, company_id);
+CREATE INDEX IF NOT EXISTS idx_jobs_company_created ON jobs(company_id, created_at);
@@ -14,6 +14,9 @@
       return fetch(url, opts).then(r=> r.ok? r.json(): null).catch(()=>null);
     }
     function escapeHtml(s){ if(s==null) return ''; return String(s).replace(/[&<>"']/g,c=>({'&':'&amp;','<':'&lt;','>':'&gt;','"':'&quot;',"'":'&#39;'}[c])); }
+    // Coalesced alarms: occurrence count and last time seen
+    function repeats(a){ return a.occurrences > 1 ? ` <span class="muted small">×${a.occurrences}</span>` : ''; }
+    function lastSeen(a){ return a.occurrences > 1 && a.last_seen_at ? ` → ${escapeHtml(a.last_seen_at)}` : ''; }
   
     function renderTable(list){
       if(!TABLE_BODY) return;
@@ -28,8 +31,8 @@
         tr.innerHTML = `<td>${a.id}</td>
                         <td>${escapeHtml(a.machine||'—')}</td>
                         <td>${escapeHtml(a.severity||'—')}</td>
-                        <td>${escapeHtml(a.message||'—')}</td>
-                        <td>${escapeHtml(a.raised_at||'—')}</td>
+                        <td>${escapeHtml(a.message||'—')}${repeats(a)}</td>
+                        <td>${escapeHtml(a.raised_at||'—')}${lastSeen(a)}</td>
                         <td><button class="btn ack-btn" data-id="${a.id}">Ack</button></td>`;
         frag.appendChild(tr);
       });
@@ -56,11 +59,23 @@
       list.slice(0,10).forEach(a=>{
         const d = document.createElement('div');
         d.className = 'alert-row';
-        d.innerHTML = `<strong>${escapeHtml(a.machine||'—')}</strong> — ${escapeHtml(a.message||'—')} <div class="muted small">${escapeHtml(a.raised_at||'')}</div>`;
+        d.innerHTML = `<strong>${escapeHtml(a.machine||'—')}</strong> — ${escapeHtml(a.message||'—')}${repeats(a)} <div class="muted small">${escapeHtml(a.raised_at||'')}${lastSeen(a)}</div>`;
         LIST_DIV.appendChild(d);
       });
     }
   
+    // Acknowledge every listed alert in one request
+    async function ackAll(){
+      const rows = document.querySelectorAll('.ack-btn');
+      const ids = Array.from(rows, b => Number(b.getAttribute('data-id')));
+      if(!ids.length) return;
+      rows.forEach(b => b.disabled = true);
+      await fetch('/api/alerts/ack', {
+        method:'POST', headers:{'Content-Type':'application/json'}, body: JSON.stringify({ids})
+      }).catch(()=>null);
+      load();
+    }
+  
     async function load(){
       const cached = safeGet('pj_alerts');
       if(cached){
@@ -79,6 +94,10 @@
       renderList(data);
     }
   
-    document.addEventListener('DOMContentLoaded', load);
+    document.addEventListener('DOMContentLoaded', ()=>{
+      const btn = document.getElementById('ackAllBtn');
+      if(btn) btn.addEventListener('click', ackAll);
+      load();
+    });
   })();
   
\ No newline at end of file
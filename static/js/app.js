@@ -130,11 +130,111 @@
       }
     }
 
+    // Background jobs: long operations answer 202 with a job id (/api/jobs/<id>)
+    const JOB_FINAL = ["done", "failed", "cancelled"];
+
+    // Poll a job until it finishes; resolves with the job, onProgress(job) on every poll
+    async function waitForJob(jobId, onProgress) {
+      for (;;) {
+        const res = await fetch(`/api/jobs/${jobId}`, { cache: "no-store" });
+        if (!res.ok) throw new Error(`Job ${jobId} not found`);
+        const job = await res.json();
+        if (onProgress) onProgress(job);
+        if (JOB_FINAL.includes(job.state)) return job;
+        await new Promise(resolve => setTimeout(resolve, 1000));
+      }
+    }
+
+    // JSON body of a response; a 202 job is awaited and its result returned instead
+    async function resultOf(response, onProgress) {
+      const body = await response.json();
+      if (response.status !== 202 || !body.job_id) return body;
+      const job = await waitForJob(body.job_id, onProgress);
+      if (job.state !== "done") return { error: job.error || `Job ${job.state}` };
+      const res = await fetch(body.result_url, { cache: "no-store" });
+      return res.json();
+    }
+
+    // Live updates: one shared EventSource per page (/api/stream).
+    // Pages register handlers per event type; registered polling functions
+    // only run while the stream is unavailable.
+    const live = { source: null, handlers: {}, fallbacks: [], timers: [] };
+
+    function liveDispatch(type, data) {
+      (live.handlers[type] || []).forEach(h => {
+        try { h(data, type); } catch (e) { console.error("live handler", type, e); }
+      });
+    }
+
+    function liveListen(src, type) {
+      src.addEventListener(type, ev => {
+        let data = {};
+        try { data = JSON.parse(ev.data || "{}"); } catch (e) { /* ignore bad payload */ }
+        liveDispatch(type, data);
+      });
+    }
+
+    function startFallbackPolling() {
+      if (live.timers.length) return;
+      live.timers = live.fallbacks.map(([fn, ms]) => setInterval(fn, ms));
+    }
+
+    function stopFallbackPolling() {
+      live.timers.forEach(clearInterval);
+      live.timers = [];
+    }
+
+    function liveConnect() {
+      if (live.source) return;
+      if (!window.EventSource) { startFallbackPolling(); return; }
+      const src = live.source = new EventSource("/api/stream");
+      Object.keys(live.handlers).forEach(type => liveListen(src, type));
+      src.onopen = stopFallbackPolling;
+      src.onerror = () => {
+        // CONNECTING means the browser is retrying by itself (with Last-Event-ID)
+        if (src.readyState !== EventSource.CLOSED) return;
+        live.source = null;
+        startFallbackPolling();
+        setTimeout(liveConnect, 30000);
+      };
+    }
+
+    // onLive("alarm.raised alarm.acknowledged", handler, debounceMs)
+    function onLive(types, handler, debounceMs) {
+      let fn = handler;
+      if (debounceMs) {
+        let timer = null;
+        fn = (data, type) => {
+          clearTimeout(timer);
+          timer = setTimeout(() => handler(data, type), debounceMs);
+        };
+      }
+      types.split(/\s+/).filter(Boolean).forEach(type => {
+        if (!live.handlers[type]) {
+          live.handlers[type] = [];
+          if (live.source) liveListen(live.source, type);
+        }
+        live.handlers[type].push(fn);
+      });
+      liveConnect();
+    }
+
+    // Poll with fn every ms, but only while the live stream is down
+    function pollWhenOffline(fn, ms) {
+      live.fallbacks.push([fn, ms]);
+      if (live.timers.length) live.timers.push(setInterval(fn, ms));
+      liveConnect();
+    }
+
     // Expose a tiny API for pages
     window.__sapApp = window.__sapApp || {};
+    window.__sapApp.onLive = onLive;
+    window.__sapApp.pollWhenOffline = pollWhenOffline;
     window.__sapApp.applyTheme = applyTheme;
     window.__sapApp.readTheme = readTheme;
     window.__sapApp.fetchJsonLow = fetchJsonLow;
+    window.__sapApp.waitForJob = waitForJob;
+    window.__sapApp.resultOf = resultOf;
     window.__sapApp.toggleSidebar = toggleSidebar;
     window.__sapApp.applySidebarCollapsed = applySidebarCollapsed;
 
@@ -114,7 +114,7 @@
           body: formData
         });
 
-        const result = await response.json();
+        const result = await (window.__sapApp?.resultOf ? window.__sapApp.resultOf(response) : response.json());
         
         if (result.success) {
           // Store in IndexedDB
@@ -114,8 +114,14 @@
 
   // Start live updates
   function startLiveUpdates() {
-    // Update every 30 seconds
-    updateInterval = setInterval(updateCharts, 30000);
+    // Refresh on live events; poll every 30 seconds only while the stream is down
+    const sap = window.__sapApp || {};
+    if (sap.onLive) {
+      sap.onLive('kpis alarm.raised alarm.cleared alarm.acknowledged resync', updateCharts, 2000);
+      sap.pollWhenOffline(updateCharts, 30000);
+    } else {
+      updateInterval = setInterval(updateCharts, 30000);
+    }
     
     // Add live indicator
     const header = document.querySelector('.app-header .hdr-title');
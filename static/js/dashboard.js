@@ -283,8 +283,8 @@
           const node = document.createElement('div');
           node.className = 'alert-row';
           node.innerHTML = `<div class="alert-left"><strong>${escapeHtml(a.machine||'—')}</strong> <span class="muted tiny">[${escapeHtml(a.severity||'')}]</span></div>
-                            <div class="alert-right">${escapeHtml(a.message)}</div>
-                            <div class="muted tiny">${escapeHtml(a.raised_at||'')}</div>`;
+                            <div class="alert-right">${escapeHtml(a.message)}${a.occurrences > 1 ? ` <span class="muted tiny">×${a.occurrences}</span>` : ''}</div>
+                            <div class="muted tiny">${escapeHtml(a.raised_at||'')}${a.occurrences > 1 && a.last_seen_at ? ` → ${escapeHtml(a.last_seen_at)}` : ''}</div>`;
           targets.alertsList.appendChild(node);
         });
   
@@ -456,8 +456,28 @@
       } catch (e) {}
       // initial refresh
       refreshAll();
-      // periodic background refresh (graceful intervals)
-      setInterval(refreshAll, 60 * 1000); // every 60s
+      // live updates from /api/stream; polling only while the stream is down
+      const sap = window.__sapApp || {};
+      if (sap.onLive) {
+        sap.onLive('kpis', applyKpiDelta);
+        sap.onLive('alarm.raised alarm.cleared alarm.acknowledged', loadAlerts, 500);
+        sap.onLive('machine.created machine.updated', loadMachines, 500);
+        sap.onLive('maintenance.created maintenance.updated', loadMaintenance, 500);
+        sap.onLive('resync', refreshAll, 500);
+        sap.pollWhenOffline(refreshAll, 60 * 1000);
+      } else {
+        setInterval(refreshAll, 60 * 1000); // every 60s
+      }
+    }
+
+    // Merge pushed KPI changes into the cached summary instead of refetching it
+    let kpiTimer = null;
+    function applyKpiDelta(delta) {
+      const summary = Object.assign({}, cacheLoad(CACHE.SUMMARY, Infinity) || {}, delta);
+      cacheSave(CACHE.SUMMARY, summary);
+      // populateSummary also reloads widgets and the summary image, so coalesce bursts
+      clearTimeout(kpiTimer);
+      kpiTimer = setTimeout(() => populateSummary(summary), 1000);
     }
   
     // --- Update dashboard with dataset data ---
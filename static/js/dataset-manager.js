@@ -142,14 +142,20 @@
       let dataset;
       
       if (fileType === 'csv') {
-        dataset = await importCSVDataset(file);
-      } else if (fileType === 'json') {
-        dataset = await importJSONDataset(file);
-      } else {
-        throw new Error('Unsupported file type. Please use CSV or JSON.');
+        // Parsed and kept on the server; falls back to the browser when offline
+        dataset = await uploadCSVDataset(file).catch(() => null);
+      }
+      if (!dataset) {
+        if (fileType === 'csv') {
+          dataset = await importCSVDataset(file);
+        } else if (fileType === 'json') {
+          dataset = await importJSONDataset(file);
+        } else {
+          throw new Error('Unsupported file type. Please use CSV or JSON.');
+        }
+        storeDataset(dataset);
       }
       
-      storeDataset(dataset);
       currentDataset = dataset;
       visualizeDataset(dataset);
       
@@ -161,6 +167,35 @@
     }
   }
 
+  // Server-side catalogue entries are addressed as "server:<id>" in the select
+  function fromServer(entry) {
+    return {
+      id: `server:${entry.id}`,
+      name: entry.name,
+      type: detectDatasetType(entry.columns, entry.rows || []),
+      columns: entry.columns,
+      rows: entry.rows || [],
+      created_at: entry.created_at,
+      metadata: {
+        row_count: entry.row_count,
+        source: 'server',
+        cache_key: entry.cache_key
+      }
+    };
+  }
+
+  async function uploadCSVDataset(file) {
+    const formData = new FormData();
+    formData.append('file', file);
+    const response = await fetch('/api/datasets/upload', { method: 'POST', body: formData });
+    // Large files are converted by a background job
+    const result = await (window.__sapApp?.resultOf ? window.__sapApp.resultOf(response) : response.json());
+    if (!response.ok || !result.dataset) {
+      throw new Error(result.error || 'Upload failed');
+    }
+    return fromServer(result.dataset);
+  }
+
   async function importCSVDataset(file) {
     return new Promise((resolve, reject) => {
       const reader = new FileReader();
@@ -452,6 +487,16 @@
       currentDataset = null;
       return;
     }
+
+    if (datasetId.startsWith('server:')) {
+      const response = await fetch(`/api/datasets/${datasetId.slice(7)}?limit=1000`);
+      if (!response.ok) {
+        throw new Error('Dataset not found');
+      }
+      currentDataset = fromServer(await response.json());
+      visualizeDataset(currentDataset);
+      return currentDataset;
+    }
     
     if (!window.indexedDB) {
       const datasets = JSON.parse(localStorage.getItem('datasets') || '[]');
@@ -494,6 +539,15 @@
     if (!select) return;
     
     let datasets = [];
+    let serverDatasets = [];
+    try {
+      const response = await fetch('/api/datasets');
+      if (response.ok) {
+        serverDatasets = (await response.json()).datasets.map(fromServer);
+      }
+    } catch (e) {
+      // Offline: only the datasets kept in this browser are listed
+    }
     
     if (window.indexedDB) {
       // Load from IndexedDB
@@ -507,19 +561,23 @@
           
           getAllRequest.onsuccess = () => {
             datasets = getAllRequest.result;
-            populateDatasetSelect(datasets);
+            populateDatasetSelect(serverDatasets.concat(datasets));
           };
         } else {
-          populateDatasetSelect([]);
+          populateDatasetSelect(serverDatasets);
         }
       };
     } else {
       // Load from localStorage
       datasets = JSON.parse(localStorage.getItem('datasets') || '[]');
-      populateDatasetSelect(datasets);
+      populateDatasetSelect(serverDatasets.concat(datasets));
     }
   }
 
+  function rowCount(dataset) {
+    return dataset.metadata?.row_count ?? dataset.rows.length;
+  }
+
   function populateDatasetSelect(datasets) {
     const select = document.getElementById('datasetSelect');
     if (!select) return;
@@ -529,7 +587,7 @@
     datasets.forEach(dataset => {
       const option = document.createElement('option');
       option.value = dataset.id;
-      option.textContent = `${dataset.name} (${dataset.type}, ${dataset.rows.length} rows)`;
+      option.textContent = `${dataset.name} (${dataset.type}, ${rowCount(dataset)} rows)`;
       select.appendChild(option);
     });
   }
@@ -617,7 +675,7 @@
     infoEl.innerHTML = `
       <div style="padding: 12px; background: #F5F5F5; border-radius: 4px;">
         <strong>Dataset: ${dataset.name}</strong><br>
-        <span class="muted small">Type: ${dataset.type} | Rows: ${dataset.rows.length} | Columns: ${dataset.columns.length}</span>
+        <span class="muted small">Type: ${dataset.type} | Rows: ${rowCount(dataset)} | Columns: ${dataset.columns.length}</span>
       </div>
     `;
   }
@@ -656,6 +714,7 @@
   window.DatasetManager = {
     createDataset,
     importCSVDataset,
+    uploadCSVDataset,
     importJSONDataset,
     filterDataset,
     transformDataset,
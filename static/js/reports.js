@@ -19,8 +19,14 @@
   
     document.addEventListener('DOMContentLoaded', ()=>{
       refreshCharts();
-      // periodic refresh every 90s
-      setInterval(refreshCharts, 90*1000);
+      // refresh on live events; poll every 90s only while the stream is down
+      const sap = window.__sapApp || {};
+      if (sap.onLive) {
+        sap.onLive('kpis alarm.raised alarm.cleared alarm.acknowledged resync', refreshCharts, 2000);
+        sap.pollWhenOffline(refreshCharts, 90*1000);
+      } else {
+        setInterval(refreshCharts, 90*1000);
+      }
     });
   })();
   
\ No newline at end of file
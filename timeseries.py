@@ -0,0 +1,315 @@
+"""
+Time Series Queries
+Arbitrary time-range queries over sensor readings with any bucket size from
+one minute to one month and a choice of aggregates.
+
+Each query is answered from the coarsest stored resolution that can serve
+it: daily rollups for whole-day buckets, hourly rollups for whole-hour
+buckets, raw readings otherwise (and always for p95/last, which rollups
+cannot reproduce). Rows are re-bucketed and aggregated with NumPy, so the
+cost depends on the rows read rather than on Python loops; raw scans are
+capped so a wide zoom level never walks years of readings.
+
+Buckets are aligned to the bucket size (weeks start on Monday, months on
+the 1st), `from` is rounded down and `to` rounded up to whole buckets, and
+buckets without readings are omitted.
+"""
+import os
+import re
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from ingest import normalize_timestamp
+
+AGGREGATES = ("avg", "min", "max", "count", "p95", "last")
+ROLLUP_AGGREGATES = {"avg", "min", "max", "count"}
+GROUPS = ("sensor", "machine", "company")
+
+# Bucket sizes tried (smallest first) when none is requested
+AUTO_BUCKETS = ("1m", "5m", "15m", "30m", "1h", "3h", "6h", "12h", "1d", "1w", "1mo")
+DEFAULT_BUCKETS = 500
+MAX_POINTS = int(os.environ.get("TIMESERIES_MAX_POINTS", 200000))
+MAX_RAW_ROWS = int(os.environ.get("TIMESERIES_MAX_RAW_ROWS", 2000000))
+
+UNIT_SECONDS = {"m": 60, "h": 3600, "d": 86400, "w": 7 * 86400}
+MAX_BUCKET_SECONDS = 31 * 86400
+WEEK_ORIGIN = 4 * 86400  # 1970-01-05, the first Monday after the epoch
+EPOCH = datetime(1970, 1, 1)
+
+
+def parse_bucket(value):
+    """('1h' ->) (seconds, months): exactly one of the two is non-zero."""
+    match = re.fullmatch(r"(\d+)(mo|m|h|d|w)", (value or "").strip())
+    if not match:
+        raise ValueError("bucket must look like 1m, 15m, 1h, 6h, 1d, 1w or 1mo")
+    count, unit = int(match.group(1)), match.group(2)
+    if unit == "mo":
+        if count != 1:
+            raise ValueError("bucket must be between 1m and 1mo")
+        return 0, 1
+    seconds = count * UNIT_SECONDS[unit]
+    if not 60 <= seconds <= MAX_BUCKET_SECONDS:
+        raise ValueError("bucket must be between 1m and 1mo")
+    return seconds, 0
+
+
+def _floor(epoch, seconds, months):
+    """Start of the bucket holding `epoch` (seconds, may be a NumPy array)."""
+    if months:
+        month = np.asarray(epoch).astype("datetime64[s]").astype("datetime64[M]")
+        return month.astype("datetime64[s]").astype(np.int64)
+    origin = WEEK_ORIGIN if seconds % UNIT_SECONDS["w"] == 0 else 0
+    return (np.asarray(epoch) - origin) // seconds * seconds + origin
+
+
+def _ceil(epoch, seconds, months):
+    start = int(_floor(epoch, seconds, months))
+    if start == epoch:
+        return start
+    if months:
+        month = np.datetime64(start, "s").astype("datetime64[M]") + 1
+        return int(month.astype("datetime64[s]").astype(np.int64))
+    return start + seconds
+
+
+def _epoch(text):
+    return int((datetime.fromisoformat(text) - EPOCH).total_seconds())
+
+
+def _text(epoch):
+    return (EPOCH + timedelta(seconds=int(epoch))).isoformat(sep=" ")
+
+
+def _bucket_count(start, end, seconds, months):
+    if months:
+        first = np.datetime64(start, "s").astype("datetime64[M]")
+        last = np.datetime64(end, "s").astype("datetime64[M]")
+        return int((last - first).astype(int))
+    return (end - start) // seconds
+
+
+def parse_query(args, now=None):
+    """Validated query from a query-string mapping; raises ValueError.
+
+    ?sensor_id=|machine_id=  scope (default: the whole company)
+    ?from=&to=               ISO 8601, default the last 24 hours
+    ?bucket=1h               1m .. 1mo, or omitted to pick one giving at
+                             most ?max_points buckets (default 500)
+    ?agg=avg,max             any of AGGREGATES
+    ?group_by=sensor         sensor, machine or company
+    """
+    query = {}
+    for key in ("sensor_id", "machine_id"):
+        if args.get(key):
+            try:
+                query[key] = int(args.get(key))
+            except ValueError:
+                raise ValueError(f"{key} must be an integer") from None
+
+    now = now or datetime.utcnow()
+    end = normalize_timestamp(args.get("to") or now.isoformat(timespec="seconds"))
+    if end is None:
+        raise ValueError("to must be an ISO 8601 timestamp")
+    if args.get("from"):
+        start = normalize_timestamp(args.get("from"))
+        if start is None:
+            raise ValueError("from must be an ISO 8601 timestamp")
+    else:
+        start = (datetime.fromisoformat(end) - timedelta(days=1)).isoformat(sep=" ")
+    start, end = _epoch(start), _epoch(end)
+    if start >= end:
+        raise ValueError("from must be before to")
+
+    aggregates = [a for a in (args.get("agg") or "avg").split(",") if a]
+    unknown = set(aggregates) - set(AGGREGATES)
+    if unknown:
+        raise ValueError(f"unknown aggregate(s): {', '.join(sorted(unknown))}")
+
+    group_by = args.get("group_by", "sensor")
+    if group_by not in GROUPS:
+        raise ValueError(f"group_by must be one of {', '.join(GROUPS)}")
+
+    bucket = args.get("bucket")
+    if not bucket or bucket == "auto":
+        target = max(1, int(args.get("max_points") or DEFAULT_BUCKETS))
+        bucket = next(
+            (b for b in AUTO_BUCKETS if _bucket_count(start, end, *parse_bucket(b)) <= target),
+            AUTO_BUCKETS[-1]
+        )
+    seconds, months = parse_bucket(bucket)
+
+    query.update({
+        "start": _floor(start, seconds, months).item(),
+        "end": _ceil(end, seconds, months),
+        "bucket": bucket,
+        "seconds": seconds,
+        "months": months,
+        "aggregates": list(dict.fromkeys(aggregates)),
+        "group_by": group_by,
+    })
+    return query
+
+
+def _scope(company_id, query):
+    where = ["m.company_id = ?"]
+    params = [company_id]
+    if "machine_id" in query:
+        where.append("m.id = ?")
+        params.append(query["machine_id"])
+    if "sensor_id" in query:
+        where.append("s.id = ?")
+        params.append(query["sensor_id"])
+    return " AND ".join(where), params
+
+
+def _source(query):
+    """Stored resolution to read: 'daily', 'hourly' or 'raw'."""
+    if not set(query["aggregates"]) <= ROLLUP_AGGREGATES:
+        return "raw"
+    if query["months"] or query["seconds"] % 86400 == 0:
+        return "daily"
+    if query["seconds"] % 3600 == 0:
+        return "hourly"
+    return "raw"
+
+
+def _fetch(conn, source, sensor_filter, params, start, end):
+    """Rows as NumPy columns: sensor, epoch, count, sum, min, max, value."""
+    if source == "raw":
+        rows = conn.execute(f"""
+            SELECT sensor_id, CAST(strftime('%s', timestamp) AS INTEGER), value
+            FROM sensor_readings
+            WHERE sensor_id IN ({sensor_filter}) AND timestamp >= ? AND timestamp < ?
+            ORDER BY sensor_id, timestamp
+        """, (*params, _text(start), _text(end))).fetchall()
+        data = np.array(rows, dtype=float).reshape(-1, 3)
+        values = data[:, 2]
+        return {
+            "sensor": data[:, 0].astype(np.int64), "epoch": data[:, 1].astype(np.int64),
+            "count": np.ones(len(values)), "sum": values, "min": values, "max": values,
+            "value": values,
+        }
+
+    table = f"sensor_rollup_{source}"
+    # Daily buckets are stored as bare dates
+    bounds = (_text(start)[:10], _text(end)[:10]) if source == "daily" else (_text(start), _text(end))
+    rows = conn.execute(f"""
+        SELECT sensor_id, CAST(strftime('%s', bucket) AS INTEGER),
+               reading_count, value_sum, value_min, value_max
+        FROM {table}
+        WHERE sensor_id IN ({sensor_filter}) AND bucket >= ? AND bucket < ?
+        ORDER BY sensor_id, bucket
+    """, (*params, *bounds)).fetchall()
+    data = np.array(rows, dtype=float).reshape(-1, 6)
+    return {
+        "sensor": data[:, 0].astype(np.int64), "epoch": data[:, 1].astype(np.int64),
+        "count": data[:, 2], "sum": data[:, 3], "min": data[:, 4], "max": data[:, 5],
+    }
+
+
+def _aggregate(group, key, columns, aggregates):
+    """Aggregate rows sharing (group, key); returns (group, key, {agg: array})."""
+    # Sorting by (group, key, time) keeps each bucket contiguous and its last reading at the end
+    order = np.lexsort((columns["epoch"], key, group))
+    sorted_group, sorted_key = group[order], key[order]
+    starts = np.flatnonzero(np.r_[True, (np.diff(sorted_group) != 0) | (np.diff(sorted_key) != 0)])
+    ends = np.r_[starts[1:], len(order)]
+
+    result = {}
+    counts = np.add.reduceat(columns["count"][order], starts)
+    if "count" in aggregates:
+        result["count"] = counts.astype(np.int64)
+    if "avg" in aggregates:
+        result["avg"] = np.add.reduceat(columns["sum"][order], starts) / counts
+    if "min" in aggregates:
+        result["min"] = np.minimum.reduceat(columns["min"][order], starts)
+    if "max" in aggregates:
+        result["max"] = np.maximum.reduceat(columns["max"][order], starts)
+    if "last" in aggregates:
+        result["last"] = columns["value"][order][ends - 1]
+    if "p95" in aggregates:
+        # Same buckets sorted by value instead; interpolates like np.percentile
+        by_value = columns["value"][np.lexsort((columns["value"], key, group))]
+        position = starts + 0.95 * (ends - starts - 1)
+        below = np.floor(position).astype(np.int64)
+        above = np.minimum(below + 1, ends - 1)
+        result["p95"] = by_value[below] + (position - below) * (by_value[above] - by_value[below])
+    return sorted_group[starts], sorted_key[starts], result
+
+
+def run(conn, company_id, query):
+    """Run a parse_query() result for one company.
+
+    Returns {"from", "to", "bucket", "source", "group_by", "aggregates",
+    "series": [{...labels, "t": [bucket starts], <agg>: [values]}]}.
+    """
+    scope, params = _scope(company_id, query)
+    sensors = conn.execute(f"""
+        SELECT s.id, s.name, s.unit, m.id, m.name
+        FROM sensors s JOIN machines m ON s.machine_id = m.id
+        WHERE {scope}
+        ORDER BY s.id
+    """, params).fetchall()
+    sensor_filter = f"SELECT s.id FROM sensors s JOIN machines m ON s.machine_id = m.id WHERE {scope}"
+
+    start, end = query["start"], query["end"]
+    seconds, months = query["seconds"], query["months"]
+    group_by = query["group_by"]
+    series_count = {"sensor": len(sensors), "machine": len({s[3] for s in sensors}), "company": 1}[group_by]
+    points = series_count * _bucket_count(start, end, seconds, months)
+    if points > MAX_POINTS:
+        raise ValueError(f"query would return {points} points (limit {MAX_POINTS}); use a larger bucket or a narrower scope")
+
+    source = _source(query)
+    if source == "raw":
+        # Cheap row estimate from the hourly rollups before committing to a raw scan
+        estimate = conn.execute(f"""
+            SELECT COALESCE(SUM(reading_count), 0) FROM sensor_rollup_hourly
+            WHERE sensor_id IN ({sensor_filter}) AND bucket >= ? AND bucket < ?
+        """, (*params, _text(_floor(start, 3600, 0)), _text(end))).fetchone()[0]
+        if estimate > MAX_RAW_ROWS:
+            raise ValueError(
+                f"query would scan about {estimate} raw readings (limit {MAX_RAW_ROWS}); "
+                "use a bucket of 1h or more without p95/last, or a shorter range"
+            )
+
+    columns = _fetch(conn, source, sensor_filter, params, start, end)
+    aggregates = query["aggregates"]
+    result = {
+        "from": _text(start), "to": _text(end), "bucket": query["bucket"], "source": source,
+        "group_by": group_by, "aggregates": aggregates, "series": [],
+    }
+    if not len(columns["sensor"]):
+        return result
+
+    machine_of = {s[0]: s[3] for s in sensors}
+    if group_by == "sensor":
+        group = columns["sensor"]
+    elif group_by == "machine":
+        group = np.array([machine_of[s] for s in columns["sensor"]], dtype=np.int64)
+    else:
+        group = np.zeros(len(columns["sensor"]), dtype=np.int64)
+    key = _floor(columns["epoch"], seconds, months)
+
+    groups, keys, values = _aggregate(group, key, columns, aggregates)
+
+    labels = {}
+    for sensor_id, name, unit, machine_id, machine_name in sensors:
+        if group_by == "sensor":
+            labels[sensor_id] = {"sensor_id": sensor_id, "name": name, "unit": unit,
+                                 "machine_id": machine_id, "machine": machine_name}
+        elif group_by == "machine":
+            labels[machine_id] = {"machine_id": machine_id, "name": machine_name}
+        else:
+            labels[0] = {"name": "all"}
+
+    bounds = np.flatnonzero(np.r_[True, np.diff(groups) != 0, True])
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        series = dict(labels[int(groups[lo])])
+        series["t"] = [_text(k) for k in keys[lo:hi]]
+        for name in aggregates:
+            column = values[name][lo:hi]
+            series[name] = column.tolist() if name == "count" else np.round(column, 4).tolist()
+        result["series"].append(series)
+    return result
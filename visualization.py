@@ -1,16 +1,46 @@
 # visualization.py
 # Upgraded visualization utilities for SAP-90s UI
 # Produces PNG images (BytesIO) for chart endpoints.
-
-from matplotlib import pyplot as plt
+#
+# Charts are built on the object-oriented Figure / FigureCanvasAgg API and
+# never touch pyplot's global figure state, so they can be rendered
+# concurrently from threaded workers. Placeholder series (shown when there
+# is no data yet) come from a seeded generator, so the same inputs always
+# produce the same PNG bytes.
+#
+# Each database-backed chart is split into a query half (`*_data(conn, ...)`,
+# returning plain picklable rows) and a render half that only takes data, so
+# rendering can be shipped to another process (see render_pool.py). The
+# `*_from_conn` helpers run both halves in-process.
+
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 import matplotlib.dates as mdates
 import numpy as np
 import io
 import datetime as dt
 
-# Ensure non-interactive backend if running headless
-import matplotlib
-matplotlib.use("Agg")
+import downsample
+import fleet
+
+PLACEHOLDER_SEED = 42
+
+
+def _new_figure(figsize, nrows=1, ncols=1, **kwargs):
+    """Create a standalone Agg figure and its axes (no pyplot registry).
+
+    Extra keyword arguments go to Figure.subplots (sharex, subplot_kw, ...)
+    except facecolor, which is applied to the figure.
+    """
+    fig = Figure(figsize=figsize, facecolor=kwargs.pop("facecolor", "white"))
+    FigureCanvasAgg(fig)
+    axes = fig.subplots(nrows, ncols, **kwargs)
+    return fig, axes
+
+
+def _placeholder_rng(*key):
+    """Deterministic generator for placeholder data, keyed by chart parameters."""
+    return np.random.default_rng([PLACEHOLDER_SEED, *key])
 
 
 def _save_fig_to_bytes(fig, dpi=150, quality_mode="normal"):
@@ -37,7 +67,6 @@ def _save_fig_to_bytes(fig, dpi=150, quality_mode="normal"):
     buf = io.BytesIO()
     fig.savefig(buf, format="png", dpi=dpi, bbox_inches="tight",
                 facecolor='white', edgecolor='none', pad_inches=0.3)
-    plt.close(fig)
     buf.seek(0)
     return buf
 
@@ -72,15 +101,8 @@ def _apply_theme_settings(theme_name="belize-light"):
     }
 
 
-def performance_trends_chart_from_conn(conn, days=7, theme_name="signature", quality_mode="normal"):
-    """
-    Enhanced performance summary (line chart) for the last `days`.
-    Returns BytesIO with high-quality visualization.
-
-    Args:
-        quality_mode: "high" (150 DPI, full labels), "normal" (100 DPI), "fast" (80 DPI, minimal labels)
-    """
-    theme = _apply_theme_settings(theme_name)
+def performance_trends_data(conn, days=7):
+    """(metric_date, efficiency) rows for the last `days`."""
     cur = conn.cursor()
     cur.execute("""
         SELECT metric_date, AVG(efficiency) as eff
@@ -89,19 +111,31 @@ def performance_trends_chart_from_conn(conn, days=7, theme_name="signature", qua
         GROUP BY metric_date
         ORDER BY metric_date ASC
     """.format(days - 1))
-    rows = cur.fetchall()
+    return [tuple(r) for r in cur.fetchall()]
+
+
+def performance_trends_chart(rows, days=7, theme_name="signature", quality_mode="normal"):
+    """
+    Enhanced performance summary (line chart) for the last `days`.
+    Returns BytesIO with high-quality visualization.
+
+    Args:
+        rows: Output of performance_trends_data()
+        quality_mode: "high" (150 DPI, full labels), "normal" (100 DPI), "fast" (80 DPI, minimal labels)
+    """
+    theme = _apply_theme_settings(theme_name)
 
     # If no data, fabricate gentle synthetic series to avoid errors
     if not rows:
         dates = [ (dt.date.today() - dt.timedelta(days=i)).isoformat() for i in reversed(range(days)) ]
-        y = list(np.random.uniform(70, 92, len(dates)))
+        y = list(_placeholder_rng(days).uniform(70, 92, len(dates)))
     else:
         dates = [r[0] for r in rows]
         y = [r[1] if r[1] is not None else 0 for r in rows]
 
     x = [dt.datetime.fromisoformat(d) if isinstance(d, str) else d for d in dates]
 
-    fig, ax = plt.subplots(figsize=(10, 5), facecolor='white')
+    fig, ax = _new_figure((10, 5))
 
     # Main line with enhanced styling
     ax.plot(x, y, marker='o', linewidth=3.5, color=theme["line"],
@@ -148,20 +182,28 @@ def performance_trends_chart_from_conn(conn, days=7, theme_name="signature", qua
     return _save_fig_to_bytes(fig, quality_mode=quality_mode)
 
 
-def status_pie_chart_from_conn(conn, company_id=None, theme_name="signature", quality_mode="normal"):
-    """Pie chart showing machine status distribution with enhanced styling.
+def performance_trends_chart_from_conn(conn, days=7, theme_name="signature", quality_mode="normal"):
+    return performance_trends_chart(performance_trends_data(conn, days), days, theme_name, quality_mode)
 
-    Args:
-        quality_mode: "high" (150 DPI), "normal" (100 DPI), "fast" (80 DPI, simplified labels)
-    """
-    theme = _apply_theme_settings(theme_name)
-    cur = conn.cursor()
 
+def status_pie_data(conn, company_id=None):
+    """(status, count) rows for the company's machines."""
+    cur = conn.cursor()
     if company_id:
         cur.execute("SELECT status, COUNT(*) as cnt FROM machines WHERE company_id = ? GROUP BY status", (company_id,))
     else:
         cur.execute("SELECT status, COUNT(*) as cnt FROM machines GROUP BY status")
-    rows = cur.fetchall()
+    return [tuple(r) for r in cur.fetchall()]
+
+
+def status_pie_chart(rows, theme_name="signature", quality_mode="normal"):
+    """Pie chart showing machine status distribution with enhanced styling.
+
+    Args:
+        rows: Output of status_pie_data()
+        quality_mode: "high" (150 DPI), "normal" (100 DPI), "fast" (80 DPI, simplified labels)
+    """
+    theme = _apply_theme_settings(theme_name)
 
     labels = [r[0] if r[0] else "Unknown" for r in rows]
     values = [r[1] for r in rows]
@@ -180,7 +222,7 @@ def status_pie_chart_from_conn(conn, company_id=None, theme_name="signature", qu
     }
     colors = [color_map.get(lbl.lower(), theme["accent"]) for lbl in labels]
 
-    fig, ax = plt.subplots(figsize=(7, 7), facecolor='white')
+    fig, ax = _new_figure((7, 7))
 
     # Autopct format depends on quality mode
     if quality_mode == "fast":
@@ -220,13 +262,12 @@ def status_pie_chart_from_conn(conn, company_id=None, theme_name="signature", qu
     return _save_fig_to_bytes(fig, quality_mode=quality_mode)
 
 
-def alert_frequency_chart_from_conn(conn, days=14, company_id=None, theme_name="signature", quality_mode="normal"):
-    """Enhanced line chart of alerts count per day for the last `days` days.
+def status_pie_chart_from_conn(conn, company_id=None, theme_name="signature", quality_mode="normal"):
+    return status_pie_chart(status_pie_data(conn, company_id), theme_name, quality_mode)
 
-    Args:
-        quality_mode: "high" (150 DPI), "normal" (100 DPI), "fast" (80 DPI, minimal labels)
-    """
-    theme = _apply_theme_settings(theme_name)
+
+def alert_frequency_data(conn, days=14, company_id=None):
+    """(date, alert_count) rows for the last `days` days."""
     cur = conn.cursor()
 
     if company_id:
@@ -245,18 +286,28 @@ def alert_frequency_chart_from_conn(conn, days=14, company_id=None, theme_name="
             GROUP BY date(raised_at)
             ORDER BY d ASC
         """.format(days - 1))
-    rows = cur.fetchall()
+    return [tuple(r) for r in cur.fetchall()]
+
+
+def alert_frequency_chart(rows, days=14, theme_name="signature", quality_mode="normal"):
+    """Enhanced line chart of alerts count per day for the last `days` days.
+
+    Args:
+        rows: Output of alert_frequency_data()
+        quality_mode: "high" (150 DPI), "normal" (100 DPI), "fast" (80 DPI, minimal labels)
+    """
+    theme = _apply_theme_settings(theme_name)
 
     if not rows:
         dates = [ (dt.date.today() - dt.timedelta(days=i)).isoformat() for i in reversed(range(days)) ]
-        counts = list(np.random.randint(0, 5, len(dates)))
+        counts = list(_placeholder_rng(days).integers(0, 5, len(dates)))
     else:
         dates = [r[0] for r in rows]
         counts = [r[1] for r in rows]
 
     x = [dt.datetime.fromisoformat(d) for d in dates]
 
-    fig, ax = plt.subplots(figsize=(11, 5))
+    fig, ax = _new_figure((11, 5))
 
     # Main line chart
     ax.plot(x, counts, marker='o', linewidth=3, color=theme["line"], markersize=7,
@@ -298,25 +349,34 @@ def alert_frequency_chart_from_conn(conn, days=14, company_id=None, theme_name="
     return _save_fig_to_bytes(fig, quality_mode=quality_mode)
 
 
-def machine_comparison_chart_from_conn(conn, limit=20, theme_name="signature", quality_mode="normal"):
+def alert_frequency_chart_from_conn(conn, days=14, company_id=None, theme_name="signature", quality_mode="normal"):
+    return alert_frequency_chart(alert_frequency_data(conn, days, company_id), days, theme_name, quality_mode)
+
+
+def machine_comparison_data(conn, limit=20):
+    """(name, efficiency) rows for the top `limit` machines."""
+    cur = conn.cursor()
+    cur.execute("SELECT name, efficiency FROM machines ORDER BY efficiency DESC LIMIT ?", (limit,))
+    return [tuple(r) for r in cur.fetchall()]
+
+
+def machine_comparison_chart(rows, limit=20, theme_name="signature", quality_mode="normal"):
     """Enhanced horizontal bar chart of machine efficiencies (top `limit` machines).
 
     Args:
+        rows: Output of machine_comparison_data()
         quality_mode: "high" (150 DPI), "normal" (100 DPI), "fast" (80 DPI, no value labels)
     """
     theme = _apply_theme_settings(theme_name)
-    cur = conn.cursor()
-    cur.execute("SELECT name, efficiency FROM machines ORDER BY efficiency DESC LIMIT ?", (limit,))
-    rows = cur.fetchall()
 
     if not rows:
         names = [f"Machine {i}" for i in range(1, 6)]
-        effs = list(np.random.uniform(60, 95, len(names)))
+        effs = list(_placeholder_rng(limit).uniform(60, 95, len(names)))
     else:
         names = [r[0] for r in rows]
         effs = [r[1] if r[1] is not None else 0 for r in rows]
 
-    fig, ax = plt.subplots(figsize=(10, max(4, 0.5 * len(names))))
+    fig, ax = _new_figure((10, max(4, 0.5 * len(names))))
 
     # Color code by efficiency ranges
     colors = []
@@ -361,6 +421,10 @@ def machine_comparison_chart_from_conn(conn, limit=20, theme_name="signature", q
     return _save_fig_to_bytes(fig, quality_mode=quality_mode)
 
 
+def machine_comparison_chart_from_conn(conn, limit=20, theme_name="signature", quality_mode="normal"):
+    return machine_comparison_chart(machine_comparison_data(conn, limit), limit, theme_name, quality_mode)
+
+
 def oee_gauge_chart(oee_value, theme_name="signature", quality_mode="normal"):
     """Enhanced circular gauge chart for OEE value (0-100%) with detailed styling.
 
@@ -368,7 +432,7 @@ def oee_gauge_chart(oee_value, theme_name="signature", quality_mode="normal"):
         quality_mode: "high" (150 DPI, full text), "normal" (100 DPI), "fast" (80 DPI, minimal text)
     """
     theme = _apply_theme_settings(theme_name)
-    fig, ax = plt.subplots(figsize=(6, 6), subplot_kw=dict(projection='polar'))
+    fig, ax = _new_figure((6, 6), subplot_kw=dict(projection='polar'))
 
     # Gauge parameters
     theta = np.linspace(0, np.pi, 100)
@@ -436,97 +500,111 @@ def oee_gauge_chart(oee_value, theme_name="signature", quality_mode="normal"):
     return _save_fig_to_bytes(fig, quality_mode=quality_mode)
 
 
-def multi_sensor_trend_chart(conn, machine_id, days=7, theme_name="signature", quality_mode="normal"):
-    """Multi-line chart showing multiple sensor trends over time.
+def multi_sensor_trend_data(conn, machine_id, days=7, max_points=None, method="lttb"):
+    """Readings of up to 5 sensors of a machine for the last `days` days.
 
-    Args:
-        quality_mode: "high" (150 DPI), "normal" (100 DPI), "fast" (80 DPI)
+    Each series is downsampled to at most `max_points` points (see
+    downsample.py; None keeps every reading).
+
+    Returns [(sensor_name, [timestamps], [values]), ...]; an empty list
+    means the machine has no sensors.
     """
-    theme = _apply_theme_settings(theme_name)
     cur = conn.cursor()
 
     # Get all sensors for machine
-    cur.execute("SELECT id, name FROM sensors WHERE machine_id=?", (machine_id,))
+    cur.execute("SELECT id, name FROM sensors WHERE machine_id=? ORDER BY id LIMIT 5", (machine_id,))
     sensors = cur.fetchall()
+    series = {sensor[0]: (sensor[1], [], []) for sensor in sensors}
+    if not series:
+        return []
+
+    cur.execute("""
+        SELECT sensor_id, timestamp, value
+        FROM sensor_readings
+        WHERE sensor_id IN ({}) AND timestamp >= datetime('now', '-{} days')
+        ORDER BY timestamp ASC
+    """.format(",".join("?" * len(series)), days), list(series))
+    for sensor_id, timestamp, value in cur.fetchall():
+        series[sensor_id][1].append(timestamp)
+        series[sensor_id][2].append(value)
+    return [
+        (name, *downsample.downsample(times, values, max_points, method))
+        for name, times, values in series.values()
+    ]
+
+
+def multi_sensor_trend_chart(series, days=7, theme_name="signature", quality_mode="normal"):
+    """Multi-line chart showing multiple sensor trends over time.
 
-    if not sensors:
-        fig, ax = plt.subplots(figsize=(8, 3))
+    Args:
+        series: Output of multi_sensor_trend_data()
+        quality_mode: "high" (150 DPI), "normal" (100 DPI), "fast" (80 DPI)
+    """
+    theme = _apply_theme_settings(theme_name)
+
+    if not series:
+        fig, ax = _new_figure((8, 3))
         ax.text(0.5, 0.5, "No sensors available", ha="center", va="center",
                 transform=ax.transAxes, fontsize=12, color=theme.get("muted", "#999"))
         ax.axis("off")
         return _save_fig_to_bytes(fig, quality_mode=quality_mode)
 
-    fig, ax = plt.subplots(figsize=(8, 3))
+    fig, ax = _new_figure((8, 3))
     colors = [theme["line"], "#e9730c", "#107e3e", "#bb0000", "#9aa6b2"]
 
-    for idx, sensor in enumerate(sensors[:5]):  # Max 5 sensors
-        cur.execute("""
-            SELECT timestamp, value
-            FROM sensor_readings
-            WHERE sensor_id=? AND timestamp >= datetime('now', '-{} days')
-            ORDER BY timestamp ASC
-        """.format(days), (sensor[0],))
-        rows = cur.fetchall()
-
-        if rows:
-            times = [r[0] for r in rows]
-            values = [r[1] for r in rows]
-            ax.plot(times, values, marker='o', linewidth=2,
-                   label=sensor[1], color=colors[idx % len(colors)], markersize=4)
+    for idx, (name, times, values) in enumerate(series):
+        if times:
+            # A real time axis: one tick label per reading made long windows unreadable and slow
+            ax.plot(np.array(times, dtype="datetime64[s]"), values, linewidth=2, label=name,
+                    color=colors[idx % len(colors)],
+                    marker='o' if len(times) <= 60 else None, markersize=4)
 
+    ax.xaxis.set_major_formatter(mdates.ConciseDateFormatter(ax.xaxis.get_major_locator()))
     ax.set_xlabel("Time", fontsize=9)
     ax.set_ylabel("Value", fontsize=9)
     ax.set_title(f"Multi-Sensor Trends (Last {days} days)", fontsize=10)
     ax.legend(loc='upper right', fontsize=8, framealpha=0.9)
     ax.grid(True, linestyle='--', linewidth=0.5, color=theme["grid"], alpha=0.5)
-    plt.xticks(rotation=45, fontsize=8)
+    ax.tick_params(axis='x', labelrotation=45, labelsize=8)
     fig.tight_layout()
     return _save_fig_to_bytes(fig, quality_mode=quality_mode)
 
 
-def status_heatmap_chart(conn, company_id=None, theme_name="signature", quality_mode="normal"):
+def multi_sensor_trend_chart_from_conn(conn, machine_id, days=7, theme_name="signature", quality_mode="normal",
+                                       max_points=downsample.DEFAULT_MAX_POINTS):
+    return multi_sensor_trend_chart(multi_sensor_trend_data(conn, machine_id, days, max_points), days, theme_name, quality_mode)
+
+
+def status_heatmap_data(conn, company_id=None):
+    """[(location, [count per fleet.STATUSES]), ...] sorted by location."""
+    return [
+        (r["location"], [r["status_counts"][s] for s in fleet.STATUSES])
+        for r in fleet.location_breakdown(conn, company_id or None)
+    ]
+
+
+def status_heatmap_chart(rows, theme_name="signature", quality_mode="normal"):
     """Heatmap showing machine status distribution by location.
 
     Args:
+        rows: Output of status_heatmap_data()
         quality_mode: "high" (150 DPI), "normal" (100 DPI), "fast" (80 DPI)
     """
     theme = _apply_theme_settings(theme_name)
-    cur = conn.cursor()
-
-    if company_id:
-        cur.execute("""
-            SELECT location, status, COUNT(*) as cnt
-            FROM machines
-            WHERE company_id = ?
-            GROUP BY location, status
-        """, (company_id,))
-    else:
-        cur.execute("""
-            SELECT location, status, COUNT(*) as cnt
-            FROM machines
-            GROUP BY location, status
-        """)
-    rows = cur.fetchall()
 
     if not rows:
-        fig, ax = plt.subplots(figsize=(6, 3))
+        fig, ax = _new_figure((6, 3))
         ax.text(0.5, 0.5, "No data available", ha="center", va="center",
                 transform=ax.transAxes, fontsize=12, color=theme.get("muted", "#999"))
         ax.axis("off")
         return _save_fig_to_bytes(fig, quality_mode=quality_mode)
 
-    # Build heatmap data
-    locations = sorted(set(r[0] for r in rows))
-    statuses = ['running', 'idle', 'down', 'maintenance']
-    data = np.zeros((len(locations), len(statuses)))
-
-    for r in rows:
-        loc_idx = locations.index(r[0])
-        if r[1] in statuses:
-            status_idx = statuses.index(r[1])
-            data[loc_idx, status_idx] = r[2]
+    # Build heatmap data (rows come back sorted by location)
+    locations = [r[0] for r in rows]
+    statuses = list(fleet.STATUSES)
+    data = np.array([r[1] for r in rows], dtype=float)
 
-    fig, ax = plt.subplots(figsize=(6, max(3, len(locations) * 0.5)))
+    fig, ax = _new_figure((6, max(3, len(locations) * 0.5)))
     im = ax.imshow(data, cmap='YlOrRd', aspect='auto')
 
     ax.set_xticks(np.arange(len(statuses)))
@@ -542,55 +620,66 @@ def status_heatmap_chart(conn, company_id=None, theme_name="signature", quality_
                           fontsize=10, fontweight='bold')
 
     ax.set_title("Machine Status by Location", fontsize=10)
-    plt.colorbar(im, ax=ax, label='Count')
+    fig.colorbar(im, ax=ax, label='Count')
     fig.tight_layout()
     return _save_fig_to_bytes(fig, quality_mode=quality_mode)
 
 
-def performance_comparison_chart(conn, days=30, company_id=None, theme_name="signature", quality_mode="normal"):
-    """Comparison chart showing performance metrics over time.
+def status_heatmap_chart_from_conn(conn, company_id=None, theme_name="signature", quality_mode="normal"):
+    return status_heatmap_chart(status_heatmap_data(conn, company_id), theme_name, quality_mode)
 
-    Args:
-        quality_mode: "high" (150 DPI), "normal" (100 DPI), "fast" (80 DPI)
-    """
-    theme = _apply_theme_settings(theme_name)
+
+def performance_comparison_data(conn, days=30, company_id=None):
+    """(date, avg_efficiency, active_sensors) rows for the last `days` days."""
     cur = conn.cursor()
 
+    # Daily rollups hold one row per sensor per day, so COUNT(*) = active sensors
     if company_id:
         cur.execute("""
-            SELECT DATE(sr.timestamp) as d,
-                   AVG(sr.value) as avg_eff,
-                   COUNT(DISTINCT sr.sensor_id) as sensor_count
-            FROM sensor_readings sr
-            JOIN sensors s ON sr.sensor_id = s.id
+            SELECT r.bucket as d,
+                   SUM(r.value_sum) / SUM(r.reading_count) as avg_eff,
+                   COUNT(*) as sensor_count
+            FROM sensor_rollup_daily r
+            JOIN sensors s ON r.sensor_id = s.id
             JOIN machines m ON s.machine_id = m.id
-            WHERE m.company_id = ? AND sr.timestamp >= date('now', '-{} days')
-            GROUP BY DATE(sr.timestamp)
+            WHERE m.company_id = ? AND r.bucket >= date('now', '-{} days')
+            GROUP BY r.bucket
             ORDER BY d ASC
         """.format(days), (company_id,))
     else:
         cur.execute("""
-            SELECT DATE(timestamp) as d,
-                   AVG(value) as avg_eff,
-                   COUNT(DISTINCT sensor_id) as sensor_count
-            FROM sensor_readings
-            WHERE timestamp >= date('now', '-{} days')
-            GROUP BY DATE(timestamp)
+            SELECT bucket as d,
+                   SUM(value_sum) / SUM(reading_count) as avg_eff,
+                   COUNT(*) as sensor_count
+            FROM sensor_rollup_daily
+            WHERE bucket >= date('now', '-{} days')
+            GROUP BY bucket
             ORDER BY d ASC
         """.format(days))
-    rows = cur.fetchall()
+    return [tuple(r) for r in cur.fetchall()]
+
+
+def performance_comparison_chart(rows, days=30, theme_name="signature", quality_mode="normal"):
+    """Comparison chart showing performance metrics over time.
+
+    Args:
+        rows: Output of performance_comparison_data()
+        quality_mode: "high" (150 DPI), "normal" (100 DPI), "fast" (80 DPI)
+    """
+    theme = _apply_theme_settings(theme_name)
 
     if not rows:
         dates = [(dt.date.today() - dt.timedelta(days=i)).isoformat()
                 for i in reversed(range(min(days, 7)))]
-        effs = list(np.random.uniform(70, 95, len(dates)))
-        counts = list(np.random.randint(1, 5, len(dates)))
+        rng = _placeholder_rng(days)
+        effs = list(rng.uniform(70, 95, len(dates)))
+        counts = list(rng.integers(1, 5, len(dates)))
     else:
         dates = [r[0] for r in rows]
         effs = [r[1] if r[1] else 0 for r in rows]
         counts = [r[2] for r in rows]
 
-    fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(8, 5), sharex=True)
+    fig, (ax1, ax2) = _new_figure((8, 5), 2, 1, sharex=True)
 
     # Efficiency line
     ax1.plot(dates, effs, marker='o', linewidth=2, color=theme["line"], markersize=5)
@@ -606,6 +695,110 @@ def performance_comparison_chart(conn, days=30, company_id=None, theme_name="sig
     ax2.set_xlabel("Date", fontsize=9)
     ax2.grid(True, axis='y', linestyle='--', linewidth=0.5, color=theme["grid"], alpha=0.5)
 
-    plt.xticks(rotation=45, fontsize=8)
+    ax2.tick_params(axis='x', labelrotation=45, labelsize=8)
+    fig.tight_layout()
+    return _save_fig_to_bytes(fig, quality_mode=quality_mode)
+
+
+def performance_comparison_chart_from_conn(conn, days=30, company_id=None, theme_name="signature", quality_mode="normal"):
+    return performance_comparison_chart(performance_comparison_data(conn, days, company_id), days, theme_name, quality_mode)
+
+
+def summary_bar_chart(machines, alerts, avg_value, quality_mode="normal"):
+    """Plant summary bars (machines, open alerts, average sensor value)."""
+    fig, ax = _new_figure((8, 4))
+
+    if machines == 0:
+        ax.text(
+            0.5, 0.5,
+            "No operational data yet",
+            ha="center", va="center",
+            fontsize=14, alpha=0.6,
+            transform=ax.transAxes,
+            color='#666'
+        )
+        ax.set_title("Plant Summary", fontsize=14, fontweight='bold', pad=15)
+        ax.axis("off")
+    else:
+        colors = ['#0a6ed1', '#e9730c', '#107e3e']
+        bars = ax.bar(
+            ["Machines", "Active Alerts", "Avg Sensor"],
+            [machines, alerts, round(avg_value, 1)],
+            color=colors,
+            edgecolor='#003366',
+            linewidth=1.5,
+            alpha=0.9
+        )
+
+        # Add value labels on bars
+        for bar in bars:
+            height = bar.get_height()
+            ax.text(bar.get_x() + bar.get_width()/2., height,
+                   f'{int(height) if height == int(height) else round(height, 1)}',
+                   ha='center', va='bottom', fontsize=11, fontweight='bold')
+
+        ax.set_title("Plant Summary", fontsize=14, fontweight='bold', pad=15, color='#003366')
+        ax.grid(axis="y", alpha=0.3, linestyle='--', linewidth=1)
+        ax.set_ylabel("Count", fontsize=11, fontweight='bold')
+        ax.spines['top'].set_visible(False)
+        ax.spines['right'].set_visible(False)
+        ax.tick_params(axis='both', labelsize=10)
+
+    fig.tight_layout()
+    return _save_fig_to_bytes(fig, dpi=120, quality_mode=quality_mode)
+
+
+def machine_trend_chart(machine_id, rows, quality_mode="normal"):
+    """Recent readings of one machine as a filled line chart.
+
+    Args:
+        rows: (timestamp, value) pairs, newest first
+    """
+    fig, ax = _new_figure((10, 4))
+
+    if not rows:
+        ax.text(
+            0.5, 0.5,
+            "No Sensor Data",
+            ha="center", va="center",
+            fontsize=14, alpha=0.6,
+            transform=ax.transAxes,
+            color='#666'
+        )
+        ax.axis("off")
+    else:
+        times = [r[0][-8:] if len(r[0]) > 8 else r[0] for r in rows][::-1]
+        values = [float(r[1]) if r[1] else 0 for r in rows][::-1]
+
+        ax.plot(times, values, marker="o", linewidth=3, markersize=6,
+               color='#0a6ed1', markerfacecolor='white', markeredgewidth=2,
+               markeredgecolor='#0a6ed1', alpha=0.9)
+        ax.fill_between(range(len(values)), values, alpha=0.2, color='#0a6ed1')
+
+        ax.set_title(f"Machine {machine_id} Sensor Trend", fontsize=14, fontweight='bold',
+                    pad=15, color='#003366')
+        ax.set_xlabel("Time", fontsize=11, fontweight='bold')
+        ax.set_ylabel("Value", fontsize=11, fontweight='bold')
+        ax.grid(alpha=0.3, linestyle='--', linewidth=1)
+        ax.spines['top'].set_visible(False)
+        ax.spines['right'].set_visible(False)
+        ax.tick_params(axis='x', labelrotation=45, labelsize=9)
+        ax.tick_params(axis='y', labelsize=9)
+
     fig.tight_layout()
-    return _save_fig_to_bytes(fig, quality_mode=quality_mode)
\ No newline at end of file
+    return _save_fig_to_bytes(fig, dpi=120, quality_mode=quality_mode)
+
+
+# Render halves by name, used by render_pool to dispatch work to other processes
+RENDERERS = {
+    "summary": summary_bar_chart,
+    "machine": machine_trend_chart,
+    "oee": oee_gauge_chart,
+    "status": status_pie_chart,
+    "alerts-trend": alert_frequency_chart,
+    "multi-sensor": multi_sensor_trend_chart,
+    "heatmap": status_heatmap_chart,
+    "performance": performance_comparison_chart,
+    "performance-trends": performance_trends_chart,
+    "machine-comparison": machine_comparison_chart,
+}
@@ -0,0 +1,205 @@
+"""
+Single Writer
+One writer thread per process applies queued write intents to the database
+in group-committed transactions.
+
+An intent is a function called as fn(conn, *args, **kwargs) on the writer's
+connection; submit() returns a concurrent.futures.Future that resolves to
+its return value once the transaction holding it has committed. The writer
+takes every queued intent, up to WRITER_MAX_OPS, runs them inside one
+BEGIN IMMEDIATE ... COMMIT, and gives each its own SAVEPOINT so one failing
+intent is rolled back and reported on its own future without sinking the
+rest of the group. Intents that arrive during a commit form the next group,
+so groups grow with load on their own; WRITER_WINDOW_MS additionally waits
+that long for more intents, which only pays off when commits are expensive
+(e.g. synchronous=FULL on slow disks).
+
+Request threads therefore never hold the write lock or wait on
+SQLITE_BUSY; they wait on their future. Intents must not commit or roll
+back themselves. When WRITER_QUEUE intents are already waiting, submit()
+raises WriterBusy rather than queueing unbounded work.
+"""
+import atexit
+import os
+import queue
+import sqlite3
+import threading
+import time
+import traceback
+from concurrent.futures import Future
+
+import dbpool
+
+WINDOW_MS = float(os.environ.get("WRITER_WINDOW_MS", 0))
+MAX_OPS = int(os.environ.get("WRITER_MAX_OPS", 200))
+MAX_QUEUE = int(os.environ.get("WRITER_QUEUE", 5000))
+TIMEOUT = float(os.environ.get("WRITER_TIMEOUT", 30))
+SUBMIT_WAIT = 1.0
+BEGIN_RETRIES = 5
+
+
+class WriterBusy(Exception):
+    """The write queue is full; the caller should retry later."""
+
+
+class Writer:
+    """Group-committing single writer thread for one database."""
+
+    def __init__(self, path, window_ms=WINDOW_MS, max_ops=MAX_OPS, max_queue=MAX_QUEUE, timeout=TIMEOUT):
+        self.path = path
+        self.timeout = timeout
+        self.window = window_ms / 1000
+        self.max_ops = max_ops
+        self.max_queue = max_queue
+        self._lock = threading.Lock()
+        self._queue = None
+        self._pid = None
+        self._thread = None
+        self._stats = {"intents": 0, "failed": 0, "groups": 0, "commit_errors": 0, "rejected": 0,
+                       "largest_group": 0, "commit_ms": 0.0}
+        atexit.register(self.close)
+
+    def submit(self, fn, *args, **kwargs):
+        """Queue fn(conn, *args, **kwargs); returns a Future resolved after commit."""
+        future = Future()
+        try:
+            self._start().put((future, fn, args, kwargs), timeout=SUBMIT_WAIT)
+        except queue.Full:
+            with self._lock:
+                self._stats["rejected"] += 1
+            raise WriterBusy("Too many pending writes") from None
+        return future
+
+    def run(self, fn, *args, **kwargs):
+        """submit() and wait for the result (re-raising the intent's exception)."""
+        return self.submit(fn, *args, **kwargs).result(self.timeout)
+
+    def _start(self):
+        """This process's queue, starting the writer thread (again after a fork or if it died)."""
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._queue = queue.Queue(self.max_queue)
+                self._thread = None
+            if self._thread is None or not self._thread.is_alive():
+                # Also replaces a thread that died, keeping what it left queued
+                self._thread = threading.Thread(target=self._loop, args=(self._queue,), name="db-writer", daemon=True)
+                self._thread.start()
+            return self._queue
+
+    def _group(self, pending):
+        """Block for the first intent, then gather more until the window closes or max_ops."""
+        group = [pending.get()]
+        deadline = time.monotonic() + self.window
+        while group[-1] is not None and len(group) < self.max_ops:
+            try:
+                group.append(pending.get_nowait())
+            except queue.Empty:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    group.append(pending.get(timeout=remaining))
+                except queue.Empty:
+                    break
+        return group
+
+    def _loop(self, pending):
+        conn = None
+        while True:
+            group = self._group(pending)
+            stop = group[-1] is None
+            if stop:
+                group.pop()
+            if group:
+                try:
+                    if conn is None:
+                        conn = dbpool.connect(self.path)
+                    self._apply(conn, group)
+                except Exception as e:
+                    # e.g. the connection could not be opened: fail this group, reconnect for the next
+                    traceback.print_exc()
+                    self._fail(group, e)
+                    if conn is not None:
+                        conn.close()
+                        conn = None
+            if stop:
+                break
+        if conn is not None:
+            conn.close()
+
+    def _begin(self, conn):
+        # busy_timeout already waits for writers in other processes; retry a few times on top
+        for attempt in range(BEGIN_RETRIES):
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                return
+            except sqlite3.OperationalError:
+                if attempt == BEGIN_RETRIES - 1:
+                    raise
+                time.sleep(0.05 * (attempt + 1))
+
+    def _apply(self, conn, group):
+        started = time.perf_counter()
+        outcomes = []
+        try:
+            self._begin(conn)
+            for future, fn, args, kwargs in group:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                conn.execute("SAVEPOINT intent")
+                try:
+                    outcomes.append((future, fn(conn, *args, **kwargs), None))
+                except Exception as e:
+                    conn.execute("ROLLBACK TO intent")
+                    outcomes.append((future, None, e))
+                conn.execute("RELEASE intent")
+            conn.commit()
+        except sqlite3.Error as e:
+            if conn.in_transaction:
+                conn.rollback()
+            self._fail(group, e)
+            return
+
+        elapsed = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self._stats["groups"] += 1
+            self._stats["intents"] += len(outcomes)
+            self._stats["failed"] += sum(1 for _, _, error in outcomes if error is not None)
+            self._stats["largest_group"] = max(self._stats["largest_group"], len(outcomes))
+            self._stats["commit_ms"] += elapsed
+        for future, result, error in outcomes:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+    def _fail(self, group, error):
+        with self._lock:
+            self._stats["commit_errors"] += 1
+        # Intents not reached yet fail too, so no caller waits on a future nobody will set
+        for future, fn, args, kwargs in group:
+            if not future.done():
+                future.set_exception(error)
+
+    def close(self, timeout=10.0):
+        """Apply what is queued and stop the writer (registered with atexit)."""
+        with self._lock:
+            if self._pid != os.getpid():
+                return
+            self._pid = None
+            pending, thread = self._queue, self._thread
+        pending.put(None)
+        thread.join(timeout)
+
+    def stats(self):
+        with self._lock:
+            groups = self._stats["groups"]
+            return {
+                **self._stats,
+                "commit_ms": round(self._stats["commit_ms"], 1),
+                "avg_group": round(self._stats["intents"] / groups, 2) if groups else 0,
+                "queued": self._queue.qsize() if self._pid == os.getpid() else 0,
+                "window_ms": self.window * 1000,
+                "max_ops": self.max_ops,
+            }